@@ -1,31 +1,303 @@
+import math
+from collections import deque
+
+import numpy as np
 import pandas as pd
 
+KPI_COLUMNS = ["sorting_capacity", "staff_available", "vehicles_ready", "congestion_level"]
+
+
+# Rows scored per block; keeps the working set of the kernel in cache
+_BLOCK_ROWS = 16_384
+
+# Appends at least this long are scored with the vectorised kernel
+_BULK_UPDATE_ROWS = 256
+
+
+def _zscore_blocks(vt, window):
+    """
+    Yield (first_row, scores) for consecutive row blocks of a column-major
+    (cols, rows) array. `scores` is a reused (cols, block) buffer, only
+    valid until the next iteration; rows before window - 1 are never scored.
+    """
+    cols, n = vt.shape
+    m = n - window + 1
+    if window < 2 or m <= 0:
+        return
+
+    size = min(_BLOCK_ROWS, m)
+    mean_buf = np.empty((cols, size))
+    std_buf = np.empty((cols, size))
+    out_buf = np.empty((cols, size))
+
+    for start in range(0, m, _BLOCK_ROWS):
+        stop = min(start + _BLOCK_ROWS, m)
+        width = stop - start
+        mean, std, out = mean_buf[:, :width], std_buf[:, :width], out_buf[:, :width]
+
+        np.copyto(mean, vt[:, start:stop])
+        for k in range(1, window):
+            mean += vt[:, start + k:stop + k]
+        mean /= window
+
+        std.fill(0.0)
+        for k in range(window):
+            np.subtract(vt[:, start + k:stop + k], mean, out=out)
+            out *= out
+            std += out
+        std /= window - 1
+        np.sqrt(std, out=std)
+
+        # Windows whose neighbours are all equal are constant → no spread
+        block = vt[:, start:stop + window - 1]
+        equal = np.zeros(block.shape, dtype=np.int64)
+        np.cumsum(block[:, 1:] == block[:, :-1], axis=1, out=equal[:, 1:])
+        constant = (equal[:, window - 1:] - equal[:, :width]) == window - 1
+
+        np.subtract(vt[:, start + window - 1:stop + window - 1], mean, out=out)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out /= std
+        out[constant | (std == 0)] = np.nan
+
+        yield start + window - 1, out
+
+
+def rolling_zscores(values, window):
+    """
+    Z-score of every value against the `window` values ending at it, for a
+    2-D (rows, columns) array. Same semantics as pandas rolling(window):
+    NaN until the window is full or when it contains a NaN, and NaN for a
+    window of identical values (zero spread).
+
+    Sums run over the window positions in a fixed order and are element-wise
+    across rows, so scoring one window in isolation gives bit-identical
+    results to scoring it as part of a full history.
+    """
+    values = np.asarray(values, dtype=float)
+
+    # Column-major working copy (free for DataFrame.to_numpy() output)
+    vt = np.ascontiguousarray(values.T)
+    z = np.full(vt.shape, np.nan)
+
+    for first, scores in _zscore_blocks(vt, window):
+        z[:, first:first + scores.shape[1]] = scores
+
+    return z.T
+
+
+class _RunningWindow:
+    """
+    Welford mean/variance over the last `window` values of one column,
+    updated in O(1) per value. Mirrors pandas' rolling(window) semantics:
+    no score until the window is full, NaN anywhere in the window → NaN,
+    and a window of identical values has a variance of exactly 0.
+    """
+
+    # Re-derive the running sums from the buffer every so often so that
+    # add/remove rounding error cannot drift over millions of rows
+    RESYNC_EVERY = 10_000
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.nan_count = 0
+        self.equal_pairs = 0      # neighbours in the window with equal values
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.pushes = 0
+
+    def _add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def _remove(self, x):
+        self.n -= 1
+        if self.n == 0:
+            self.mean = 0.0
+            self.m2 = 0.0
+            return
+        delta = x - self.mean
+        self.mean -= delta / self.n
+        self.m2 = max(self.m2 - delta * (x - self.mean), 0.0)
+
+    def _resync(self):
+        finite = [v for v in self.values if not math.isnan(v)]
+        self.n = len(finite)
+        self.mean = math.fsum(finite) / self.n if finite else 0.0
+        self.m2 = math.fsum((v - self.mean) ** 2 for v in finite)
+
+    def push(self, x):
+        x = float(x)
+
+        if self.values and self.values[-1] == x:
+            self.equal_pairs += 1
+        self.values.append(x)
+        if math.isnan(x):
+            self.nan_count += 1
+        else:
+            self._add(x)
+
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            if old == self.values[0]:
+                self.equal_pairs -= 1
+            if math.isnan(old):
+                self.nan_count -= 1
+            else:
+                self._remove(old)
+
+        self.pushes += 1
+        if self.pushes % self.RESYNC_EVERY == 0:
+            self._resync()
+
+    def zscore(self, threshold):
+        """
+        Z-score of the newest value against the current window (NaN if
+        undefined). Scores within rounding distance of `threshold` are
+        recomputed with rolling_zscores so the anomaly decision is exactly
+        the one the batch pass makes.
+        """
+        if len(self.values) < self.window or self.nan_count or self.window < 2:
+            return math.nan
+
+        if self.equal_pairs == self.window - 1:
+            return math.nan  # constant window: (x - mean) / 0 with x == mean
+
+        std = math.sqrt(self.m2 / (self.n - 1))
+        if std > 0:
+            z = (self.values[-1] - self.mean) / std
+            if abs(abs(z) - threshold) > 1e-9 * max(1.0, threshold):
+                return z
+
+        window = np.fromiter(self.values, dtype=float, count=len(self.values))
+        return float(rolling_zscores(window[:, None], self.window)[-1, 0])
+
 
 class RollingZScoreAnomaly:
     def __init__(self, window=10, threshold=2.5):
         self.window = window
         self.threshold = threshold
+        self._windows = None
+
+    def compute_long(self, df):
+        """
+        Flagged cells only, in long format: `row` (position in df),
+        `variable` and `zscore`, ordered by row then KPI column. One
+        vectorised pass over all KPI columns; output size scales with the
+        number of anomalies.
+        """
+        return self._flag(df[KPI_COLUMNS].to_numpy(dtype=float))
+
+    def _flag(self, values):
+        """compute_long() for a (rows, KPI columns) float array."""
+        vt = np.ascontiguousarray(values.T)
+        rows, cols, zs = [], [], []
+
+        for first, scores in _zscore_blocks(vt, self.window):
+            with np.errstate(invalid="ignore"):
+                r, c = np.nonzero(np.abs(scores.T) > self.threshold)
+            rows.append(r + first)
+            cols.append(c)
+            zs.append(scores[c, r])
+
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.intp)
+        cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.intp)
+        zs = np.concatenate(zs) if zs else np.empty(0)
+
+        return pd.DataFrame({
+            "row": rows,
+            "variable": np.asarray(KPI_COLUMNS, dtype=object)[cols],
+            "zscore": zs,
+        })
 
     def compute(self, df):
-        out = []
+        """Full records (row values + variable + zscore) for every flagged cell."""
+        return self.records(df, self.compute_long(df))
+
+    @staticmethod
+    def records(df, hits):
+        """compute() output for df from compute_long() hits (possibly found elsewhere)."""
+        if hits.empty:
+            return pd.DataFrame()
+
+        # Only the flagged rows are materialised
+        out = df.iloc[hits["row"].to_numpy()].copy()
+        out["variable"] = hits["variable"].to_numpy()
+        out["zscore"] = hits["zscore"].to_numpy()
+
+        if not df["timestamp"].is_monotonic_increasing:
+            out = out.sort_values("timestamp", kind="stable")
+
+        return out
+
+    # ============================================================
+    # STREAMING MODE
+    # ============================================================
+    def prime(self, df):
+        """Reset the streaming state to the tail of df (the last `window` rows)."""
+        self._prime_values(df[KPI_COLUMNS].tail(self.window).to_numpy(dtype=float))
+
+    def _prime_values(self, values):
+        self._windows = {col: _RunningWindow(self.window) for col in KPI_COLUMNS}
+
+        for j, col in enumerate(KPI_COLUMNS):
+            for value in values[-self.window:, j]:
+                self._windows[col].push(value)
 
-        for col in ["sorting_capacity", "staff_available", "vehicles_ready", "congestion_level"]:
-            series = df[col]
-            roll_mean = series.rolling(self.window).mean()
-            roll_std = series.rolling(self.window).std()
+    def update(self, rows):
+        """
+        Fold newly appended rows into the streaming state and return their
+        anomalies, in the same format as compute(). Costs O(1) per row and
+        column (O(window) for scores on the threshold) instead of a rescan
+        of the whole history.
+        """
+        if self._windows is None:
+            raise RuntimeError("call prime() before update()")
 
-            zscores = (series - roll_mean) / roll_std
+        values = rows[KPI_COLUMNS].to_numpy(dtype=float)
+        if len(rows) >= _BULK_UPDATE_ROWS:
+            return self._update_bulk(rows, values)
 
-            # Find anomalies
-            anomalies = df[abs(zscores) > self.threshold]
+        hit_rows, hit_cols, hit_z = [], [], []
 
-            # 🔥 FIX: avoid SettingWithCopyWarning
-            if not anomalies.empty:
-                anomalies = anomalies.copy()                  # ← make safe copy
-                anomalies.loc[:, "variable"] = col            # ← safe assignment
-                out.append(anomalies)
+        for i in range(len(rows)):
+            for j, col in enumerate(KPI_COLUMNS):
+                window = self._windows[col]
+                window.push(values[i, j])
 
-        if not out:
+                z = window.zscore(self.threshold)
+                if abs(z) > self.threshold:
+                    hit_rows.append(i)
+                    hit_cols.append(col)
+                    hit_z.append(z)
+
+        if not hit_rows:
             return pd.DataFrame()
 
-        return pd.concat(out).sort_values("timestamp")
\ No newline at end of file
+        out = rows.iloc[hit_rows].copy()
+        out["variable"] = hit_cols
+        out["zscore"] = hit_z
+        return out
+
+    def _update_bulk(self, rows, values):
+        """Large appends: score window tail + new rows with the batch kernel, then re-prime."""
+        tail = np.column_stack([
+            np.fromiter(self._windows[col].values, dtype=float) for col in KPI_COLUMNS
+        ])
+        combined = np.concatenate([tail, values])
+
+        hits = self._flag(combined)
+        hits = hits[hits["row"] >= len(tail)]
+        self._prime_values(combined)
+
+        if hits.empty:
+            return pd.DataFrame()
+
+        out = rows.iloc[hits["row"].to_numpy() - len(tail)].copy()
+        out["variable"] = hits["variable"].to_numpy()
+        out["zscore"] = hits["zscore"].to_numpy()
+        return out
+
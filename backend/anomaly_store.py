@@ -0,0 +1,306 @@
+# backend/anomaly_store.py
+#
+# Persistent anomaly events (SQLite). Every detector setting (window,
+# threshold) has its events stored once, keyed by (setting, timestamp,
+# KPI), together with how far through the history that setting has been
+# scanned. New rows are scored incrementally: only the rows after the
+# covered ones are scored (plus window - 1 rows of context), so a setting
+# is scanned in full only the first time it is used or after the history
+# was rewritten. /anomalies is then a range query over the primary key.
+#
+# Retention keeps the store bounded: events older than
+# XENBER_ANOMALY_RETENTION_DAYS (relative to the newest row), more than
+# XENBER_ANOMALY_MAX_EVENTS per setting, and settings beyond the
+# XENBER_ANOMALY_MAX_CONFIGS most recently used are dropped.
+
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+
+from backend.anomaly import KPI_COLUMNS
+from backend.storage import to_epoch_ns
+from backend.workers import compute_anomalies
+
+ANOMALY_DB = os.environ.get("XENBER_ANOMALY_DB", "backend/data/anomalies.db")
+RETENTION_DAYS = float(os.environ.get("XENBER_ANOMALY_RETENTION_DAYS", "90"))
+MAX_EVENTS = int(os.environ.get("XENBER_ANOMALY_MAX_EVENTS", "1000000"))
+MAX_CONFIGS = int(os.environ.get("XENBER_ANOMALY_MAX_CONFIGS", "8"))
+PRUNE_INTERVAL = 60.0
+
+INTEGER_COLUMNS = ["sorting_capacity", "staff_available", "vehicles_ready"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS anomaly_events (
+    win INTEGER NOT NULL,
+    threshold REAL NOT NULL,
+    ts INTEGER NOT NULL,
+    kpi INTEGER NOT NULL,
+    zscore REAL NOT NULL,
+    sorting_capacity INTEGER,
+    staff_available INTEGER,
+    vehicles_ready INTEGER,
+    congestion_level REAL,
+    PRIMARY KEY (win, threshold, ts, kpi)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS anomaly_configs (
+    win INTEGER NOT NULL,
+    threshold REAL NOT NULL,
+    rows INTEGER NOT NULL,
+    last_ns INTEGER,
+    used_at REAL NOT NULL,
+    PRIMARY KEY (win, threshold)
+);
+"""
+
+
+def parse_cursor(cursor):
+    """'<epoch ns>-<kpi index>' → (ts, kpi); 400 when malformed."""
+    try:
+        ts, kpi = cursor.rsplit("-", 1)
+        return int(ts), int(kpi)
+    except (AttributeError, ValueError):
+        raise HTTPException(status_code=400, detail="after_cursor must be a cursor from X-Next-Cursor")
+
+
+class AnomalyEventStore:
+    """
+    SQLite event store. One connection shared under a lock (queries are
+    short index range scans); scoring runs outside it, serialised per
+    setting so a burst of identical requests scans once.
+    """
+
+    def __init__(self, path=ANOMALY_DB, pinned=()):
+        self.path = path
+        self.pinned = set(pinned)       # settings retention never drops
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+        self._lock = threading.Lock()
+        self._config_locks = {}
+        self._pruned_at = 0.0
+        self._touched = {}              # setting → last used_at written
+
+        self.scans = {"full": 0, "incremental": 0, "up_to_date": 0}
+        self.inserted = 0
+        self.pruned = 0
+
+    def _config_lock(self, key):
+        with self._lock:
+            return self._config_locks.setdefault(key, threading.Lock())
+
+    # ============================================================
+    # WRITING (INCREMENTAL SCANS)
+    # ============================================================
+    def catch_up(self, df, window, threshold, version=None):
+        """
+        Record the anomalies of the rows of df (sorted by timestamp) not
+        scanned yet for this setting; rescans in full when df no longer
+        starts with the rows scanned before. Returns the events recorded
+        by this call (compute() columns; empty when already up to date).
+        """
+        key = (int(window), float(threshold))
+        n = len(df)
+
+        with self._config_lock(key):
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT rows, last_ns FROM anomaly_configs WHERE win = ? AND threshold = ?", key
+                ).fetchone()
+
+            covered = 0
+            if row is not None:
+                rows, last_ns = row
+                if rows <= n and (rows == 0 or to_epoch_ns(df["timestamp"].iloc[rows - 1:rows])[0] == last_ns):
+                    covered = rows
+
+            if row is not None and covered == n:
+                self.scans["up_to_date"] += 1
+                self._touch(key)
+                return pd.DataFrame()
+
+            # window - 1 rows of context: the first row scored is `covered`
+            start = max(0, covered - key[0] + 1)
+            found = compute_anomalies(df.iloc[start:], key[0], key[1], version if start == 0 else None)
+            self.scans["incremental" if covered else "full"] += 1
+
+            last_ns = int(to_epoch_ns(df["timestamp"].iloc[-1:])[0]) if n else None
+            with self._lock, self._db:
+                self._db.execute("BEGIN")
+                if not covered:
+                    self._db.execute("DELETE FROM anomaly_events WHERE win = ? AND threshold = ?", key)
+                self._insert(key, found)
+                used_at = time.time()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO anomaly_configs (win, threshold, rows, last_ns, used_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (*key, n, last_ns, used_at),
+                )
+                self._touched[key] = used_at
+
+        if last_ns is not None and time.time() - self._pruned_at >= PRUNE_INTERVAL:
+            self.prune(last_ns)
+        return found
+
+    def _insert(self, key, found):
+        if found is None or found.empty:
+            return 0
+
+        kpi = pd.Series(range(len(KPI_COLUMNS)), index=KPI_COLUMNS)[found["variable"]].to_numpy()
+        rows = zip(
+            [key[0]] * len(found),
+            [key[1]] * len(found),
+            to_epoch_ns(found["timestamp"]).tolist(),
+            kpi.tolist(),
+            found["zscore"].astype(float).tolist(),
+            *(found[col].astype(float).tolist() for col in KPI_COLUMNS),
+        )
+        self._db.executemany(
+            "INSERT OR REPLACE INTO anomaly_events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+        self.inserted += len(found)
+        return len(found)
+
+    def _touch(self, key):
+        # LRU order only matters at prune time: write used_at at most once per PRUNE_INTERVAL
+        now = time.time()
+        if now - self._touched.get(key, 0.0) < PRUNE_INTERVAL:
+            return
+        with self._lock:
+            self._db.execute("UPDATE anomaly_configs SET used_at = ? WHERE win = ? AND threshold = ?",
+                             (now, *key))
+            self._touched[key] = now
+
+    # ============================================================
+    # READING (RANGE QUERIES)
+    # ============================================================
+    def query(self, window, threshold, since=None, until=None, after_cursor=None, limit=500):
+        """
+        Events of a setting in [since, until], ordered by time then KPI, as
+        (frame, next cursor). Without a cursor the newest `limit` events are
+        returned; `after_cursor` pages forward from an earlier X-Next-Cursor.
+        Frame columns match RollingZScoreAnomaly.compute().
+        """
+        where = ["win = ?", "threshold = ?"]
+        args = [int(window), float(threshold)]
+        if since is not None:
+            where.append("ts >= ?")
+            args.append(to_epoch_ns(since))
+        if until is not None:
+            where.append("ts <= ?")
+            args.append(to_epoch_ns(until))
+        if after_cursor is not None:
+            where.append("(ts, kpi) > (?, ?)")
+            args.extend(parse_cursor(after_cursor))
+
+        newest = after_cursor is None
+        order = "ts DESC, kpi DESC" if newest else "ts, kpi"
+        sql = (
+            f"SELECT ts, {', '.join(KPI_COLUMNS)}, kpi, zscore FROM anomaly_events "
+            f"WHERE {' AND '.join(where)} ORDER BY {order}"
+        )
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        if newest:
+            rows.reverse()
+
+        return self._frame(rows)
+
+    @staticmethod
+    def _frame(rows):
+        if not rows:
+            return pd.DataFrame(), None
+
+        cols = list(zip(*rows))
+        out = pd.DataFrame({"timestamp": np.asarray(cols[0], dtype=np.int64).view("datetime64[ns]")})
+        for j, col in enumerate(KPI_COLUMNS):
+            values = np.asarray(cols[1 + j], dtype=float)
+            out[col] = values.astype(np.int64) if col in INTEGER_COLUMNS else values
+        kpi = np.asarray(cols[-2], dtype=np.intp)
+        out["variable"] = np.asarray(KPI_COLUMNS, dtype=object)[kpi]
+        out["zscore"] = np.asarray(cols[-1], dtype=float)
+
+        last = rows[-1]
+        return out, f"{last[0]}-{last[-2]}"
+
+    def variables(self, window, threshold):
+        """KPIs with at least one stored event for the setting."""
+        with self._lock:
+            found = self._db.execute(
+                "SELECT DISTINCT kpi FROM anomaly_events WHERE win = ? AND threshold = ?",
+                (int(window), float(threshold)),
+            ).fetchall()
+        return [KPI_COLUMNS[k] for k in sorted(k for (k,) in found)]
+
+    # ============================================================
+    # RETENTION
+    # ============================================================
+    def prune(self, newest_ns):
+        """Apply the retention policy; returns the events removed."""
+        cutoff = newest_ns - int(RETENTION_DAYS * 86_400 * 10**9)
+        removed = 0
+
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            removed += self._db.execute("DELETE FROM anomaly_events WHERE ts < ?", (cutoff,)).rowcount
+
+            configs = self._db.execute(
+                "SELECT win, threshold FROM anomaly_configs ORDER BY used_at DESC"
+            ).fetchall()
+            kept = [c for c in configs if c in self.pinned]
+            for config in configs:
+                if config in self.pinned:
+                    continue
+                if len(kept) < MAX_CONFIGS:
+                    kept.append(config)
+                    continue
+                removed += self._db.execute(
+                    "DELETE FROM anomaly_events WHERE win = ? AND threshold = ?", config
+                ).rowcount
+                self._db.execute("DELETE FROM anomaly_configs WHERE win = ? AND threshold = ?", config)
+                self._touched.pop(config, None)
+
+            for config in kept:
+                boundary = self._db.execute(
+                    "SELECT ts FROM anomaly_events WHERE win = ? AND threshold = ? "
+                    "ORDER BY ts DESC LIMIT 1 OFFSET ?",
+                    (*config, MAX_EVENTS),
+                ).fetchone()
+                if boundary is not None:
+                    removed += self._db.execute(
+                        "DELETE FROM anomaly_events WHERE win = ? AND threshold = ? AND ts <= ?",
+                        (*config, boundary[0]),
+                    ).rowcount
+
+        self._pruned_at = time.time()
+        self.pruned += removed
+        return removed
+
+    def stats(self):
+        with self._lock:
+            configs = self._db.execute(
+                "SELECT c.win, c.threshold, c.rows, COUNT(e.ts) FROM anomaly_configs c "
+                "LEFT JOIN anomaly_events e ON e.win = c.win AND e.threshold = c.threshold "
+                "GROUP BY c.win, c.threshold ORDER BY c.used_at DESC"
+            ).fetchall()
+        return {
+            "configs": [
+                {"window": w, "threshold": t, "rows_scanned": rows, "events": events}
+                for w, t, rows, events in configs
+            ],
+            "scans": dict(self.scans),
+            "inserted": self.inserted,
+            "pruned": self.pruned,
+        }
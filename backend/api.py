@@ -1,36 +1,66 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from apscheduler.schedulers.background import BackgroundScheduler
 
-import pandas as pd
-import math
+import hashlib
+import threading
+import time
 import uuid
+from datetime import datetime
+from typing import Optional
 
 from backend.local_storage import (
     load_data,
     init_history,
-    append_random_row
+    append_random_row,
+    query_rows,
+    rows_since_version,
+    row_cursor,
+    data_version,
+    load_versioned,
+    cache_stats,
+    writer_stats,
+    on_append
 )
 
-from backend.anomaly import RollingZScoreAnomaly
+from backend.anomaly_store import AnomalyEventStore
 from backend.forecast import Forecaster
-from backend.optimize import optimize as build_suggestions, get_urgent_alerts, dismiss_alert
-
-
-
-# ============================================================
-# CLEAN JSON (remove NaN / inf)
-# ============================================================
-def clean_json(obj):
-    if isinstance(obj, dict):
-        return {k: clean_json(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [clean_json(v) for v in obj]
-    if isinstance(obj, float):
-        if math.isnan(obj) or math.isinf(obj):
-            return None
-        return obj
-    return obj
+from backend.model_registry import ForecasterRegistry
+from backend.broadcast import EventBroker
+from backend.pipeline import SnapshotPipeline, build_snapshot
+from backend.ingest import batch_format, ingest_batch, ingest_stats
+from backend.downsample import downsample_history, downsample_stats
+from backend.concurrency import SingleFlight, AdmissionControl
+from backend.workers import pool_stats
+from backend.sites import get_site, list_sites, sites_stats, fleet_snapshots
+from backend.rollups import (
+    load_saved as load_saved_rollups,
+    sync as sync_rollups,
+    on_append as fold_rollups,
+    query as query_rollups,
+    rollup_stats
+)
+from starlette.concurrency import run_in_threadpool
+from backend.metrics import (
+    REQUESTS,
+    REQUEST_SECONDS,
+    stage,
+    timed_job,
+    watch_scheduler,
+    register_collector,
+    render as render_metrics,
+    profile_request,
+    finish_profile
+)
+from backend.serialize import (
+    FastJSONResponse,
+    clean_json,
+    response_format,
+    frame_payload,
+    frame_response,
+    frame_split
+)
 
 
 # ============================================================
@@ -57,12 +87,294 @@ scheduler = BackgroundScheduler()
 def auto_generate():
     print("Appending synthetic row...")
     append_random_row()
+    run_pipeline()
+
+
+scheduler.add_job(timed_job("auto_generate", auto_generate), "interval", seconds=5, id="auto_generate")
+watch_scheduler(scheduler)
+
+
+# ============================================================
+# ANOMALY EVENTS (DEFAULT THRESHOLD / WINDOW)
+# ============================================================
+DEFAULT_THRESHOLD = 2.5
+DEFAULT_WINDOW = 10
+
+# Anomaly events, recorded once per setting as rows arrive (/anomalies reads them)
+ANOMALY_EVENTS = AnomalyEventStore(pinned=[(DEFAULT_WINDOW, DEFAULT_THRESHOLD)])
+ANOMALY_EVENTS.catch_up(load_data(), DEFAULT_WINDOW, DEFAULT_THRESHOLD, data_version())
+
+# New anomalies of the latest append (for /stream)
+_NEW_ANOMALIES = None
+
+
+@on_append
+def _record_anomalies(rows, version):
+    """Score the appended rows once: the events recorded here also feed /stream."""
+    global _NEW_ANOMALIES
+
+    df, version = load_versioned()
+    found = ANOMALY_EVENTS.catch_up(df, DEFAULT_WINDOW, DEFAULT_THRESHOLD, version)
+
+    # A full rescan (history rewritten) returns old events too: stream only the new ones
+    if not found.empty and not rows.empty:
+        found = found[found["timestamp"] >= rows["timestamp"].min()]
+    _NEW_ANOMALIES = found
+
+
+def default_anomalies(since=None, until=None):
+    """Anomalies of the default setting in [since, until], read from the event store."""
+    df, version = load_versioned()
+    with stage("anomaly"):
+        ANOMALY_EVENTS.catch_up(df, DEFAULT_WINDOW, DEFAULT_THRESHOLD, version)
+    return ANOMALY_EVENTS.query(DEFAULT_WINDOW, DEFAULT_THRESHOLD, since=since, until=until, limit=None)[0]
+
+
+# ============================================================
+# HOURLY / DAILY ROLLUPS (UPDATED AT WRITE TIME)
+# ============================================================
+load_saved_rollups()
+sync_rollups(*load_versioned())
+
+
+@on_append
+def _update_rollups(rows, version):
+    fold_rollups(rows, version)
+
+
+# Long-horizon forecaster, fitted on the hourly rollup of one data version
+_LONG_RANGE = {"version": None, "forecaster": None, "history": None}
+_LONG_RANGE_LOCK = threading.Lock()
+MAX_FORECAST_HOURS = 24 * 30
+
+
+def long_range_forecast(hours, fresh=False):
+    """Forecast `hours` ahead from a Forecaster trained on the hourly rollup (refit with fresh=True)."""
+    with _LONG_RANGE_LOCK:
+        version = data_version()
+        if fresh or _LONG_RANGE["version"] != version:
+            rollup = query_rollups("hour", history=load_versioned)
+            fc = Forecaster()
+            with stage("fit"):
+                fc.fit_rollup(rollup)
+            _LONG_RANGE.update(version=version, forecaster=fc, history=fc.rollup_history(rollup))
+        fc, history = _LONG_RANGE["forecaster"], _LONG_RANGE["history"]
+
+    with stage("predict"):
+        return fc.forecast_period(history, hours=hours)
+
+
+# ============================================================
+# FITTED FORECASTER (REFIT IN BACKGROUND ON NEW ROWS)
+# ============================================================
+FORECASTERS = ForecasterRegistry()
+FORECASTERS.warm()
+
+
+@on_append
+def _update_forecaster(rows, version):
+    FORECASTERS.on_append(rows, version)
+
+
+# ============================================================
+# LIVE UPDATES (SERVER-SENT EVENTS)
+# ============================================================
+BROKER = EventBroker()
+
+
+@on_append
+def _publish_updates(rows, version):
+    """Push the appended rows, their anomalies and a fresh forecast to /stream clients."""
+    if not BROKER.has_clients:
+        return
+
+    events = [("rows", {"version": version, "rows": frame_split(rows)})]
+
+    if _NEW_ANOMALIES is not None and not _NEW_ANOMALIES.empty:
+        events.append(("anomalies", {"version": version, "anomalies": frame_split(_NEW_ANOMALIES)}))
+
+    # One write per client per append
+    BROKER.publish_many(events)
+
+
+# ============================================================
+# SNAPSHOT PIPELINE (MATERIALISED READ ENDPOINTS)
+# ============================================================
+def _build_snapshot():
+    with stage("load"):
+        df, version = load_versioned()
+    model_version = FORECASTERS.version
+    fc = FORECASTERS.get()
+    with stage("anomaly"):
+        ANOMALY_EVENTS.catch_up(df, DEFAULT_WINDOW, DEFAULT_THRESHOLD, version)
+    anomaly_vars = ANOMALY_EVENTS.variables(DEFAULT_WINDOW, DEFAULT_THRESHOLD)
+    return build_snapshot(df, version, fc, anomaly_vars, model_version)
+
+
+PIPELINE = SnapshotPipeline(
+    build=_build_snapshot,
+    current_key=lambda: (data_version(), FORECASTERS.version),
+)
+
+
+def run_pipeline(force=False):
+    """Rebuild the snapshot after new rows; /stream clients get the new forecast."""
+    before = PIPELINE.version
+    snap = PIPELINE.run(force=force)
+
+    if BROKER.has_clients and snap.forecast_24h is not None and snap.version != before:
+        BROKER.publish("forecast", {
+            "version": snap.version,
+            "model_version": snap.model_version,
+            "forecast": frame_split(snap.forecast_24h),
+        })
+    return snap
+
+
+SNAPSHOT_FLIGHTS = SingleFlight("snapshot")
+
+
+def current_snapshot(fresh=False):
+    """The published snapshot in O(1); fresh=True recomputes it first."""
+    snap = PIPELINE.get()
+    if fresh or snap is None:
+        # A burst of fresh=true requests shares one rebuild per data version
+        key = (fresh, data_version(), FORECASTERS.version)
+        snap = SNAPSHOT_FLIGHTS.do(key, lambda: run_pipeline(force=fresh))
+    return snap
 
 
-scheduler.add_job(auto_generate, "interval", seconds=5)
+run_pipeline()
 scheduler.start()
 
 
+# ============================================================
+# ADMISSION CONTROL (PER-ENDPOINT CONCURRENCY LIMITS)
+# ============================================================
+# Requests allowed to run at once per endpoint; the rest queue for up to
+# XENBER_QUEUE_TIMEOUT seconds and are then rejected with 503 + Retry-After
+ENDPOINT_LIMITS = {
+    "/data": 8,
+    "/anomalies": 4,
+    "/forecast": 4,
+    "/forecast_one_hour": 4,
+    "/optimize": 4,
+    "/append": 2,
+    "/ingest": 2,
+    "/fleet/optimize": 2,
+}
+ADMISSION = AdmissionControl(ENDPOINT_LIMITS)
+
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """Innermost middleware: 304s answered from the ETag never take a slot."""
+    return await ADMISSION.run(request.url.path, lambda: call_next(request))
+
+
+# ============================================================
+# CONDITIONAL REQUESTS (ETAG / 304)
+# ============================================================
+# Data versions restart at 1 in every process: ETags and X-Data-Version carry
+# this boot id so a token from an earlier run never matches the new history
+BOOT_ID = uuid.uuid4().hex[:12]
+
+
+def version_token(version):
+    """X-Data-Version value for a data version of this process."""
+    return f"{BOOT_ID}-{version}"
+
+
+def parse_version_token(token):
+    """Data version of an X-Data-Version token; None if it comes from another boot."""
+    boot, _, version = (token or "").rpartition("-")
+    if boot != BOOT_ID or not version.isdigit():
+        return None
+    return int(version)
+
+
+def _etag_state(path, site_id=None):
+    """Everything a polled endpoint's body depends on, besides the query."""
+    if site_id is not None:
+        if path not in ("/data", "/anomalies", "/forecast", "/forecast_one_hour", "/optimize"):
+            return None
+        try:
+            version = get_site(site_id).history.data_version()
+        except HTTPException:
+            return None   # the endpoint answers 400 / 404
+        return (version, len(DISMISSED_ALERTS))
+    if path == "/data":
+        return (data_version(),)
+    if path == "/anomalies":
+        return (data_version(), PIPELINE.version)
+    if path == "/forecast" or path == "/forecast_one_hour":
+        return (data_version(), PIPELINE.version, FORECASTERS.version)
+    if path == "/optimize":
+        return (data_version(), PIPELINE.version, FORECASTERS.version, len(DISMISSED_ALERTS))
+    return None
+
+
+@app.middleware("http")
+async def conditional_get(request: Request, call_next):
+    """
+    Tag polled GET responses with an ETag built from the data version and
+    the request, and answer a matching If-None-Match with 304 without
+    running the endpoint. The version lookup takes the cache lock (and may
+    reload a changed store), so it runs in the thread pool, never on the
+    event loop.
+    """
+    if request.method != "GET":
+        return await call_next(request)
+
+    state = await run_in_threadpool(_etag_state, request.url.path, request.query_params.get("site_id"))
+    if state is None:
+        return await call_next(request)
+
+    key = f"{request.url.path}?{request.url.query}|{request.headers.get('accept', '')}"
+    digest = hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+    etag = f'"{BOOT_ID}-{"-".join(map(str, state))}-{digest}"'
+
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers["ETag"] = etag
+    return response
+
+
+# ============================================================
+# REQUEST METRICS (OUTERMOST MIDDLEWARE, COUNTS 304s TOO)
+# ============================================================
+_ROUTE_PATHS = set()
+
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    """Count every request and time it per route; optionally profile slow ones."""
+    profiler = profile_request()
+    status = 500
+    t0 = time.perf_counter()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        seconds = time.perf_counter() - t0
+        route = request.scope.get("route")
+        path = route.path if route is not None else request.url.path
+        if not _ROUTE_PATHS:
+            _ROUTE_PATHS.update(r.path for r in app.routes)
+        if path not in _ROUTE_PATHS:
+            path = "other"   # 404s share one label instead of one series per URL
+
+        REQUESTS.inc(request.method, path, status)
+        REQUEST_SECONDS.observe(seconds, request.method, path)
+        if profiler is not None:
+            # Joining the sampler and writing its file block: keep them off the event loop
+            await run_in_threadpool(finish_profile, profiler, seconds, request.method, path)
+
+
 # ============================================================
 # ROOT
 # ============================================================
@@ -75,90 +387,375 @@ def root():
 # GET HISTORY DATA
 # ============================================================
 @app.get("/data")
-def data(limit: int = 500):
-    df = load_data()
+def data(
+    request: Request,
+    limit: int = 500,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after_cursor: Optional[int] = None,
+    since_version: Optional[str] = None,
+    max_points: Optional[int] = None,
+    format: Optional[str] = None,
+    site_id: Optional[str] = None,
+    resolution: Optional[str] = None,
+):
+    """
+    History rows, optionally restricted to [since, until].
+
+    Without a cursor the newest `limit` rows of the window are returned.
+    Pass the X-Next-Cursor header back as `after_cursor` to page forward.
+    `format` (or the Accept header) selects records / split / arrow.
+
+    Polling clients pass the X-Data-Version header back as `since_version`
+    and get only the rows appended since (X-Delta: delta), or the newest
+    `limit` rows to start over from (X-Delta: full). A version from before
+    a server restart always gets the full answer.
+
+    Charts pass `max_points` instead: the whole [since, until] window comes
+    back downsampled per KPI as (timestamp, variable, value, anomaly) rows,
+    with every anomalous point kept.
+
+    With `site_id` the rows come from that site's history (limit, since,
+    until and max_points only) and carry a site_id column.
+
+    `resolution=hour|day` serves the maintained rollups instead of raw rows:
+    one row per bucket with <kpi>_mean / _min / _max / _count, the newest
+    `limit` buckets of [since, until].
+    """
+    fmt = response_format(request, format)
+
+    if resolution is not None:
+        if site_id is not None or since_version is not None or after_cursor is not None or max_points is not None:
+            raise HTTPException(status_code=400, detail="resolution combines with limit, since and until only")
+        with stage("load"):
+            out = query_rollups(resolution, since=since, until=until, limit=limit, history=load_versioned)
+        if out.empty and fmt == "records":
+            return []
+        with stage("serialize"):
+            return frame_response(out, fmt)
+
+    if site_id is not None:
+        if since_version is not None or after_cursor is not None:
+            raise HTTPException(status_code=400, detail="site histories are read with limit, since, until or max_points")
+        return _site_data(get_site(site_id), fmt, limit, since, until, max_points)
+
+    if max_points is not None:
+        if since_version is not None or after_cursor is not None:
+            raise HTTPException(status_code=400, detail="max_points cannot be combined with since_version or after_cursor")
+
+        out = downsample_history(
+            since, until, max_points,
+            anomalies=lambda: default_anomalies(since, until),
+        )
+        with stage("serialize"):
+            return frame_response(out, fmt)
+
+    if since_version is not None:
+        with stage("load"):
+            df, version, is_delta = rows_since_version(parse_version_token(since_version), limit=limit)
+        with stage("serialize"):
+            return frame_response(
+                df,
+                fmt,
+                headers={"X-Data-Version": version_token(version), "X-Delta": "delta" if is_delta else "full"},
+            )
+
+    with stage("load"):
+        df = query_rows(since=since, until=until, after_cursor=after_cursor, limit=limit)
 
     if df.empty:
-        return []
+        return [] if fmt == "records" else frame_response(df, fmt)
+
+    with stage("serialize"):
+        return frame_response(
+            df,
+            fmt,
+            headers={"X-Next-Cursor": str(row_cursor(df["timestamp"].iloc[-1]))},
+        )
 
-    df = df.sort_values("timestamp").tail(limit)
-    df["timestamp"] = df["timestamp"].astype(str)
 
-    return clean_json(df.to_dict(orient="records"))
+def _site_data(site, fmt, limit, since, until, max_points):
+    if max_points is not None:
+        out = downsample_history(
+            since, until, max_points, anomalies=lambda: site.anomalies(since=since, until=until)[0], site=site
+        )
+        with stage("serialize"):
+            return frame_response(out.assign(site_id=site.site_id), fmt)
+
+    with stage("load"):
+        df = site.history.query_rows(since=since, until=until, limit=limit)
+
+    if df.empty:
+        return [] if fmt == "records" else frame_response(df, fmt)
+
+    with stage("serialize"):
+        return frame_response(df.assign(site_id=site.site_id), fmt)
+
+
+# ============================================================
+# LIVE STREAM
+# ============================================================
+@app.get("/stream")
+def stream():
+    """
+    Server-Sent Events: `rows`, `anomalies` and `forecast` events (split
+    format payloads) after every append. Clients that fall more than
+    QUEUE_SIZE events behind are disconnected; resync with /data?since_version=.
+    """
+    return StreamingResponse(
+        BROKER.subscribe(hello={"version": data_version()}),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+# ============================================================
+# CACHE STATISTICS
+# ============================================================
+@app.get("/cache_stats")
+def cache_statistics():
+    return {
+        "data": cache_stats(),
+        "writer": writer_stats(),
+        "ingest": ingest_stats(),
+        "forecaster": FORECASTERS.stats(),
+        "stream": BROKER.stats(),
+        "snapshot": PIPELINE.stats(),
+        "downsample": downsample_stats(),
+        "coalescing": {
+            "snapshot": SNAPSHOT_FLIGHTS.stats(),
+        },
+        "admission": ADMISSION.stats(),
+        "pool": pool_stats(),
+        "sites": sites_stats(),
+        "rollups": rollup_stats(),
+        "anomaly_events": ANOMALY_EVENTS.stats(),
+    }
+
+
+# ============================================================
+# PROMETHEUS METRICS
+# ============================================================
+@register_collector
+def _collect_stats():
+    """Cache hit rates and state gauges, read from the *_stats() helpers per scrape."""
+    data, forecaster, snapshot = cache_stats(), FORECASTERS.stats(), PIPELINE.stats()
+    writer, stream, ingested = writer_stats(), BROKER.stats(), ingest_stats()
+    downsampled = downsample_stats()
+    rolled = rollup_stats()
+
+    return [
+        ("xenber_cache_hits_total", "counter", "Cache hits (data: parsed history, forecaster: model on current version).", [
+            ({"cache": "data"}, data["hits"]),
+            ({"cache": "forecaster"}, forecaster["hits"]),
+            ({"cache": "downsample"}, downsampled["hits"]),
+        ]),
+        ("xenber_cache_misses_total", "counter", "Cache misses (data: full reads, forecaster: stale model served).", [
+            ({"cache": "data"}, data["misses"]),
+            ({"cache": "forecaster"}, forecaster["misses"]),
+            ({"cache": "downsample"}, downsampled["misses"]),
+        ]),
+        ("xenber_snapshot_builds_total", "counter", "Snapshot pipeline runs by result.", [
+            ({"result": "built"}, snapshot["builds"]),
+            ({"result": "up_to_date"}, snapshot["skipped"]),
+        ]),
+        ("xenber_forecaster_refits_total", "counter", "Full forecaster refits.", [({}, forecaster["refits"])]),
+        ("xenber_writer_commits_total", "counter", "Group commits of the history writer.", [({}, writer["commits"])]),
+        ("xenber_writer_rows_total", "counter", "Rows committed by the history writer.", [({}, writer["rows"])]),
+        ("xenber_writer_queued", "gauge", "Appends waiting for the writer thread.", [({}, writer["queued"])]),
+        ("xenber_ingest_rows_total", "counter", "Rows accepted through POST /ingest.", [({}, ingested["rows"])]),
+        ("xenber_history_rows", "gauge", "Rows in the cached history.", [({}, data["rows"])]),
+        ("xenber_rollup_buckets", "gauge", "Buckets per rollup resolution.", [
+            ({"resolution": "hour"}, rolled["hour"]),
+            ({"resolution": "day"}, rolled["day"]),
+        ]),
+        ("xenber_rollup_rebuilds_total", "counter", "Rollup rebuilds from raw rows.", [({}, rolled["rebuilds"])]),
+        ("xenber_data_version", "gauge", "Current data version.", [({}, data["version"])]),
+        ("xenber_admission_active", "gauge", "Requests running per limited endpoint.", [
+            ({"route": route}, s["active"]) for route, s in ADMISSION.stats().items()
+        ]),
+        ("xenber_admission_waiting", "gauge", "Requests queued for a slot per limited endpoint.", [
+            ({"route": route}, s["waiting"]) for route, s in ADMISSION.stats().items()
+        ]),
+        ("xenber_stream_clients", "gauge", "Connected /stream clients.", [({}, stream["clients"])]),
+        ("xenber_stream_dropped_clients_total", "counter", "Slow /stream clients disconnected.", [({}, stream["dropped_clients"])]),
+    ]
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 # ============================================================
 # ADD ONE RANDOM ROW
 # ============================================================
 @app.get("/append")
-def append_row():
-    row = append_random_row()
+def append_row(site_id: Optional[str] = None):
+    if site_id is None:
+        row = append_random_row()
+        run_pipeline()
+    else:
+        row = {**get_site(site_id, create=True).append_random_row(), "site_id": site_id}
     row["timestamp"] = str(row["timestamp"])
     return clean_json(row)
 
 
 # ============================================================
-# ANOMALY DETECTION
+# BULK INGEST (JSON LINES / CSV / ARROW)
 # ============================================================
-@app.get("/anomalies")
-def anomalies(threshold: float = 2.5, window: int = 10):
-    df = load_data()
+@app.post("/ingest")
+async def ingest(
+    request: Request,
+    format: Optional[str] = None,
+    on_error: str = "reject",
+    site_id: Optional[str] = None,
+):
+    """
+    Append a batch of real telemetry in one write. The body is JSON lines,
+    CSV or an Arrow IPC stream (Content-Type or ?format=jsonl|csv|arrow).
+    Any invalid row rejects the batch (422) unless on_error=skip. Rows whose
+    timestamp is already stored are skipped as duplicates; rows older than
+    the stored history that are not stored reject the batch (409) unless
+    on_error=skip, where they are reported as late.
+
+    Rows go to a site's history when the batch has a site_id column (split
+    per site) or `site_id` is passed; new sites are created on first write.
+    """
+    if on_error not in ("reject", "skip"):
+        raise HTTPException(status_code=400, detail="on_error must be reject or skip")
+
+    fmt = batch_format(request.headers.get("content-type"), format)
+    body = await request.body()
+
+    report = await run_in_threadpool(ingest_batch, body, fmt, on_error, site_id)
+    if report["accepted"] and "sites" not in report:
+        await run_in_threadpool(run_pipeline)
+    return report
 
-    if df.empty:
-        return {"anomalies": [], "status": "no_anomalies"}
 
-    model = RollingZScoreAnomaly(window=window, threshold=threshold)
-    out = model.compute(df)
-
-    if out.empty:
-        return {"anomalies": [], "status": "no_anomalies"}
-
-    out["timestamp"] = out["timestamp"].astype(str)
-    return clean_json({
-        "anomalies": out.to_dict(orient="records"),
-        "status": "found"
-    })
+# ============================================================
+# ANOMALY DETECTION
+# ============================================================
+@app.get("/anomalies")
+def anomalies(
+    request: Request,
+    threshold: float = DEFAULT_THRESHOLD,
+    window: int = DEFAULT_WINDOW,
+    format: Optional[str] = None,
+    site_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after_cursor: Optional[str] = None,
+    limit: int = 500,
+):
+    """
+    Anomaly events of one detector setting from the event store, ordered by
+    time: the newest `limit` in [since, until], or the next `limit` after
+    `after_cursor` (the X-Next-Cursor of an earlier page). A setting not
+    seen before is scanned once; after that only new rows are scored.
+
+    With `site_id` the same query runs on that site's event store and the
+    events carry a site_id column.
+    """
+    fmt = response_format(request, format)
+    headers = {}
+
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+
+    if site_id is not None:
+        with stage("anomaly"):
+            out, cursor = get_site(site_id).anomalies(
+                window, threshold, since=since, until=until, after_cursor=after_cursor, limit=limit
+            )
+    else:
+        with stage("load"):
+            df, version = load_versioned()
+        # No SingleFlight here: concurrent requests for one setting queue on
+        # the store's per-setting lock, the first scans and the rest find
+        # the setting up to date
+        with stage("anomaly"):
+            ANOMALY_EVENTS.catch_up(df, window, threshold, version)
+        out, cursor = ANOMALY_EVENTS.query(
+            window, threshold, since=since, until=until, after_cursor=after_cursor, limit=limit
+        )
+
+    if cursor is not None:
+        headers["X-Next-Cursor"] = cursor
+
+    status = "no_anomalies" if out.empty else "found"
+
+    # Arrow carries only the frame; the status travels in a header
+    if fmt == "arrow":
+        with stage("serialize"):
+            return frame_response(out, fmt, headers={"X-Anomaly-Status": status, **headers})
+
+    if out.empty and fmt == "records":
+        return FastJSONResponse({"anomalies": [], "status": status}, headers=headers)
+
+    with stage("serialize"):
+        return FastJSONResponse({
+            "anomalies": frame_payload(out, fmt),
+            "status": status
+        }, headers=headers)
 
 
 # ============================================================
 # 24-HOUR FORECAST
 # ============================================================
 @app.get("/forecast")
-def forecast_24h():
-    df = load_data()
-
-    if df.empty or len(df) < 5:
+def forecast_24h(
+    request: Request,
+    format: Optional[str] = None,
+    fresh: bool = False,
+    site_id: Optional[str] = None,
+    hours: int = 24,
+):
+    """
+    24-hour forecast from the snapshot. Other `hours` (up to 30 days) come
+    from a forecaster trained on the hourly rollup, main history only.
+    fresh=true recomputes the snapshot (or refits the rollup forecaster).
+    """
+    fmt = response_format(request, format)
+
+    if hours != 24:
+        if hours < 1 or hours > MAX_FORECAST_HOURS:
+            raise HTTPException(status_code=400, detail=f"hours must be between 1 and {MAX_FORECAST_HOURS}")
+        if site_id is not None:
+            raise HTTPException(status_code=400, detail="rollup forecasts cover the main history only")
+        out = long_range_forecast(hours, fresh)
+        if out is None:
+            return {"error": "Not enough data for forecast"}
+        with stage("serialize"):
+            return frame_response(out, fmt)
+
+    snap = site_snapshot(site_id, fresh)
+
+    if snap.rows < 5:
         return {"error": "Not enough data for forecast"}
 
-    fc = Forecaster()
-    fc.fit(df)
-
-    out = fc.forecast_period(df, hours=24)
-    if out is None:
+    if snap.forecast_24h is None:
         return {"error": "Model not trained"}
 
-    out["timestamp"] = out["timestamp"].astype(str)
-
-    return clean_json(out.to_dict(orient="records"))
+    with stage("serialize"):
+        return frame_response(snap.forecast_24h, fmt)
 
 
 # ============================================================
 # 1-HOUR FORECAST
 # ============================================================
 @app.get("/forecast_one_hour")
-def forecast_one_hour():
-    df = load_data()
+def forecast_one_hour(fresh: bool = False, site_id: Optional[str] = None):
+    snap = site_snapshot(site_id, fresh)
 
-    if df.empty or len(df) < 5:
+    if snap.rows < 5:
         return {"error": "Not enough data"}
 
-    fc = Forecaster()
-    fc.fit(df)
-
-    row = fc.forecast_one_hour(df)
-    if row is None:
+    if snap.forecast_next is None:
         return {"error": "Not enough data for 1-hour forecast"}
 
+    row = dict(snap.forecast_next)
     row["timestamp"] = str(row["timestamp"])
     return clean_json(row)
 
@@ -167,32 +764,40 @@ def forecast_one_hour():
 # OPTIMIZATION ENGINE
 # ============================================================
 @app.get("/optimize")
-def optimization(threshold: float = 2.5, window: int = 10):
-    df = load_data()
-
-    if df.empty or len(df) < 5:
+def optimization(
+    threshold: float = DEFAULT_THRESHOLD,
+    window: int = DEFAULT_WINDOW,
+    fresh: bool = False,
+    site_id: Optional[str] = None,
+):
+    snap = site_snapshot(site_id, fresh)
+
+    if snap.rows < 5:
         return {"error": "Not enough data yet"}
 
-    # A) latest
-    latest = df.iloc[-1].to_dict()
-
-    # B) 1-hour forecast
-    fc = Forecaster()
-    fc.fit(df)
-    one_hour = fc.forecast_one_hour(df)
-
-    # C) anomaly detection – now using the requested threshold/window
-    anomaly_model = RollingZScoreAnomaly(window=window, threshold=threshold)
-    anomaly_df = anomaly_model.compute(df)
-
-    anomaly_vars = []
-    if anomaly_df is not None and len(anomaly_df) > 0:
-        anomaly_vars = list(anomaly_df["variable"].unique())
-
-    # D) urgent alerts from anomalies
+    # A) latest, B) 1-hour forecast and E) suggestions come from the snapshot
+    # C) anomalies too, unless a non-default threshold/window is requested
+    anomaly_vars = snap.anomaly_vars
+    if threshold != DEFAULT_THRESHOLD or window != DEFAULT_WINDOW:
+        if site_id is None:
+            with stage("load"):
+                df, version = load_versioned()
+            with stage("anomaly"):
+                ANOMALY_EVENTS.catch_up(df, window, threshold, version)
+            anomaly_vars = ANOMALY_EVENTS.variables(window, threshold)
+        else:
+            with stage("anomaly"):
+                anomaly_vars = get_site(site_id).anomaly_vars(window, threshold)
+
+    return FastJSONResponse(optimize_payload(snap, anomaly_vars, site_id))
+
+
+def optimize_payload(snap, anomaly_vars, site_id=None):
+    """/optimize body for a snapshot; alert ids of a site are prefixed with its site_id."""
+    # D) urgent alerts from anomalies (dismissals change between snapshots)
     urgent_alerts = []
     for var in anomaly_vars:
-        alert_id = f"{var}-alert"
+        alert_id = f"{var}-alert" if site_id is None else f"{site_id}:{var}-alert"
 
         if alert_id not in DISMISSED_ALERTS:
             urgent_alerts.append({
@@ -200,32 +805,53 @@ def optimization(threshold: float = 2.5, window: int = 10):
                 "message": f"URGENT: {var.replace('_',' ').title()} is behaving abnormally — immediate attention required."
             })
 
-    # E) comparison-based suggestions (keep your existing logic)
-    suggestions = {}
-
-    if one_hour:
-        for key in ["sorting_capacity", "staff_available", "vehicles_ready"]:
-            if key in latest and key in one_hour:
-                if one_hour[key] < latest[key]:
-                    suggestions[key] = (
-                        f"{key.replace('_',' ').title()} is expected to drop — consider boosting resources."
-                    )
-                elif one_hour[key] > latest[key]:
-                    suggestions[key] = (
-                        f"{key.replace('_',' ').title()} improving — maintain current operations."
-                    )
-
-        if "congestion_level" in latest and "congestion_level" in one_hour:
-            if one_hour["congestion_level"] > latest["congestion_level"] + 0.1:
-                suggestions["congestion_level"] = (
-                    "Congestion expected to worsen — consider load redistribution."
-                )
-
-    return clean_json({
-        "latest": latest,
-        "forecast_next": one_hour,
+    return {
+        "latest": snap.latest,
+        "forecast_next": snap.forecast_next,
         "urgent_alerts": urgent_alerts,
-        "suggestions": suggestions,
+        "suggestions": snap.suggestions,
+    }
+
+
+def site_snapshot(site_id=None, fresh=False):
+    """Published snapshot of the main history, or the snapshot of one site."""
+    if site_id is None:
+        return current_snapshot(fresh)
+    return get_site(site_id).snapshot(fresh)
+
+
+# ============================================================
+# SITES + FLEET-WIDE OPTIMIZATION
+# ============================================================
+@app.get("/sites")
+def sites():
+    return {"sites": list_sites()}
+
+
+@app.get("/fleet/optimize")
+def fleet_optimization(budget_ms: int = 1000):
+    """
+    /optimize for every site, computed in parallel. Answers within about
+    budget_ms: sites whose snapshot is not ready by then are listed under
+    `pending` and keep computing in the background for the next call.
+    """
+    if budget_ms < 1 or budget_ms > 60_000:
+        raise HTTPException(status_code=400, detail="budget_ms must be between 1 and 60000")
+
+    fleet = fleet_snapshots(list_sites(), budget_ms / 1000)
+
+    results = {}
+    for site_id, snap in sorted(fleet["ready"].items()):
+        if snap.rows < 5:
+            results[site_id] = {"error": "Not enough data yet"}
+        else:
+            results[site_id] = optimize_payload(snap, snap.anomaly_vars, site_id)
+
+    return FastJSONResponse({
+        "sites": results,
+        "pending": fleet["pending"],
+        "failed": fleet["failed"],
+        "elapsed_ms": fleet["seconds"] * 1000,
     })
 
 from fastapi import Request
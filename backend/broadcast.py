@@ -0,0 +1,131 @@
+# backend/broadcast.py
+#
+# Fan-out of live updates to /stream (Server-Sent Events) clients.
+#
+# Events are published from whatever thread produced them (the scheduler's
+# append job) and encoded exactly once; the event loop then only drops the
+# same bytes into every client's bounded queue. A client whose queue is full
+# is too slow to keep up and gets disconnected instead of buffered.
+
+import asyncio
+import threading
+
+from backend.serialize import dumps
+
+# Events a client may fall behind by before it is dropped
+QUEUE_SIZE = 64
+
+# Comment line sent when nothing happened for this long (keeps proxies open)
+KEEPALIVE_SECONDS = 15
+
+
+def sse_message(event, data):
+    """One Server-Sent Events frame (data encoded as JSON)."""
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+class _Client:
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.dropped = False
+
+
+class EventBroker:
+    """Bounded per-client queues fed from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = set()
+        self._loop = None
+
+        self.published = 0
+        self.dropped = 0
+
+    @property
+    def has_clients(self):
+        return bool(self._clients)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "published": self.published,
+                "dropped_clients": self.dropped,
+            }
+
+    # ============================================================
+    # PUBLISHING (ANY THREAD)
+    # ============================================================
+    def publish(self, event, data):
+        """Encode the event once and hand it to the event loop for fan-out."""
+        self.publish_many([(event, data)])
+
+    def publish_many(self, events):
+        """Publish several (event, data) pairs as one write per client."""
+        with self._lock:
+            loop = self._loop
+            if loop is None or not self._clients:
+                return
+
+        message = b"".join(sse_message(event, data) for event, data in events)
+        try:
+            loop.call_soon_threadsafe(self._fanout, message)
+        except RuntimeError:
+            pass  # loop already closed (shutdown)
+
+    def _fanout(self, message):
+        with self._lock:
+            clients = list(self._clients)
+            self.published += 1
+
+        for client in clients:
+            if client.dropped:
+                continue
+            try:
+                client.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Slow consumer: cut it loose rather than buffer without bound
+                client.dropped = True
+                with self._lock:
+                    self._clients.discard(client)
+                    self.dropped += 1
+                while not client.queue.empty():
+                    client.queue.get_nowait()
+                client.queue.put_nowait(None)
+
+    # ============================================================
+    # SUBSCRIBING (EVENT LOOP)
+    # ============================================================
+    async def subscribe(self, hello=None):
+        """Async iterator of SSE frames for one client; ends when it is dropped."""
+        client = _Client()
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._clients.add(client)
+
+        try:
+            if hello is not None:
+                yield sse_message("hello", hello)
+
+            while True:
+                try:
+                    message = await asyncio.wait_for(client.queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+
+                # Everything already queued goes out in a single write
+                batch = [message]
+                while message is not None and not client.queue.empty():
+                    message = client.queue.get_nowait()
+                    batch.append(message)
+
+                if message is None:
+                    batch.pop()
+                    if batch:
+                        yield b"".join(batch)
+                    return
+                yield b"".join(batch)
+        finally:
+            with self._lock:
+                self._clients.discard(client)
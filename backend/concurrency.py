@@ -0,0 +1,155 @@
+# backend/concurrency.py
+#
+# Keeping bursts cheap and bounded:
+#   SingleFlight      concurrent identical computations (same key, e.g.
+#                     endpoint + params + data version) run once; the other
+#                     callers wait for that result instead of repeating it.
+#   AdmissionControl  per-route concurrency limits; a request that cannot get
+#                     a slot within the queue timeout is rejected with 503
+#                     and Retry-After instead of piling up in the threadpool.
+
+import asyncio
+import math
+import os
+import threading
+from concurrent.futures import Future
+
+from fastapi.responses import JSONResponse
+
+from backend.metrics import Counter
+
+# Seconds a request may wait for a slot before it gets a 503
+QUEUE_TIMEOUT = float(os.environ.get("XENBER_QUEUE_TIMEOUT", "2.0"))
+
+COALESCED = Counter(
+    "xenber_coalesced_calls_total", "Calls that waited for an identical in-flight computation.",
+    labels=("flight",),
+)
+REJECTED = Counter(
+    "xenber_admission_rejected_total", "Requests rejected with 503 after waiting for a slot.",
+    labels=("route",),
+)
+
+
+# ============================================================
+# SINGLE FLIGHT (REQUEST COALESCING)
+# ============================================================
+class SingleFlight:
+    """
+    do(key, fn) runs fn once per key at a time: callers arriving while it
+    runs block on the same Future and get the same result (or exception).
+    The last result is kept too, so a burst that is admitted in waves still
+    computes once as long as the key (which includes the data version) holds.
+    Shared results must be treated as read-only.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._last = None   # (key, result) of the latest successful call
+
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            last = self._last
+            if last is not None and last[0] == key:
+                self.followers += 1
+                COALESCED.inc(self.name)
+                return last[1]
+
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not leader:
+            COALESCED.inc(self.name)
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            with self._lock:
+                self._last = (key, result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "followers": self.followers,
+                "in_flight": len(self._calls),
+            }
+
+
+# ============================================================
+# ADMISSION CONTROL (PER-ROUTE CONCURRENCY LIMITS)
+# ============================================================
+class AdmissionControl:
+    """
+    Per-route asyncio semaphores, acquired on the event loop before a
+    request reaches the threadpool. Routes without a limit pass through.
+    """
+
+    def __init__(self, limits, queue_timeout=QUEUE_TIMEOUT):
+        self.limits = dict(limits)
+        self.queue_timeout = queue_timeout
+        self._slots = {route: asyncio.Semaphore(n) for route, n in self.limits.items()}
+
+        self.active = {route: 0 for route in self.limits}
+        self.waiting = {route: 0 for route in self.limits}
+        self.rejected = {route: 0 for route in self.limits}
+
+    def retry_after(self):
+        return str(max(1, math.ceil(self.queue_timeout)))
+
+    async def run(self, route, call):
+        """Await call() inside the route's slot; 503 if none frees up in time."""
+        slots = self._slots.get(route)
+        if slots is None:
+            return await call()
+
+        self.waiting[route] += 1
+        try:
+            await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected[route] += 1
+            REJECTED.inc(route)
+            return JSONResponse(
+                {"detail": f"{route} is busy, retry shortly"},
+                status_code=503,
+                headers={"Retry-After": self.retry_after()},
+            )
+        finally:
+            self.waiting[route] -= 1
+
+        self.active[route] += 1
+        try:
+            return await call()
+        finally:
+            self.active[route] -= 1
+            slots.release()
+
+    def stats(self):
+        return {
+            route: {
+                "limit": limit,
+                "active": self.active[route],
+                "waiting": self.waiting[route],
+                "rejected": self.rejected[route],
+            }
+            for route, limit in self.limits.items()
+        }
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import random
 from datetime import datetime, timedelta
@@ -67,36 +68,106 @@ def apply_daily_patterns(timestamp, base):
     }
 
 
+# -------------------------------------------
+# Vectorised daily patterns (whole arrays at once)
+# -------------------------------------------
+def _daily_patterns(hours, rng):
+    """
+    apply_daily_patterns for arrays: draws the base values and the
+    hour-of-day adjustments for every row in one go.
+    """
+    n = len(hours)
+
+    sorting_capacity = rng.integers(60, 100, n, endpoint=True)
+    staff = rng.integers(30, 60, n, endpoint=True)
+    vehicles = rng.integers(10, 20, n, endpoint=True)
+    congestion = rng.uniform(0.1, 0.9, n)
+
+    morning = (hours >= 8) & (hours <= 11)
+    lunch = (hours >= 12) & (hours <= 14)
+    afternoon = (hours >= 15) & (hours <= 18)
+    evening = (hours >= 19) & (hours <= 22)
+    night = ~(morning | lunch | afternoon | evening)
+
+    # Morning surge: 8–11am
+    sorting_capacity += np.where(morning, rng.integers(10, 25, n, endpoint=True), 0)
+    staff += np.where(morning, rng.integers(2, 5, n, endpoint=True), 0)
+    congestion = np.where(morning, np.maximum(congestion - 0.1, 0.05), congestion)
+
+    # Lunch slowdown: 12–2pm
+    sorting_capacity -= np.where(lunch, rng.integers(5, 15, n, endpoint=True), 0)
+    staff -= np.where(lunch, rng.integers(3, 6, n, endpoint=True), 0)
+    congestion += np.where(lunch, 0.1, 0.0)
+
+    # Afternoon congestion: 3–6pm
+    congestion += np.where(afternoon, rng.uniform(0.15, 0.3, n), 0.0)
+    vehicles -= np.where(afternoon, rng.integers(1, 3, n, endpoint=True), 0)
+
+    # Evening recovery: 7–10pm
+    sorting_capacity += np.where(evening, rng.integers(5, 15, n, endpoint=True), 0)
+    congestion -= np.where(evening, rng.uniform(0.05, 0.1, n), 0.0)
+
+    # Night low activity: 11pm–6am
+    sorting_capacity -= np.where(night, rng.integers(5, 12, n, endpoint=True), 0)
+    staff -= np.where(night, rng.integers(2, 4, n, endpoint=True), 0)
+    congestion -= np.where(night, 0.05, 0.0)
+
+    # Safety bounds
+    return {
+        "sorting_capacity": np.maximum(sorting_capacity, 10),
+        "staff_available": np.maximum(staff, 3),
+        "vehicles_ready": np.maximum(vehicles, 2),
+        "congestion_level": np.clip(congestion, 0, 1),
+    }
+
+
+# -------------------------------------------
+# Vectorised history generator (load / soak tests)
+# -------------------------------------------
+def iter_history(n, start=None, interval="30min", sites=1, seed=0, chunk_rows=1_000_000):
+    """
+    Yield n timestamps of history per site as DataFrames of at most
+    `chunk_rows` timestamps each, in time order. With sites > 1 every
+    timestamp has one row per site and a `site_id` column is added.
+
+    The output is fully determined by (n, start, interval, sites, seed,
+    chunk_rows); seed=None draws fresh randomness.
+    """
+    step = pd.Timedelta(interval)
+    if start is None:
+        start = datetime.now().replace(second=0, microsecond=0) - step * n
+    start = pd.Timestamp(start)
+
+    rng = np.random.default_rng(seed)
+    site_ids = np.array([f"site-{i:03d}" for i in range(sites)], dtype=object)
+
+    for offset in range(0, n, chunk_rows):
+        count = min(chunk_rows, n - offset)
+        ts = pd.date_range(start + step * offset, periods=count, freq=step)
+
+        if sites > 1:
+            ts = ts.repeat(sites)
+
+        df = pd.DataFrame({"timestamp": ts, **_daily_patterns(ts.hour.to_numpy(), rng)}, columns=COLUMNS)
+        if sites > 1:
+            df["site_id"] = np.tile(site_ids, count)
+        yield df
+
+
+def generate_history(n, start=None, interval="30min", sites=1, seed=0):
+    """All of iter_history() as one DataFrame."""
+    frames = list(iter_history(n, start=start, interval=interval, sites=sites, seed=seed))
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
 # -------------------------------------------
 # Generate initial history
 # -------------------------------------------
 def generate_initial_history(n=20):
     now = datetime.now().replace(second=0, microsecond=0)
-    rows = []
-
-    for i in range(n):
-        ts = now - timedelta(minutes=30 * (n - i))
-
-        # Base values
-        base = {
-            "sorting_capacity": random.randint(60, 100),
-            "staff_available": random.randint(30, 60),
-            "vehicles_ready": random.randint(10, 20),
-            "congestion_level": random.uniform(0.1, 0.9)
-        }
-
-        # Apply time-of-day realism
-        adjusted = apply_daily_patterns(ts, base)
-
-        rows.append([
-            ts,
-            adjusted["sorting_capacity"],
-            adjusted["staff_available"],
-            adjusted["vehicles_ready"],
-            adjusted["congestion_level"],
-        ])
-
-    return pd.DataFrame(rows, columns=COLUMNS)
+    return generate_history(n, start=now - timedelta(minutes=30 * n), seed=None)
 
 
 # -------------------------------------------
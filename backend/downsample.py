@@ -0,0 +1,136 @@
+# backend/downsample.py
+#
+# Server-side downsampling for the KPI charts (/data?max_points=). Each KPI
+# is reduced on its own with min/max bucketing: the window is cut into
+# max_points/2 equal runs of rows and only the lowest and highest point of
+# every run survive, so spikes and dips stay visible. Anomalous points
+# (default detector) are always kept exactly. Results are cached per
+# (site, window, max_points, data version).
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+
+from backend.anomaly import KPI_COLUMNS
+from backend.concurrency import SingleFlight
+from backend.local_storage import HISTORY
+
+# Downsampled windows kept (one entry per site / since / until / max_points / version)
+CACHE_SIZE = 32
+MAX_POINTS_LIMIT = 100_000
+
+_LOCK = threading.Lock()
+_CACHE = OrderedDict()
+_STATS = {"hits": 0, "misses": 0}
+_FLIGHTS = SingleFlight("downsample")   # concurrent misses for one key compute once
+
+
+# ============================================================
+# MIN / MAX BUCKETS (VECTORISED)
+# ============================================================
+def minmax_indices(values, buckets):
+    """
+    Positions of the min and max of `values` in each of `buckets` equal runs
+    of rows, plus the first and last point. NaNs are never picked.
+    """
+    n = len(values)
+    if n <= 2 * buckets:
+        return np.flatnonzero(np.isfinite(values))
+
+    size = -(-n // buckets)   # rows per bucket (ceil)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = values
+    grid = padded.reshape(buckets, size)
+
+    starts = np.arange(buckets) * size
+    lows = starts + np.argmin(np.where(np.isnan(grid), np.inf, grid), axis=1)
+    highs = starts + np.argmax(np.where(np.isnan(grid), -np.inf, grid), axis=1)
+
+    picked = np.unique(np.concatenate([[0, n - 1], lows, highs]))
+    picked = picked[picked < n]
+    return picked[np.isfinite(values[picked])]
+
+
+def _anomaly_positions(ts_ns, anomalies, variable):
+    """Row positions in the window of the anomalies flagged for `variable`."""
+    if anomalies is None or anomalies.empty:
+        return np.empty(0, dtype=np.intp)
+
+    flagged = anomalies.loc[anomalies["variable"] == variable, "timestamp"]
+    want = flagged.to_numpy(dtype="datetime64[ns]").view("i8")
+    pos = np.searchsorted(ts_ns, want)
+    inside = pos < len(ts_ns)
+    pos = pos[inside]
+    return pos[ts_ns[pos] == want[inside]]
+
+
+def downsample_frame(df, anomalies, max_points):
+    """
+    Long-format series (timestamp, variable, value, anomaly) with at most
+    about max_points rows per KPI, plus every anomalous point.
+    """
+    ts = df["timestamp"]
+    ts_ns = ts.to_numpy(dtype="datetime64[ns]").view("i8")
+    buckets = max(1, max_points // 2)
+    parts = []
+
+    for col in KPI_COLUMNS:
+        values = df[col].to_numpy(dtype=float)
+        flagged = _anomaly_positions(ts_ns, anomalies, col)
+
+        keep = np.union1d(minmax_indices(values, buckets), flagged)
+        is_anomaly = np.zeros(len(df), dtype=bool)
+        is_anomaly[flagged] = True
+
+        parts.append(pd.DataFrame({
+            "timestamp": ts.to_numpy()[keep],
+            "variable": col,
+            "value": values[keep],
+            "anomaly": is_anomaly[keep],
+        }))
+
+    return pd.concat(parts, ignore_index=True)
+
+
+# ============================================================
+# CACHED ENTRY POINT (/data?max_points=)
+# ============================================================
+def downsample_history(since, until, max_points, anomalies, site=None):
+    """
+    Downsampled [since, until] window of the cached history (or of a
+    sites.SiteStore's). `anomalies()` returns the anomalies to keep; it only
+    runs on a cache miss.
+    """
+    if max_points < 2 or max_points > MAX_POINTS_LIMIT:
+        raise HTTPException(status_code=400, detail=f"max_points must be between 2 and {MAX_POINTS_LIMIT}")
+
+    site_id = None if site is None else site.site_id
+    history = HISTORY if site is None else site.history
+    version = history.data_version()
+    key = (site_id, since, until, max_points, version)
+    with _LOCK:
+        if key in _CACHE:
+            _CACHE.move_to_end(key)
+            _STATS["hits"] += 1
+            return _CACHE[key]
+        _STATS["misses"] += 1
+
+    def compute():
+        df, version = history.query_versioned(since=since, until=until)
+        out = downsample_frame(df, anomalies(), max_points)
+
+        with _LOCK:
+            _CACHE[(site_id, since, until, max_points, version)] = out
+            while len(_CACHE) > CACHE_SIZE:
+                _CACHE.popitem(last=False)
+        return out
+
+    return _FLIGHTS.do(key, compute)
+
+
+def downsample_stats():
+    with _LOCK:
+        return {**_STATS, "entries": len(_CACHE), "coalesced": _FLIGHTS.followers}
@@ -1,17 +1,94 @@
 import pandas as pd
 import numpy as np
-from datetime import timedelta
 from sklearn.linear_model import LinearRegression
 
+# Cyclic hour-of-day encoding, indexed by hour
+_HOUR_SIN = np.sin(2 * np.pi * np.arange(24) / 24)
+_HOUR_COS = np.cos(2 * np.pi * np.arange(24) / 24)
+_ONE_HOUR = np.timedelta64(1, "h")
+
+
+class OnlineLinearRegression:
+    """
+    Multi-output least squares with an intercept, kept as sufficient
+    statistics (weighted sums of x, y, x·xᵀ and x·yᵀ) so rows can be folded
+    in one batch at a time in O(features²) each. `forgetting` < 1 decays old
+    rows exponentially. Coefficients are solved on demand from the centred
+    normal equations, which gives the same fit as sklearn's LinearRegression.
+    """
+
+    def __init__(self, n_features, n_targets, forgetting=1.0):
+        self.forgetting = forgetting
+        self.n = 0.0
+        self.sum_x = np.zeros(n_features)
+        self.sum_y = np.zeros(n_targets)
+        self.sxx = np.zeros((n_features, n_features))
+        self.sxy = np.zeros((n_features, n_targets))
+        self._solved = None
+
+    def partial_fit(self, X, Y):
+        X = np.asarray(X, dtype=float)
+        Y = np.asarray(Y, dtype=float)
+        k = len(X)
+        if k == 0:
+            return self
+
+        if self.forgetting == 1.0:
+            w = np.ones(k)
+            decay = 1.0
+        else:
+            # Row i of the batch ends up decayed (k - 1 - i) times
+            w = self.forgetting ** np.arange(k - 1, -1, -1, dtype=float)
+            decay = self.forgetting ** k
+
+        Xw = X * w[:, None]
+        self.n = decay * self.n + w.sum()
+        self.sum_x = decay * self.sum_x + Xw.sum(axis=0)
+        self.sum_y = decay * self.sum_y + (Y * w[:, None]).sum(axis=0)
+        self.sxx = decay * self.sxx + Xw.T @ X
+        self.sxy = decay * self.sxy + Xw.T @ Y
+
+        self._solved = None
+        return self
+
+    def _solve(self):
+        if self._solved is None:
+            mean_x = self.sum_x / self.n
+            mean_y = self.sum_y / self.n
+            cxx = self.sxx - self.n * np.outer(mean_x, mean_x)
+            cxy = self.sxy - self.n * np.outer(mean_x, mean_y)
+
+            beta = np.linalg.lstsq(cxx, cxy, rcond=None)[0]     # (features, targets)
+            self._solved = (beta.T, mean_y - mean_x @ beta)
+        return self._solved
+
+    @property
+    def coef_(self):
+        return self._solve()[0]
+
+    @property
+    def intercept_(self):
+        return self._solve()[1]
+
+    def predict(self, X):
+        coef, intercept = self._solve()
+        return np.asarray(X, dtype=float) @ coef.T + intercept
+
 
 class Forecaster:
     """
     Timestamp-aware forecasting model using linear regression + 
     cyclic hour-of-day features (sin/cos) to introduce natural patterns.
+
+    With online=True the regression is an OnlineLinearRegression: fit()
+    builds it once and update() folds newly appended rows into it without
+    refitting the history.
     """
 
-    def __init__(self):
+    def __init__(self, online=False, forgetting=1.0):
         self.model = None
+        self.online = online
+        self.forgetting = forgetting
         self.columns = [
             "sorting_capacity",
             "staff_available",
@@ -19,6 +96,13 @@ class Forecaster:
             "congestion_level"
         ]
 
+        # online mode: sufficient statistics (built by fit()), feature row of
+        # the newest clean row (pairs with the next appended row) and the
+        # number of clean rows seen
+        self._stats = None
+        self._last_features = None
+        self._rows_seen = 0
+
     # ============================================================
     # CLEAN INPUT DATA
     # ============================================================
@@ -42,10 +126,29 @@ class Forecaster:
 
         return df
 
+    # ============================================================
+    # FEATURE ARRAYS (NO FRAME COPIES)
+    # ============================================================
+    def _feature_arrays(self, df):
+        """(features, targets) arrays for the clean rows of df."""
+        values = np.column_stack([df[col].to_numpy(dtype=float) for col in self.columns])
+        keep = np.isfinite(values).all(axis=1)
+
+        values = values[keep]
+        stamps = df["timestamp"].to_numpy()[keep]
+        hours = stamps.astype("datetime64[h]").astype(np.int64) % 24
+        angle = 2 * np.pi * hours / 24
+
+        features = np.column_stack([values, np.sin(angle), np.cos(angle)])
+        return features, values
+
     # ============================================================
     # FIT MODEL
     # ============================================================
     def fit(self, df):
+        if self.online:
+            return self._fit_online(df)
+
         df = self._clean_df(df)
         df = self._add_time_features(df)
 
@@ -65,63 +168,164 @@ class Forecaster:
         return model
 
     # ============================================================
-    # PREDICT NEXT STEP
+    # FIT ON ROLLUPS (LONG HORIZONS)
     # ============================================================
-    def _predict_next(self, last_row):
-        # compute next timestamp
-        next_ts = last_row["timestamp"] + timedelta(hours=1)
-        next_hour = next_ts.hour
+    def rollup_history(self, rollup):
+        """History-shaped frame from an hourly rollup frame: one row per bucket, KPIs = bucket means."""
+        out = pd.DataFrame({"timestamp": rollup["timestamp"]})
+        for col in self.columns:
+            out[col] = rollup[f"{col}_mean"].to_numpy()
+        return out
 
-        hour_sin = np.sin(2 * np.pi * next_hour / 24)
-        hour_cos = np.cos(2 * np.pi * next_hour / 24)
+    def fit_rollup(self, rollup):
+        """
+        Fit on an hourly rollup (backend.rollups) instead of raw rows, so
+        every training step is exactly one hour, like the forecast steps.
+        Forecast from self.rollup_history(rollup) afterwards.
+        """
+        return self.fit(self.rollup_history(rollup))
 
-        # build feature vector
-        features = pd.DataFrame([[
-            last_row["sorting_capacity"],
-            last_row["staff_available"],
-            last_row["vehicles_ready"],
-            last_row["congestion_level"],
-            hour_sin,
-            hour_cos
-        ]], columns=self.columns + ["hour_sin", "hour_cos"])
+    # ============================================================
+    # ONLINE TRAINING
+    # ============================================================
+    def _fit_online(self, df):
+        self.model = None
+        self._stats = OnlineLinearRegression(
+            len(self.columns) + 2, len(self.columns), forgetting=self.forgetting
+        )
+        self._last_features = None
+        self._rows_seen = 0
+        return self.update(df)
 
-        pred = self.model.predict(features)[0]
+    def update(self, rows):
+        """
+        Fold newly appended rows into the online model: O(rows · features²),
+        independent of how much history has been seen already.
+        """
+        if not self.online:
+            raise RuntimeError("update() needs Forecaster(online=True)")
+        if self._stats is None:
+            raise RuntimeError("call fit() before update()")
 
-        return {
-            "timestamp": next_ts,
-            "sorting_capacity": int(max(pred[0], 0)),
-            "staff_available": int(max(pred[1], 0)),
-            "vehicles_ready": int(max(pred[2], 0)),
-            "congestion_level": float(min(max(pred[3], 0), 1.0))
+        features, targets = self._feature_arrays(rows)
+        if len(features) == 0:
+            return self.model
+
+        # Each row's target is paired with the previous clean row's features
+        if self._last_features is not None:
+            X = np.vstack([self._last_features, features[:-1]])
+            Y = targets
+        else:
+            X, Y = features[:-1], targets[1:]
+
+        self._stats.partial_fit(X, Y)
+        self._last_features = features[-1:]
+        self._rows_seen += len(features)
+
+        if self._rows_seen >= 5:
+            self.model = self._stats
+        return self.model
+
+    # ============================================================
+    # LAST CLEAN ROW (NO FULL-FRAME COPY)
+    # ============================================================
+    def _last_clean_row(self, df):
+        """(timestamp, KPI vector) of the newest row without NaN/inf KPIs."""
+        n = len(df)
+        columns = [df[col].to_numpy() for col in self.columns]   # views, no copy
+
+        size = 16
+        while True:
+            start = max(n - size, 0)
+            values = np.column_stack([np.asarray(c[start:], dtype=float) for c in columns])
+            clean = np.flatnonzero(np.isfinite(values).all(axis=1))
+
+            if len(clean):
+                i = clean[-1]
+                return pd.Timestamp(df["timestamp"].iloc[start + i]), values[i]
+            if start == 0:
+                return None, None
+            size *= 4
+
+    # ============================================================
+    # RECURSIVE MULTI-STEP ENGINE
+    # ============================================================
+    def forecast_arrays(self, df, hours=24):
+        """
+        Recursive hourly forecast as columns: {"timestamp": datetime64[ns],
+        <kpi>: ndarray}. The coefficients are read once, the sin/cos terms
+        for every step come from a 24-entry table in one vectorised product,
+        and only the 4x4 KPI recursion (with the same clipping as before:
+        counts floored at 0 and truncated, congestion kept in [0, 1]) runs
+        per step, writing into preallocated output.
+        """
+        if self.model is None:
+            return None
+
+        last_ts, state = self._last_clean_row(df)
+        if last_ts is None:
+            return None
+
+        coef = np.asarray(self.model.coef_, dtype=float)          # (4 targets, 6 features)
+        intercept = np.asarray(self.model.intercept_, dtype=float)
+        n_kpi = len(self.columns)
+
+        steps = np.arange(1, hours + 1)
+        hour_idx = (last_ts.hour + steps) % 24
+        exog = (
+            np.outer(_HOUR_SIN[hour_idx], coef[:, n_kpi])
+            + np.outer(_HOUR_COS[hour_idx], coef[:, n_kpi + 1])
+            + intercept
+        )
+
+        out = np.empty((hours, n_kpi))
+        a0, a1, a2, a3 = coef[:, :n_kpi].tolist()
+        e = exog.tolist()
+        x0, x1, x2, x3 = state.tolist()
+
+        for t in range(hours):
+            et = e[t]
+            y0 = a0[0] * x0 + a0[1] * x1 + a0[2] * x2 + a0[3] * x3 + et[0]
+            y1 = a1[0] * x0 + a1[1] * x1 + a1[2] * x2 + a1[3] * x3 + et[1]
+            y2 = a2[0] * x0 + a2[1] * x1 + a2[2] * x2 + a2[3] * x3 + et[2]
+            y3 = a3[0] * x0 + a3[1] * x1 + a3[2] * x2 + a3[3] * x3 + et[3]
+
+            # recursive forecasting feeds the clipped values back in
+            x0 = float(int(y0)) if y0 > 0 else 0.0
+            x1 = float(int(y1)) if y1 > 0 else 0.0
+            x2 = float(int(y2)) if y2 > 0 else 0.0
+            x3 = min(max(y3, 0.0), 1.0)
+            out[t] = (x0, x1, x2, x3)
+
+        result = {
+            "timestamp": np.datetime64(last_ts.as_unit("ns").to_datetime64()) + steps * _ONE_HOUR
         }
+        for j, col in enumerate(self.columns):
+            result[col] = out[:, j].astype(np.int64) if j < 3 else out[:, j]
+        return result
 
     # ============================================================
     # 1-HOUR FORECAST
     # ============================================================
     def forecast_one_hour(self, df):
-        if self.model is None:
+        out = self.forecast_arrays(df, hours=1)
+        if out is None:
             return None
 
-        df = self._clean_df(df)
-        last = df.iloc[-1].copy()
-
-        return self._predict_next(last)
+        return {
+            "timestamp": pd.Timestamp(out["timestamp"][0]),
+            "sorting_capacity": int(out["sorting_capacity"][0]),
+            "staff_available": int(out["staff_available"][0]),
+            "vehicles_ready": int(out["vehicles_ready"][0]),
+            "congestion_level": float(out["congestion_level"][0])
+        }
 
     # ============================================================
     # MULTI-STEP FORECAST (24H)
     # ============================================================
     def forecast_period(self, df, hours=24):
-        if self.model is None:
+        out = self.forecast_arrays(df, hours=hours)
+        if out is None:
             return None
 
-        df = self._clean_df(df)
-        last = df.iloc[-1].copy()
-
-        rows = []
-
-        for _ in range(hours):
-            next_row = self._predict_next(last)
-            rows.append(next_row)
-            last = next_row  # recursive forecasting
-
-        return pd.DataFrame(rows)
\ No newline at end of file
+        return pd.DataFrame(out)
@@ -0,0 +1,97 @@
+# backend/generate_history.py
+#
+# Synthetic history at load-test scale, generated in vectorised chunks and
+# streamed straight into a storage backend (never held in memory at once).
+#
+#   python -m backend.generate_history --rows 10000000 --interval 1min
+#   python -m backend.generate_history --rows 1000000 --storage csv --out /tmp/history.csv --force
+#   python -m backend.generate_history --rows 100000 --sites 20 --force   (one store per site)
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+from backend.data_generate import iter_history
+from backend.local_storage import CSV_PATH, COLUMNAR_PATH
+from backend.sites import SITES_ROOT, site_backend
+from backend.storage import COLUMNS, CsvBackend, ColumnarBackend
+
+
+def write_history(store, n, start=None, interval="30min", seed=0, chunk_rows=1_000_000):
+    """Replace the contents of `store` with n generated rows; returns the row count."""
+    store.write_all(pd.DataFrame(columns=COLUMNS))
+
+    written = 0
+    for chunk in iter_history(n, start=start, interval=interval, seed=seed, chunk_rows=chunk_rows):
+        store.append(chunk)
+        written += len(chunk)
+    return written
+
+
+def write_sites(root, n, sites, start=None, interval="30min", seed=0, chunk_rows=1_000_000):
+    """n timestamps for each of `sites` sites, one store per site under root; returns the row count."""
+    ids = [f"site-{i:03d}" for i in range(sites)]
+    stores = {site_id: site_backend(site_id, root) for site_id in ids}
+    for site_id, store in stores.items():
+        os.makedirs(os.path.join(root, site_id), exist_ok=True)
+        store.write_all(pd.DataFrame(columns=COLUMNS))
+
+    written = 0
+    for chunk in iter_history(n, start=start, interval=interval, sites=sites, seed=seed,
+                              chunk_rows=max(1, chunk_rows // sites)):
+        if sites == 1:
+            chunk = chunk.assign(site_id=ids[0])
+        for site_id, rows in chunk.groupby("site_id", sort=False):
+            stores[site_id].append(rows[COLUMNS])
+            written += len(rows)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic history store")
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--interval", default="30min", help="spacing between rows, e.g. 1s, 1min, 30min")
+    parser.add_argument("--start", default=None, help="first timestamp (default: ends now)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    parser.add_argument("--storage", choices=["csv", "columnar"], default="columnar")
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--sites", type=int, default=0, help="write N per-site stores (site-000...) instead")
+    parser.add_argument("--force", action="store_true", help="overwrite an existing store")
+    args = parser.parse_args()
+
+    if args.sites > 0:
+        # Site stores use the server's storage kind (XENBER_STORAGE)
+        out = args.out or SITES_ROOT
+        if any(site_backend(f"site-{i:03d}", out).exists() for i in range(args.sites)) and not args.force:
+            sys.exit(f"❌ {out} already holds site data (use --force to overwrite)")
+
+        t0 = time.perf_counter()
+        written = write_sites(out, args.rows, args.sites, start=args.start, interval=args.interval,
+                              seed=args.seed, chunk_rows=args.chunk_rows)
+        seconds = time.perf_counter() - t0
+        print(f"✅ Generated {written} rows for {args.sites} sites into {out} in {seconds:.1f}s")
+        return
+
+    if args.storage == "csv":
+        out = args.out or CSV_PATH
+        store = CsvBackend(out)
+    else:
+        out = args.out or COLUMNAR_PATH
+        store = ColumnarBackend(out)
+
+    if store.exists() and not args.force:
+        sys.exit(f"❌ {out} already holds data (use --force to overwrite)")
+
+    t0 = time.perf_counter()
+    written = write_history(store, args.rows, start=args.start, interval=args.interval,
+                            seed=args.seed, chunk_rows=args.chunk_rows)
+    seconds = time.perf_counter() - t0
+    print(f"✅ Generated {written} rows into {out} in {seconds:.1f}s ({written / seconds:.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
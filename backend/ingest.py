@@ -0,0 +1,279 @@
+# backend/ingest.py
+#
+# Bulk ingestion of real telemetry batches (POST /ingest). A batch is parsed
+# in one go (JSON lines, CSV or Arrow), validated column-wise against the
+# storage schema, deduplicated by timestamp and handed to the writer as a
+# single append.
+
+import io
+import json
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+
+from backend import sites
+from backend import local_storage
+from backend.local_storage import data_version
+from backend.storage import COLUMNS
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Accepted value ranges (inclusive, None = unbounded)
+RANGES = {
+    "sorting_capacity": (0, None),
+    "staff_available": (0, None),
+    "vehicles_ready": (0, None),
+    "congestion_level": (0.0, 1.0),
+}
+INTEGER_COLUMNS = ["sorting_capacity", "staff_available", "vehicles_ready"]
+
+FORMATS = {
+    "application/x-ndjson": "jsonl",
+    "application/jsonl": "jsonl",
+    "application/json": "jsonl",
+    "text/csv": "csv",
+    "application/vnd.apache.arrow.stream": "arrow",
+}
+
+_STATS_LOCK = threading.Lock()
+_STATS = {"batches": 0, "rows": 0, "seconds": 0.0}
+
+
+# ============================================================
+# PARSING
+# ============================================================
+def batch_format(content_type, fmt=None):
+    """jsonl / csv / arrow from ?format= or the Content-Type header."""
+    if fmt is None:
+        fmt = FORMATS.get((content_type or "").split(";")[0].strip().lower())
+    if fmt not in ("jsonl", "csv", "arrow"):
+        raise HTTPException(status_code=415, detail="send JSON lines, CSV or an Arrow IPC stream")
+    if fmt == "arrow" and pa is None:
+        raise HTTPException(status_code=415, detail="Arrow batches need pyarrow on the server")
+    return fmt
+
+
+def parse_batch(body, fmt):
+    """Raw request body → DataFrame (values not validated yet)."""
+    try:
+        if fmt == "csv":
+            return pd.read_csv(io.BytesIO(body))
+
+        if fmt == "arrow":
+            return pa.ipc.open_stream(body).read_pandas()
+
+        body = body.strip()
+        if not body.startswith(b"["):
+            # JSON lines → one JSON array, decoded in a single call
+            body = b"[" + b",".join(line for line in body.splitlines() if line.strip()) + b"]"
+        records = orjson.loads(body) if orjson is not None else json.loads(body)
+        return pd.DataFrame.from_records(records)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"could not parse {fmt} batch: {e}")
+
+
+# ============================================================
+# VALIDATION
+# ============================================================
+def validate_batch(df):
+    """
+    Coerce df to the storage schema and classify every row, vectorised.
+
+    Returns (clean rows sorted by timestamp, report). Rows are invalid when
+    a value is missing, not numeric, out of RANGES or not a whole number
+    for count columns; duplicates are repeated timestamps within the batch
+    (the last one wins).
+    """
+    missing = [c for c in COLUMNS if c not in df.columns]
+    if missing:
+        raise HTTPException(status_code=422, detail=f"missing columns: {', '.join(missing)}")
+
+    ts = df["timestamp"]
+    if not pd.api.types.is_datetime64_any_dtype(ts):
+        ts = pd.to_datetime(ts, errors="coerce", format="mixed")
+    if getattr(ts.dtype, "tz", None) is not None:
+        ts = ts.dt.tz_convert(None)  # stored timestamps are naive UTC/local wall time
+
+    out = pd.DataFrame({"timestamp": ts})
+    bad = out["timestamp"].isna().to_numpy().copy()
+
+    for col in COLUMNS[1:]:
+        values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+        col_bad = ~np.isfinite(values)
+
+        lo, hi = RANGES[col]
+        with np.errstate(invalid="ignore"):
+            if lo is not None:
+                col_bad |= values < lo
+            if hi is not None:
+                col_bad |= values > hi
+            if col in INTEGER_COLUMNS:
+                col_bad |= values != np.round(values)
+
+        bad |= col_bad
+        out[col] = values
+
+    valid = out[~bad]
+
+    # Timestamp order: sort once, keep the last row per timestamp
+    valid = valid.sort_values("timestamp", kind="stable")
+    dup = valid["timestamp"].duplicated(keep="last").to_numpy()
+    clean = valid[~dup].astype({col: "int64" for col in INTEGER_COLUMNS})
+
+    report = {
+        "received": len(df),
+        "invalid": int(bad.sum()),
+        "duplicates": int(dup.sum()),
+        "accepted": len(clean),
+        "reordered": not out["timestamp"][~bad].is_monotonic_increasing,
+    }
+    return clean.reset_index(drop=True), report
+
+
+# ============================================================
+# INGEST
+# ============================================================
+def ingest_batch(body, fmt, on_error="reject", site_id=None):
+    """
+    Parse, validate and append one batch. With on_error="reject" any invalid
+    row fails the whole batch (422), and so does any late row (409): one
+    older than the stored tail whose timestamp is not stored, which the
+    append-only history cannot take. "skip" appends the valid, new rows
+    only and reports the rest as invalid, duplicates or late.
+
+    Batches for sites (a `site_id` column, or the site_id argument for the
+    whole batch) are split per site and appended to each site's store;
+    nothing is written unless every site's rows pass (only a concurrent
+    append to a later site, landing during the batch, can 409 it after
+    earlier sites were written; the 409 then lists them).
+    """
+    t0 = time.perf_counter()
+
+    df = parse_batch(body, fmt)
+    if "site_id" in df.columns and site_id is not None:
+        raise HTTPException(status_code=400, detail="pass site_id as a column or as a parameter, not both")
+
+    if site_id is None and "site_id" not in df.columns:
+        parts = [(None, df)]
+        missing_site = 0
+    else:
+        ids = df["site_id"] if site_id is None else pd.Series(site_id, index=df.index)
+        known = ids.notna()
+        missing_site = int((~known).sum())
+        parts = [
+            (sites.check_site_id(s), group.drop(columns="site_id", errors="ignore"))
+            for s, group in df[known].groupby(ids[known].astype(str), sort=True)
+        ]
+
+    checked = []
+    report = {
+        "received": len(df), "invalid": missing_site, "duplicates": 0, "late": 0,
+        "accepted": 0, "reordered": False,
+    }
+    for part_site, part in parts:
+        clean, part_report = validate_batch(part)
+        checked.append((part_site, clean))
+        report["invalid"] += part_report["invalid"]
+        report["duplicates"] += part_report["duplicates"]
+        report["reordered"] |= part_report["reordered"]
+
+    if report["invalid"] and on_error == "reject":
+        report["accepted"] = sum(len(clean) for _, clean in checked)
+        raise HTTPException(status_code=422, detail={"error": "invalid rows in batch", **report})
+
+    # The history is append-only: rows older than the stored tail that are
+    # not stored yet (a late backfill) cannot be written. Checked up front
+    # so a multi-site batch fails before any site is written
+    if on_error == "reject":
+        old = [stored_rows(part_site, clean) for part_site, clean in checked]
+        if any(late.any() for _, late in old):
+            report["duplicates"] += sum(int(dup.sum()) for dup, _ in old)
+            report["late"] = sum(int(late.sum()) for _, late in old)
+            report["accepted"] = sum(len(clean) for _, clean in checked) - report["duplicates"] - report["late"]
+            raise HTTPException(status_code=409, detail={"error": "rows older than the stored history", **report})
+
+    # One storage write per site. Rows not after the stored tail are
+    # classified by the writer against the tail it commits on, so a
+    # concurrent append between the check above and the write is caught
+    per_site = {}
+    for part_site, clean in checked:
+        if clean.empty:
+            written, duplicates, late = clean, 0, 0
+        else:
+            written, duplicates, late = _store(part_site).append_new_rows(
+                clean, reject_late=on_error == "reject"
+            )
+        report["duplicates"] += duplicates
+        report["late"] += late
+        report["accepted"] += len(written)
+        if part_site is not None:
+            per_site[part_site] = len(written)
+
+        if late and on_error == "reject":
+            # Nothing of this site was written; sites before it were
+            detail = {"error": "rows older than the stored history", **report}
+            if per_site:
+                detail["sites"] = per_site
+            raise HTTPException(status_code=409, detail=detail)
+
+    seconds = time.perf_counter() - t0
+    with _STATS_LOCK:
+        _STATS["batches"] += 1
+        _STATS["rows"] += report["accepted"]
+        _STATS["seconds"] += seconds
+
+    if per_site or site_id is not None:
+        report["sites"] = per_site
+    else:
+        report["version"] = data_version()
+
+    return {
+        **report,
+        "seconds": seconds,
+        "rows_per_sec": report["accepted"] / seconds if seconds > 0 else None,
+    }
+
+
+def _store(site_id):
+    """HistoryStore of the main history or of a site."""
+    if site_id is None:
+        return local_storage.HISTORY
+    return sites.get_site(site_id, create=True).history
+
+
+def stored_rows(site_id, clean):
+    """
+    Masks over the rows not after the stored tail: (duplicates, whose
+    timestamp is stored; late, whose timestamp is not).
+    """
+    new_site = site_id is not None and not sites.site_backend(site_id).exists()
+    store = None if clean.empty or new_site else _store(site_id)
+    tail = None if store is None else store.last_timestamp()
+    if tail is None:
+        return np.zeros(len(clean), dtype=bool), np.zeros(len(clean), dtype=bool)
+
+    old = (clean["timestamp"] <= tail).to_numpy()
+    dup = old.copy()
+    dup[old] = store.has_timestamps(clean["timestamp"][old])
+    return dup, old & ~dup
+
+
+def ingest_stats():
+    with _STATS_LOCK:
+        return {
+            **_STATS,
+            "rows_per_sec": _STATS["rows"] / _STATS["seconds"] if _STATS["seconds"] else None,
+        }
@@ -1,64 +1,540 @@
 # backend/local_storage.py
 
 import os
+import threading
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from backend.data_generate import (
     generate_initial_history,
     generate_next_row
 )
 
+from backend.storage import COLUMNS, CsvBackend, ColumnarBackend, to_epoch_ns
+from backend.writer import GroupCommitWriter
+
 CSV_PATH = "backend/data/history.csv"
+COLUMNAR_PATH = "backend/data/history"
+
+# "csv" (default) or "columnar" — see backend/storage.py
+STORAGE_BACKEND = os.environ.get("XENBER_STORAGE", "csv")
+
+# fsync every commit (set XENBER_FSYNC=0 to trade durability for speed)
+FSYNC = os.environ.get("XENBER_FSYNC", "1") != "0"
+
+# Explicitly installed backend (set_backend); otherwise one is built once
+# from STORAGE_BACKEND and the paths above.
+_BACKEND = None
+_DEFAULT_BACKEND = None
+
+# How many versions back a delta can be served from
+_ROW_LOG_SIZE = 10_000
+
+
+# =============================================================
+# STORAGE BACKEND SELECTION
+# =============================================================
+def get_backend():
+    """Backend currently holding the history."""
+    global _DEFAULT_BACKEND
+
+    if _BACKEND is not None:
+        return _BACKEND
+    if _DEFAULT_BACKEND is None:
+        if STORAGE_BACKEND == "columnar":
+            _DEFAULT_BACKEND = ColumnarBackend(COLUMNAR_PATH, fsync=FSYNC)
+        else:
+            _DEFAULT_BACKEND = CsvBackend(CSV_PATH, fsync=FSYNC)
+    return _DEFAULT_BACKEND
+
 
-COLUMNS = [
-    "timestamp",
-    "sorting_capacity",
-    "staff_available",
-    "vehicles_ready",
-    "congestion_level"
-]
+def set_backend(backend):
+    """Install a storage backend (None → back to STORAGE_BACKEND) and drop the cache."""
+    global _BACKEND
+    with HISTORY._lock:
+        _BACKEND = backend
+        HISTORY.reset()
 
 
 # =============================================================
-# INITIALISE CLEAN CSV (ALWAYS CONSISTENT)
+# INITIALISE CLEAN HISTORY (ALWAYS CONSISTENT)
 # =============================================================
 def init_history():
-    """Ensure CSV exists with the correct schema and initial rows."""
+    """Ensure the history exists with the correct schema and initial rows."""
     os.makedirs("backend/data", exist_ok=True)
+    backend = get_backend()
 
-    # If file missing or empty → regenerate clean dataset
-    if not os.path.exists(CSV_PATH) or os.path.getsize(CSV_PATH) == 0:
-        df = generate_initial_history(n=20)
-        df.to_csv(CSV_PATH, index=False)
-        print("🔄 Created fresh history.csv with realistic initial data")
+    # If history missing or empty → regenerate clean dataset
+    if not backend.exists():
+        backend.write_all(generate_initial_history(n=20))
+        HISTORY._reset_tail()
+        print("🔄 Created fresh history with realistic initial data")
         return
 
-    # If CSV exists → load and ensure correct columns
-    df = pd.read_csv(CSV_PATH)
-
     # If wrong schema → overwrite with clean dataset
-    if list(df.columns) != COLUMNS:
-        print("⚠ Wrong CSV schema detected — repairing...")
-        df = generate_initial_history(n=20)
-        df.to_csv(CSV_PATH, index=False)
+    if not backend.schema_ok():
+        print("⚠ Wrong history schema detected — repairing...")
+        backend.write_all(generate_initial_history(n=20))
+        HISTORY._reset_tail()
+
+
+# =============================================================
+# APPEND-FRIENDLY CACHED FRAME
+# =============================================================
+class _HistoryBuffer:
+    """
+    The cached history as one array per column with spare room at the end,
+    plus its int64 epoch-ns timestamp index. Appends write past the current
+    length, so frames handed out earlier (read-only views of the first rows)
+    never change and an append costs O(rows appended); only a full buffer
+    is copied into a larger one.
+    """
+
+    def __init__(self, df):
+        n = len(df)
+        capacity = n + max(n // 2, 4096)
+        self.n = n
+
+        self.columns = {}
+        for col in df.columns:
+            values = df[col].to_numpy()
+            self.columns[col] = np.empty(capacity, dtype=values.dtype)
+            self.columns[col][:n] = values
+
+        self.index = np.empty(capacity, dtype=np.int64)
+        self.index[:n] = to_epoch_ns(df["timestamp"])
+
+    def _fits(self, rows):
+        if self.n == 0 or self.n + len(rows) > len(self.index):
+            return False
+        # e.g. ns timestamps into a µs column, but not floats into an int one
+        return all(
+            np.can_cast(rows[col].to_numpy().dtype, buf.dtype, casting="same_kind")
+            for col, buf in self.columns.items()
+        )
+
+    def extend(self, rows):
+        """Buffer with rows added at the end: this one, or a larger copy when full."""
+        if not self._fits(rows):
+            frame = rows if self.n == 0 else pd.concat([self.frame(), rows], ignore_index=True)
+            return _HistoryBuffer(frame)
+
+        n, k = self.n, len(rows)
+        for col, buf in self.columns.items():
+            buf[n:n + k] = rows[col].to_numpy()
+        self.index[n:n + k] = to_epoch_ns(rows["timestamp"])
+        self.n = n + k
+        return self
+
+    def last_ns(self):
+        return int(self.index[self.n - 1]) if self.n else None
+
+    def frame(self):
+        """Read-only DataFrame over the first n rows (no copy)."""
+        views = {}
+        for col, buf in self.columns.items():
+            views[col] = buf[:self.n]
+            views[col].flags.writeable = False
+        return pd.DataFrame(views, copy=False)
+
+    def index_view(self):
+        view = self.index[:self.n]
+        view.flags.writeable = False
+        return view
+
+
+# =============================================================
+# ONE HISTORY: CACHE, QUERIES, SINGLE WRITER
+# =============================================================
+class HistoryStore:
+    """
+    One append-only history: its cached frame, range queries, data version,
+    tail tracking, single writer and append listeners. The main history is
+    HISTORY below; every site (backend.sites) has its own instance.
+
+    `backend()` returns the storage backend and `init()` creates the store
+    when it does not exist yet.
+    """
+
+    def __init__(self, backend, init):
+        self._backend = backend
+        self._init = init
+
+        # Cache of the parsed history. "version" increases every time the
+        # cached frame changes (our own appends or an external rewrite), and
+        # "stat" is the backend's change signature (mtime/size of the files)
+        # that the frame was built from. "index" holds the frame's timestamps
+        # as sorted int64 epoch ns for binary-search range queries. "buffer"
+        # holds both in growable arrays (see _HistoryBuffer), and "writing"
+        # is set while the writer thread appends, so readers keep the cached
+        # frame instead of mistaking the growing store for an external
+        # change. "row_counts" maps each recent version to the frame length
+        # at that version, as long as every change since was a plain append
+        # at the end (see rows_since_version).
+        self._lock = threading.RLock()
+        self._cache = {
+            "df": None,
+            "index": None,
+            "buffer": None,
+            "version": 0,
+            "stat": None,
+            "writing": False,
+            "row_counts": {},
+            "hits": 0,
+            "misses": 0,
+        }
+
+        # Timestamp of the newest row on disk, tracked in memory so that
+        # appends never have to re-read the whole history.
+        self._last_ts = None
+
+        # Callbacks fired after every append as fn(rows, version); version is
+        # None when the cache was out of sync and has to be reloaded by
+        # readers. They run outside the cache lock, so readers may already
+        # see `version` (and derived state may already have caught up to it)
+        # when a listener is called.
+        self._listeners = []
+
+        self.writer = GroupCommitWriter(commit=self._commit_rows, tail=self.last_timestamp,
+                                        normalise=_normalise_rows)
+
+    def _ready_backend(self):
+        backend = self._backend()
+        if not backend.exists():
+            self._init()
+            self._reset_tail()
+        return backend
+
+    def reset(self):
+        """Forget the cached frame and tail (the store was swapped or rewritten)."""
+        with self._lock:
+            self._drop_frame()
+            self._cache["stat"] = None
+            self._reset_tail()
+
+    # =========================================================
+    # LOAD HISTORY SAFELY
+    # =========================================================
+    def _set_frame(self, df):
+        """Install df as the cached frame, keeping it sorted by timestamp."""
+        if not df["timestamp"].is_monotonic_increasing:
+            df = df.sort_values("timestamp", kind="stable", ignore_index=True)
+
+        buffer = _HistoryBuffer(df)
+        self._cache["buffer"] = buffer
+        self._cache["df"] = buffer.frame()
+        self._cache["index"] = buffer.index_view()
+
+    def _drop_frame(self):
+        self._cache["df"] = None
+        self._cache["index"] = None
+        self._cache["buffer"] = None
+
+    def load_data(self):
+        """
+        Return the parsed history from the in-process cache.
+
+        The history is only re-read when the backend's mtime/size signature
+        no longer matches the cached frame, i.e. when something outside this
+        process wrote it. The returned frame is shared between all callers
+        and must be treated as read-only.
+        """
+        cache = self._cache
+        with self._lock:
+            backend = self._ready_backend()
+
+            if cache["df"] is not None and (cache["writing"] or cache["stat"] == backend.stat()):
+                cache["hits"] += 1
+                return cache["df"]
+
+            stat = backend.stat()
+
+            cache["misses"] += 1
+            self._set_frame(backend.read())
+            cache["stat"] = stat
+            cache["version"] += 1
+            cache["row_counts"] = {cache["version"]: len(cache["df"])}
+            self._reset_tail()
+
+            return cache["df"]
+
+    def query_rows(self, since=None, until=None, after_cursor=None, limit=None):
+        """
+        Slice the cached history by time without sorting or scanning it.
+
+        The window is located with a binary search over the sorted timestamp
+        index. `after_cursor` (epoch ns, see row_cursor) pages forward: it
+        keeps rows strictly after the cursor and `limit` then takes the
+        first rows. Without a cursor `limit` keeps the most recent rows of
+        the window.
+        """
+        with self._lock:
+            df = self.load_data()
+            index = self._cache["index"]
+
+        lo, hi = 0, len(index)
+        if since is not None:
+            lo = int(np.searchsorted(index, to_epoch_ns(since), "left"))
+        if after_cursor is not None:
+            lo = max(lo, int(np.searchsorted(index, int(after_cursor), "right")))
+        if until is not None:
+            hi = int(np.searchsorted(index, to_epoch_ns(until), "right"))
+
+        if limit is not None and hi - lo > limit:
+            if after_cursor is not None:
+                hi = lo + limit
+            else:
+                lo = hi - limit
+
+        return df.iloc[lo:max(lo, hi)]
+
+    def query_versioned(self, since=None, until=None):
+        """query_rows() for [since, until] together with its data version, read atomically."""
+        with self._lock:
+            return self.query_rows(since=since, until=until), self._cache["version"]
+
+    def rows_since_version(self, version, limit=None):
+        """
+        Rows appended after data version `version`, for polling clients.
+
+        Returns (rows, current version, is_delta). When the delta cannot be
+        served (unknown or too old version, history rewritten or appended out
+        of order, more than `limit` new rows) the newest `limit` rows are
+        returned instead with is_delta False, and the client should replace
+        its copy.
+        """
+        with self._lock:
+            df = self.load_data()
+            current = self._cache["version"]
+            counts = self._cache["row_counts"]
+
+            if version in counts and current in counts:
+                start = counts[version]
+                if limit is None or len(df) - start <= limit:
+                    return df.iloc[start:], current, True
+
+            tail = df if limit is None else df.iloc[max(0, len(df) - limit):]
+            return tail, current, False
+
+    def has_timestamps(self, timestamps):
+        """Boolean mask: which of `timestamps` are already stored (binary search over the cached index)."""
+        with self._lock:
+            self.load_data()
+            index = self._cache["index"]
+        return _in_index(index, to_epoch_ns(timestamps))
+
+    def load_versioned(self):
+        """The cached history together with its data version, read atomically."""
+        with self._lock:
+            df = self.load_data()
+            return df, self._cache["version"]
+
+    def data_version(self):
+        """Monotonically increasing version of the history currently on disk."""
+        with self._lock:
+            self.load_data()
+            return self._cache["version"]
+
+    def cache_stats(self):
+        cache = self._cache
+        with self._lock:
+            return {
+                "version": cache["version"],
+                "rows": 0 if cache["df"] is None else len(cache["df"]),
+                "hits": cache["hits"],
+                "misses": cache["misses"],
+            }
+
+    # =========================================================
+    # TAIL TRACKING (LAST TIMESTAMP WITHOUT A FULL READ)
+    # =========================================================
+    def _reset_tail(self):
+        self._last_ts = None
+
+    def last_timestamp(self):
+        """Timestamp of the newest stored row (read from disk only once)."""
+        if self._last_ts is not None:
+            return self._last_ts
+
+        backend = self._ready_backend()
+
+        # A warm cache already knows the newest row
+        with self._lock:
+            cached = self._cache["df"]
+            if cached is not None and self._cache["stat"] == backend.stat():
+                if not cached.empty:
+                    self._last_ts = cached["timestamp"].iloc[-1]
+                    return self._last_ts
+
+        self._last_ts = backend.last_timestamp()
+        return self._last_ts
+
+    # =========================================================
+    # APPEND ROWS (SINGLE WRITER, GROUP COMMIT, APPEND-ONLY)
+    # =========================================================
+    def _commit_rows(self, rows):
+        """
+        Write rows to the store and fold them into the cache. Runs on the
+        writer thread only. The disk write and the cache update happen
+        outside the cache lock (rows land past the end of the cached buffer,
+        where no handed-out frame can see them); the lock is only held to
+        swap in the new frame, so readers keep a consistent snapshot and
+        never wait on I/O.
+        """
+        cache = self._cache
+        backend = self._ready_backend()
+
+        with self._lock:
+            # Only extend the cache if it still mirrors the store
+            in_sync = cache["df"] is not None and cache["stat"] == backend.stat()
+            buffer = cache["buffer"] if in_sync else None
+            cache["writing"] = True
+
+        try:
+            backend.append(rows)
+            self._last_ts = rows["timestamp"].iloc[-1]
+
+            at_end = False
+            if buffer is not None:
+                last_ns = buffer.last_ns()
+                at_end = rows["timestamp"].is_monotonic_increasing and (
+                    last_ns is None or to_epoch_ns(rows["timestamp"].iloc[:1])[0] >= last_ns
+                )
+
+                if at_end:
+                    grown = buffer.extend(rows)
+                else:
+                    # Rows inside the history: re-sort once (rare, O(history))
+                    merged = pd.concat([buffer.frame(), rows], ignore_index=True)
+                    grown = _HistoryBuffer(merged.sort_values("timestamp", kind="stable", ignore_index=True))
+                df, index = grown.frame(), grown.index_view()
+
+            stat = backend.stat()
+        except Exception:
+            # Partly written or not at all: the next read reloads from the store
+            with self._lock:
+                cache["writing"] = False
+                self._drop_frame()
+            self._reset_tail()
+            raise
+
+        with self._lock:
+            cache["writing"] = False
+            if buffer is not None and cache["buffer"] is buffer:
+                cache["buffer"], cache["df"], cache["index"] = grown, df, index
+                cache["stat"] = stat
+                cache["version"] += 1
+                version = cache["version"]
+
+                # Deltas stay servable only while rows land at the end
+                counts = cache["row_counts"]
+                if not at_end or version - 1 not in counts:
+                    counts.clear()
+                counts[version] = len(df)
+                counts.pop(version - _ROW_LOG_SIZE, None)
+            else:
+                self._drop_frame()
+                version = None
+
+        # Listeners run after the lock is released (still on the writer
+        # thread, so in version order): a slow one delays the next commit,
+        # never readers
+        for listener in list(self._listeners):
+            try:
+                listener(rows, version)
+            except Exception as e:
+                print(f"⚠ Append listener {listener.__name__} failed: {e}")
+
+    def append_rows(self, rows):
+        """
+        Append rows to the end of the history without touching existing rows.
+
+        The rows go through the single writer thread, which commits whatever
+        is queued at the time as one group; this returns once they are stored.
+        """
+        rows = _normalise_rows(rows)
+        if rows.empty:
+            return rows
+        return self.writer.write(rows)
+
+    def append_new_rows(self, rows, reject_late=False):
+        """
+        Like append_rows, but only rows after the stored tail are written.
+        The others are classified on the writer thread, against the tail the
+        commit uses: duplicates (timestamp already stored) and late rows
+        (not stored, but not after the tail either). With reject_late=True
+        any late row cancels the whole write.
+
+        Returns (rows written, duplicates, late).
+        """
+        rows = _normalise_rows(rows)
+        if rows.empty:
+            return rows, 0, 0
+        counts = {"duplicates": 0, "late": 0}
+
+        def make(last_ts):
+            if last_ts is None:
+                counts.update(duplicates=0, late=0)
+                return rows
+
+            old = (rows["timestamp"] <= last_ts).to_numpy()
+            duplicates = int(self.has_timestamps(rows["timestamp"][old]).sum()) if old.any() else 0
+            counts.update(duplicates=duplicates, late=int(old.sum()) - duplicates)
+
+            if counts["late"] and reject_late:
+                return rows.iloc[:0]
+            return rows[~old]
+
+        written = self.writer.write(make=make)
+        return written, counts["duplicates"], counts["late"]
+
+    def writer_stats(self):
+        return self.writer.stats()
+
+    def on_append(self, listener):
+        """Register fn(rows, version) to run after each append (usable as a decorator)."""
+        self._listeners.append(listener)
+        return listener
+
+
+def _normalise_rows(rows):
+    rows = pd.DataFrame(rows, columns=COLUMNS)
+    if not rows.empty and not pd.api.types.is_datetime64_dtype(rows["timestamp"]):
+        rows["timestamp"] = pd.to_datetime(rows["timestamp"])
+    return rows
+
+
+def _in_index(index, want):
+    if len(index) == 0:
+        return np.zeros(len(want), dtype=bool)
+    pos = np.minimum(np.searchsorted(index, want), len(index) - 1)
+    return index[pos] == want
 
 
 # =============================================================
-# LOAD CSV SAFELY
+# THE MAIN HISTORY (MODULE-LEVEL API)
 # =============================================================
-def load_data():
-    """Load CSV with timestamp parsing."""
-    if not os.path.exists(CSV_PATH):
-        init_history()
+HISTORY = HistoryStore(get_backend, init_history)
 
-    df = pd.read_csv(CSV_PATH)
+load_data = HISTORY.load_data
+query_rows = HISTORY.query_rows
+query_versioned = HISTORY.query_versioned
+rows_since_version = HISTORY.rows_since_version
+has_timestamps = HISTORY.has_timestamps
+load_versioned = HISTORY.load_versioned
+data_version = HISTORY.data_version
+cache_stats = HISTORY.cache_stats
+last_timestamp = HISTORY.last_timestamp
+append_rows = HISTORY.append_rows
+append_new_rows = HISTORY.append_new_rows
+writer_stats = HISTORY.writer_stats
+on_append = HISTORY.on_append
 
-    # Parse timestamps correctly
-    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
-    df = df.dropna(subset=["timestamp"])  # remove any corrupted rows
 
-    return df
+def row_cursor(ts):
+    """Opaque cursor for a row timestamp (epoch ns)."""
+    return to_epoch_ns(ts)
 
 
 # =============================================================
@@ -66,16 +542,18 @@ def load_data():
 # =============================================================
 def append_random_row():
     """Append next row based on the last timestamp."""
-    df = load_data()
+    made = []
 
-    # Determine next timestamp
-    last_ts = df["timestamp"].iloc[-1] if not df.empty else \
-              datetime.now().replace(second=0, microsecond=0)
+    # Runs on the writer thread, after any rows queued before it
+    def make(last_ts):
+        # Determine next timestamp
+        if last_ts is None:
+            last_ts = datetime.now().replace(second=0, microsecond=0)
 
-    new_row = generate_next_row(last_ts)
+        made.append(generate_next_row(last_ts))
+        return made[-1:]
 
-    # Append
-    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-    df.to_csv(CSV_PATH, index=False)
+    HISTORY.writer.write(make=make)
 
-    return new_row
\ No newline at end of file
+    # make() runs again if its group is retried; the last row is the stored one
+    return made[-1]
@@ -0,0 +1,283 @@
+# backend/metrics.py
+#
+# In-process instrumentation exposed at /metrics in the Prometheus text
+# format: request counters and latency histograms (filled by the API
+# middleware), stage timers around the expensive steps (load, anomaly,
+# fit, predict, serialize), scheduler job durations / missed runs, and
+# gauges read from the existing *_stats() helpers at scrape time.
+#
+# Opt-in slow request profiling: with XENBER_PROFILE_SLOW_MS set, every
+# request is sampled and requests slower than that threshold leave a folded
+# stack file (flamegraph.pl / speedscope format) in XENBER_PROFILE_DIR.
+
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+from apscheduler.events import (
+    EVENT_JOB_ERROR,
+    EVENT_JOB_EXECUTED,
+    EVENT_JOB_MAX_INSTANCES,
+    EVENT_JOB_MISSED,
+)
+
+# Latency buckets in seconds (upper bounds; +Inf is implicit)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROFILE_SLOW_MS = float(os.environ.get("XENBER_PROFILE_SLOW_MS", "0") or 0)
+PROFILE_DIR = os.environ.get("XENBER_PROFILE_DIR", "backend/data/profiles")
+PROFILE_INTERVAL = float(os.environ.get("XENBER_PROFILE_INTERVAL_MS", "5")) / 1000
+
+_METRICS = []      # every Counter / Histogram, in registration order
+_COLLECTORS = []   # fn() -> [(name, type, help, [(labels, value)])], called per scrape
+
+
+def _label_str(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _fmt(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ============================================================
+# METRIC TYPES
+# ============================================================
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        _METRICS.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, count in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labels, values)} {_fmt(count)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels (seconds)."""
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}   # label values -> [bucket counts..., sum, count]
+        _METRICS.append(self)
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *label_values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_label_str(names, values + (_fmt(bound),))} {count}")
+                lines.append(f"{self.name}_bucket{_label_str(names, values + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_str(self.labels, values)} {_fmt(series[-2])}")
+                lines.append(f"{self.name}_count{_label_str(self.labels, values)} {series[-1]}")
+        return lines
+
+
+def register_collector(fn):
+    """Decorator: fn() returns [(name, type, help, [(labels dict, value)])] read at scrape time."""
+    _COLLECTORS.append(fn)
+    return fn
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+
+    for collect in _COLLECTORS:
+        try:
+            families = collect()
+        except Exception as e:
+            print(f"⚠ Metrics collector {collect.__name__} failed: {e}")
+            continue
+
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f"{name}{_label_str(tuple(labels), tuple(labels.values()))} {_fmt(value)}")
+
+    return "\n".join(lines) + "\n"
+
+
+# ============================================================
+# STANDARD METRICS
+# ============================================================
+REQUESTS = Counter(
+    "xenber_http_requests_total", "HTTP requests by route and status.",
+    labels=("method", "route", "status"),
+)
+REQUEST_SECONDS = Histogram(
+    "xenber_http_request_duration_seconds", "Request latency until the response headers.",
+    labels=("method", "route"),
+)
+STAGE_SECONDS = Histogram(
+    "xenber_stage_duration_seconds", "Time spent in one processing stage (load, anomaly, fit, predict, serialize).",
+    labels=("stage",),
+)
+JOB_SECONDS = Histogram(
+    "xenber_scheduler_job_duration_seconds", "Scheduler job run time.",
+    labels=("job",),
+)
+JOB_RUNS = Counter(
+    "xenber_scheduler_job_runs_total", "Scheduler job runs by outcome (ok / error / missed / skipped).",
+    labels=("job", "outcome"),
+)
+
+
+def stage(name):
+    """Context manager timing one processing stage."""
+    return STAGE_SECONDS.time(name)
+
+
+def timed_job(name, fn):
+    """Wrap a scheduler job so its run time is recorded."""
+    @functools.wraps(fn)
+    def run():
+        with JOB_SECONDS.time(name):
+            return fn()
+    return run
+
+
+def watch_scheduler(scheduler):
+    """Count executed, failed, missed and overlapping-skipped runs of every job."""
+    outcomes = {
+        EVENT_JOB_EXECUTED: "ok",
+        EVENT_JOB_ERROR: "error",
+        EVENT_JOB_MISSED: "missed",
+        EVENT_JOB_MAX_INSTANCES: "skipped",
+    }
+
+    def listener(event):
+        JOB_RUNS.inc(event.job_id, outcomes[event.code])
+
+    mask = 0
+    for code in outcomes:
+        mask |= code
+    scheduler.add_listener(listener, mask)
+
+
+# ============================================================
+# SLOW REQUEST PROFILER (OPT-IN)
+# ============================================================
+# Innermost Python frames of threads that are just waiting
+_IDLE_LEAVES = {("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get")}
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of all threads every `interval` seconds
+    while a request runs, so the worker thread of a sync endpoint is
+    captured too. Idle threads are left out; stacks are prefixed with the
+    thread name because concurrent requests share the samples.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples = _Tally()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+                if leaf in _IDLE_LEAVES:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def dump(self, path):
+        """Write the samples as folded stacks ("frame;frame;frame count" per line)."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def profile_request():
+    """A started SamplingProfiler when slow request profiling is on, else None."""
+    return SamplingProfiler().start() if PROFILE_SLOW_MS > 0 else None
+
+
+def finish_profile(profiler, seconds, method, route):
+    """Stop the profiler; keep its samples if the request was slower than the threshold."""
+    if profiler is None:
+        return None
+
+    profiler.stop()
+    if seconds * 1000 < PROFILE_SLOW_MS or not profiler.samples:
+        return None
+
+    slug = route.strip("/").replace("/", "_") or "root"
+    path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{method}-{slug}-{seconds * 1000:.0f}ms.folded")
+    profiler.dump(path)
+    print(f"🐢 Slow request {method} {route} ({seconds * 1000:.0f} ms) → profile in {path}")
+    return path
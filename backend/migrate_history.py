@@ -0,0 +1,77 @@
+# backend/migrate_history.py
+#
+# One-shot conversion of history.csv into the columnar day-partitioned store.
+#
+#   python -m backend.migrate_history
+#   python -m backend.migrate_history --csv path/to/history.csv --out path/to/history --force
+#
+# Afterwards start the API with XENBER_STORAGE=columnar.
+
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+from backend.local_storage import CSV_PATH, COLUMNAR_PATH
+from backend.storage import COLUMNS, ColumnarBackend
+
+
+def migrate(csv_path=CSV_PATH, out=COLUMNAR_PATH, chunksize=1_000_000):
+    """Stream the CSV into a fresh columnar store; returns (rows written, rows dropped)."""
+    store = ColumnarBackend(out)
+    store.write_all(pd.DataFrame(columns=COLUMNS))
+
+    written = dropped = 0
+    last_ts = None
+
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        chunk["timestamp"] = pd.to_datetime(chunk["timestamp"], errors="coerce")
+        before = len(chunk)
+        chunk = chunk.dropna(subset=COLUMNS)
+        dropped += before - len(chunk)
+
+        if chunk.empty:
+            continue
+
+        chunk = chunk.sort_values("timestamp", kind="stable")
+        if last_ts is not None and chunk["timestamp"].iloc[0] < last_ts:
+            # Out-of-order file: give up streaming and sort everything once
+            return _migrate_unsorted(csv_path, store)
+
+        store.append(chunk)
+        written += len(chunk)
+        last_ts = chunk["timestamp"].iloc[-1]
+
+    return written, dropped
+
+
+def _migrate_unsorted(csv_path, store):
+    df = pd.read_csv(csv_path)
+    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
+    before = len(df)
+    df = df.dropna(subset=COLUMNS)
+
+    store.write_all(df)
+    return len(df), before - len(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert history.csv to the columnar store")
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--out", default=COLUMNAR_PATH)
+    parser.add_argument("--force", action="store_true", help="overwrite an existing store")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.csv):
+        sys.exit(f"❌ {args.csv} not found")
+
+    if ColumnarBackend(args.out).exists() and not args.force:
+        sys.exit(f"❌ {args.out} already holds data (use --force to overwrite)")
+
+    written, dropped = migrate(args.csv, args.out)
+    print(f"✅ Migrated {written} rows into {args.out} ({dropped} incomplete rows dropped)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# backend/model_registry.py
+
+import copy
+import os
+import threading
+
+from backend.forecast import Forecaster
+from backend.local_storage import HISTORY
+from backend.metrics import stage
+from backend.workers import fit_forecaster
+
+# Exponential forgetting for the online forecaster (1.0 = plain least squares)
+FORECAST_FORGETTING = float(os.environ.get("XENBER_FORECAST_FORGETTING", "1.0"))
+
+
+def online_forecaster():
+    return Forecaster(online=True, forgetting=FORECAST_FORGETTING)
+
+
+class ForecasterRegistry:
+    """
+    Holds the fitted Forecaster for the newest data version.
+
+    Requests never fit: get() hands out the current model even if newer rows
+    have arrived, and a single background thread refits on the latest data.
+    Once the refit finishes the new model replaces the old one atomically.
+
+    Online forecasters skip the refit: on_append() folds the new rows into a
+    copy of the current model and swaps it in.
+
+    `history` is the local_storage.HistoryStore the model follows (the main
+    history by default, or one site's).
+    """
+
+    def __init__(self, factory=online_forecaster, history=HISTORY):
+        self.factory = factory
+        self.history = history
+        self._lock = threading.Lock()
+        self._model = None
+        self._version = None
+        self._refitting = False
+
+        self.hits = 0      # served a model fitted on the current version
+        self.misses = 0    # served a stale (or no) model while a refit runs
+        self.refits = 0
+        self.updates = 0   # online folds of appended rows
+
+    # ============================================================
+    # FITTING
+    # ============================================================
+    def _fit(self):
+        df, version = self.history.load_versioned()
+        # Pool exports are cached by data version, which only the main history may use
+        shared = version if self.history is HISTORY else None
+        with stage("fit"):
+            fc = fit_forecaster(self.factory(), df, shared)
+
+        with self._lock:
+            if self._version is None or version > self._version:
+                self._model = fc
+                self._version = version
+            self.refits += 1
+
+        return version
+
+    def warm(self):
+        """Fit synchronously (startup), so the first request already has a model."""
+        self._fit()
+
+    def refresh(self):
+        """Start a background refit unless one is already running."""
+        with self._lock:
+            if self._refitting:
+                return
+            self._refitting = True
+
+        threading.Thread(target=self._refit_loop, daemon=True).start()
+
+    def on_append(self, rows, version):
+        """Append hook: online models absorb the rows, others get a background refit."""
+        with self._lock:
+            fc, have = self._model, self._version
+
+        if version is not None and have is not None and have >= version:
+            return   # a refit already covered these rows
+
+        if fc is not None and fc.online and version is not None and have == version - 1:
+            updated = copy.deepcopy(fc)
+            updated.update(rows)
+
+            with self._lock:
+                if self._version == version - 1:
+                    self._model = updated
+                    self._version = version
+                    self.updates += 1
+                    return
+
+        self.refresh()
+
+    def _refit_loop(self):
+        try:
+            while True:
+                version = self._fit()
+                # Rows that arrived while fitting → go again
+                if self.history.data_version() == version:
+                    break
+        except Exception as e:
+            print(f"⚠ Forecaster refit failed: {e}")
+        finally:
+            with self._lock:
+                self._refitting = False
+
+    # ============================================================
+    # SERVING
+    # ============================================================
+    def get(self):
+        """Current fitted Forecaster (None if the history is too short)."""
+        current = self.history.data_version()
+
+        with self._lock:
+            model, version = self._model, self._version
+            if version == current:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if version != current:
+            self.refresh()
+
+        # A model object exists but the history was too short to train it
+        if model is None or model.model is None:
+            return None
+        return model
+
+    @property
+    def version(self):
+        """Data version the current model was fitted on."""
+        with self._lock:
+            return self._version
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else None,
+                "refits": self.refits,
+                "online_updates": self.updates,
+                "refitting": self._refitting,
+            }
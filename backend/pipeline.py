@@ -0,0 +1,133 @@
+# backend/pipeline.py
+#
+# Materialised results for the read endpoints. After every new row the
+# scheduler builds one immutable Snapshot (latest metrics, 1h and 24h
+# forecasts, anomalous KPIs, suggestions) and swaps it in; /forecast,
+# /forecast_one_hour and /optimize then just hand it out.
+
+import threading
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+import pandas as pd
+
+from backend.metrics import stage
+
+
+class Snapshot(NamedTuple):
+    """Everything the read endpoints serve, for one data version. Read-only."""
+
+    version: int                 # data version the snapshot was built from
+    model_version: Optional[int]  # data version the forecaster was fitted on
+    built_at: datetime
+    rows: int
+    latest: Optional[dict]
+    forecast_next: Optional[dict]
+    forecast_24h: Optional[pd.DataFrame]
+    anomaly_vars: tuple          # KPIs with anomalies (default settings)
+    suggestions: dict
+
+
+# ============================================================
+# SUGGESTIONS (LATEST VS 1-HOUR FORECAST)
+# ============================================================
+def compare_suggestions(latest, one_hour):
+    """Comparison-based suggestions for the KPIs expected to move in the next hour."""
+    suggestions = {}
+
+    if not one_hour:
+        return suggestions
+
+    for key in ["sorting_capacity", "staff_available", "vehicles_ready"]:
+        if key in latest and key in one_hour:
+            if one_hour[key] < latest[key]:
+                suggestions[key] = (
+                    f"{key.replace('_',' ').title()} is expected to drop — consider boosting resources."
+                )
+            elif one_hour[key] > latest[key]:
+                suggestions[key] = (
+                    f"{key.replace('_',' ').title()} improving — maintain current operations."
+                )
+
+    if "congestion_level" in latest and "congestion_level" in one_hour:
+        if one_hour["congestion_level"] > latest["congestion_level"] + 0.1:
+            suggestions["congestion_level"] = (
+                "Congestion expected to worsen — consider load redistribution."
+            )
+
+    return suggestions
+
+
+def build_snapshot(df, version, forecaster, anomaly_vars, model_version=None):
+    """Compute a Snapshot from the history, a fitted Forecaster (or None) and its anomalous KPIs."""
+    enough = not df.empty and len(df) >= 5
+
+    latest = df.iloc[-1].to_dict() if not df.empty else None
+    with stage("predict"):
+        one_hour = forecaster.forecast_one_hour(df) if enough and forecaster else None
+        period = forecaster.forecast_period(df, hours=24) if enough and forecaster else None
+
+    return Snapshot(
+        version=version,
+        model_version=model_version,
+        built_at=datetime.now(),
+        rows=len(df),
+        latest=latest,
+        forecast_next=one_hour,
+        forecast_24h=period,
+        anomaly_vars=tuple(anomaly_vars or ()),
+        suggestions=compare_suggestions(latest, one_hour) if latest else {},
+    )
+
+
+# ============================================================
+# PIPELINE
+# ============================================================
+class SnapshotPipeline:
+    """
+    Holds the newest Snapshot. run() rebuilds it when the data or model
+    version moved on (one build at a time); get() is a plain attribute read.
+    """
+
+    def __init__(self, build, current_key):
+        self._build = build              # () -> Snapshot
+        self._current_key = current_key  # () -> (data version, model version)
+        self._build_lock = threading.Lock()
+        self._snapshot = None
+
+        self.builds = 0
+        self.skipped = 0
+
+    @property
+    def version(self):
+        snap = self._snapshot
+        return None if snap is None else snap.version
+
+    def get(self):
+        """Newest published Snapshot (None before the first run)."""
+        return self._snapshot
+
+    def run(self, force=False):
+        """Build and publish a new Snapshot unless the current one is up to date."""
+        with self._build_lock:
+            snap = self._snapshot
+            if not force and snap is not None and (snap.version, snap.model_version) == self._current_key():
+                self.skipped += 1
+                return snap
+
+            snap = self._build()
+            current = self._snapshot
+            if current is None or snap.version >= current.version:
+                self._snapshot = snap  # single reference swap: readers never see a partial snapshot
+            self.builds += 1
+            return snap
+
+    def stats(self):
+        snap = self._snapshot
+        return {
+            "version": None if snap is None else snap.version,
+            "model_version": None if snap is None else snap.model_version,
+            "built_at": None if snap is None else snap.built_at.isoformat(),
+            "builds": self.builds,
+            "skipped": self.skipped,
+        }
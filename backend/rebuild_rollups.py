@@ -0,0 +1,49 @@
+# backend/rebuild_rollups.py
+#
+# Recompute the hourly / daily rollups from the raw history and save them,
+# e.g. after restoring or editing the history offline. Run it while the
+# API is stopped; a running API keeps (and later saves) its own rollups.
+#
+#   python -m backend.rebuild_rollups
+#   python -m backend.rebuild_rollups --storage csv --history /tmp/history.csv --out /tmp/rollups
+
+import argparse
+import sys
+import time
+
+from backend import rollups
+from backend.local_storage import CSV_PATH, COLUMNAR_PATH, STORAGE_BACKEND
+from backend.storage import CsvBackend, ColumnarBackend
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the hourly / daily rollups from raw history")
+    parser.add_argument("--storage", choices=["csv", "columnar"], default=STORAGE_BACKEND)
+    parser.add_argument("--history", default=None, help="history file / directory (default: the API's)")
+    parser.add_argument("--out", default=rollups.ROLLUP_DIR)
+    args = parser.parse_args()
+
+    if args.storage == "csv":
+        store = CsvBackend(args.history or CSV_PATH)
+    else:
+        store = ColumnarBackend(args.history or COLUMNAR_PATH)
+
+    if not store.exists():
+        sys.exit("❌ No history to roll up")
+
+    t0 = time.perf_counter()
+    df = store.read()
+    if not df["timestamp"].is_monotonic_increasing:
+        df = df.sort_values("timestamp", kind="stable", ignore_index=True)
+
+    rollups.rebuild(df)
+    rollups.save(args.out)
+    stats = rollups.rollup_stats()
+    print(
+        f"✅ Rolled up {stats['rows']} rows into {stats['hour']} hourly and {stats['day']} daily buckets "
+        f"in {time.perf_counter() - t0:.1f}s → {args.out}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+# backend/rollups.py
+#
+# Hourly and daily rollups of the history: mean / min / max / count per KPI
+# and time bucket. Appended rows are folded into their buckets as they are
+# written (only the touched buckets change), so long-range reads
+# (/data?resolution=hour|day) and long-horizon forecasts never rescan the
+# raw rows.
+#
+# The rollups are saved under XENBER_ROLLUP_DIR every
+# XENBER_ROLLUP_SAVE_SECONDS and on exit. On start (or after an external
+# rewrite of the history) they catch up on the rows they have not seen yet;
+# if the saved state does not match the history they are rebuilt from the
+# raw rows, which `python -m backend.rebuild_rollups` also does offline.
+
+import atexit
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+
+from backend.anomaly import KPI_COLUMNS
+from backend.storage import to_epoch_ns
+
+ROLLUP_DIR = os.environ.get("XENBER_ROLLUP_DIR", "backend/data/rollups")
+SAVE_INTERVAL = float(os.environ.get("XENBER_ROLLUP_SAVE_SECONDS", "60"))
+
+# Bucket width (ns) per resolution
+RESOLUTIONS = {
+    "hour": 3600 * 10**9,
+    "day": 86_400 * 10**9,
+}
+
+_LOCK = threading.RLock()
+_STATE = {
+    "version": None,     # data version the rollups are in sync with
+    "saved_at": 0.0,
+    "dirty": False,
+    "rebuilds": 0,
+    "catchups": 0,
+}
+
+
+# ============================================================
+# VECTORISED BUCKET AGGREGATES
+# ============================================================
+def aggregate(ts_ns, values, width):
+    """
+    Per-bucket aggregates of rows (int64 epoch ns, (rows, KPIs) floats):
+    (bucket starts, sums, mins, maxs, counts). NaNs are left out of every
+    aggregate; a bucket with no finite value of a KPI has count 0.
+    """
+    buckets = ts_ns - ts_ns % width
+    if len(buckets) > 1 and not (buckets[1:] >= buckets[:-1]).all():
+        order = np.argsort(buckets, kind="stable")
+        buckets, values = buckets[order], values[order]
+
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    finite = np.isfinite(values)
+
+    sums = np.add.reduceat(np.where(finite, values, 0.0), starts)
+    counts = np.add.reduceat(finite.astype(np.int64), starts)
+    mins = np.fmin.reduceat(values, starts)
+    maxs = np.fmax.reduceat(values, starts)
+    return buckets[starts], sums, mins, maxs, counts
+
+
+# ============================================================
+# ONE RESOLUTION
+# ============================================================
+class Rollup:
+    """
+    Sorted bucket starts plus running sum / min / max / count per KPI, held
+    in arrays with spare room at the end (like the history cache): a new
+    bucket after the newest one is written in place, so an append costs
+    O(new buckets). Only out-of-order buckets shift the arrays.
+    """
+
+    _FIELDS = ("buckets", "sums", "mins", "maxs", "counts")
+
+    def __init__(self, name, width):
+        self.name = name
+        self.width = width
+        self.clear()
+
+    def clear(self):
+        k = len(KPI_COLUMNS)
+        self.load(
+            buckets=np.empty(0, dtype=np.int64),
+            sums=np.empty((0, k)),
+            mins=np.empty((0, k)),
+            maxs=np.empty((0, k)),
+            counts=np.empty((0, k), dtype=np.int64),
+        )
+
+    def load(self, buckets, sums, mins, maxs, counts, capacity=None):
+        """Replace the contents with these arrays (copied into fresh buffers)."""
+        n = len(buckets)
+        capacity = max(capacity or 0, n + max(n // 2, 1024))
+        self.n = n
+
+        for field, values in zip(self._FIELDS, (buckets, sums, mins, maxs, counts)):
+            buf = np.empty((capacity, *values.shape[1:]), dtype=values.dtype)
+            buf[:n] = values
+            setattr(self, f"_{field}", buf)
+
+    # ---------- live rows of each buffer (views, no copy) ----------
+    @property
+    def buckets(self):
+        return self._buckets[:self.n]
+
+    @property
+    def sums(self):
+        return self._sums[:self.n]
+
+    @property
+    def mins(self):
+        return self._mins[:self.n]
+
+    @property
+    def maxs(self):
+        return self._maxs[:self.n]
+
+    @property
+    def counts(self):
+        return self._counts[:self.n]
+
+    def add(self, ts_ns, values):
+        """Fold rows into their buckets; only new buckets grow the arrays."""
+        if len(ts_ns) == 0:
+            return
+
+        b, s, mn, mx, c = aggregate(ts_ns, values, self.width)
+
+        n = self.n
+        if n == 0 or b[0] >= self._buckets[n - 1]:
+            # In-order append (the usual case): b is sorted, so at most its
+            # first bucket is the current newest one and the rest are new
+            if n and b[0] == self._buckets[n - 1]:
+                self._merge(np.array([n - 1]), s[:1], mn[:1], mx[:1], c[:1])
+                b, s, mn, mx, c = b[1:], s[1:], mn[1:], mx[1:], c[1:]
+            self._append(b, s, mn, mx, c)
+            return
+
+        buckets = self.buckets
+        pos = np.searchsorted(buckets, b)
+        hit = pos < n
+        hit[hit] = buckets[pos[hit]] == b[hit]
+        self._merge(pos[hit], s[hit], mn[hit], mx[hit], c[hit])
+
+        new = ~hit
+        if new.any():
+            at = pos[new]
+            self.load(
+                buckets=np.insert(buckets, at, b[new]),
+                sums=np.insert(self.sums, at, s[new], axis=0),
+                mins=np.insert(self.mins, at, mn[new], axis=0),
+                maxs=np.insert(self.maxs, at, mx[new], axis=0),
+                counts=np.insert(self.counts, at, c[new], axis=0),
+            )
+
+    def _merge(self, p, s, mn, mx, c):
+        """Fold aggregates into the existing buckets at positions p."""
+        self._sums[p] += s
+        self._counts[p] += c
+        self._mins[p] = np.fmin(self._mins[p], mn)
+        self._maxs[p] = np.fmax(self._maxs[p], mx)
+
+    def _append(self, b, s, mn, mx, c):
+        """Write new buckets (all after the newest) past the end, growing when full."""
+        n, k = self.n, len(b)
+        if k == 0:
+            return
+        if n + k > len(self._buckets):
+            self.load(*self._live(), capacity=2 * (n + k))
+
+        self._buckets[n:n + k] = b
+        self._sums[n:n + k] = s
+        self._mins[n:n + k] = mn
+        self._maxs[n:n + k] = mx
+        self._counts[n:n + k] = c
+        self.n = n + k
+
+    def _live(self):
+        return self.buckets, self.sums, self.mins, self.maxs, self.counts
+
+    def frame(self, since=None, until=None, limit=None):
+        """
+        Buckets starting in [since, until] as a frame: timestamp (bucket
+        start) and <kpi>_mean / _min / _max / _count; `limit` keeps the
+        newest buckets.
+        """
+        lo, hi = 0, len(self.buckets)
+        if since is not None:
+            lo = int(np.searchsorted(self.buckets, to_epoch_ns(since), "left"))
+        if until is not None:
+            hi = int(np.searchsorted(self.buckets, to_epoch_ns(until), "right"))
+        if limit is not None and hi - lo > limit:
+            lo = hi - limit
+        hi = max(lo, hi)
+
+        counts = self.counts[lo:hi]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = self.sums[lo:hi] / counts
+
+        out = {"timestamp": self.buckets[lo:hi].view("datetime64[ns]")}
+        for j, col in enumerate(KPI_COLUMNS):
+            out[f"{col}_mean"] = means[:, j]
+            out[f"{col}_min"] = self.mins[lo:hi, j]
+            out[f"{col}_max"] = self.maxs[lo:hi, j]
+            out[f"{col}_count"] = counts[:, j]
+        return pd.DataFrame(out)
+
+    def arrays(self):
+        return dict(zip(self._FIELDS, self._live()))
+
+
+ROLLUPS = {name: Rollup(name, width) for name, width in RESOLUTIONS.items()}
+
+# Raw rows folded in so far: count and newest timestamp (epoch ns)
+_SEEN = {"rows": 0, "last_ns": None}
+
+
+# ============================================================
+# FOLDING ROWS IN
+# ============================================================
+def _fold(rows):
+    ts_ns = to_epoch_ns(rows["timestamp"])
+    if len(ts_ns) == 0:
+        return
+    values = np.column_stack([rows[col].to_numpy(dtype=float) for col in KPI_COLUMNS])
+
+    for rollup in ROLLUPS.values():
+        rollup.add(ts_ns, values)
+
+    newest = int(ts_ns.max())
+    _SEEN["rows"] += len(ts_ns)
+    _SEEN["last_ns"] = newest if _SEEN["last_ns"] is None else max(_SEEN["last_ns"], newest)
+    _STATE["dirty"] = True
+
+
+def rebuild(df):
+    """Recompute every rollup from the raw history df."""
+    with _LOCK:
+        for rollup in ROLLUPS.values():
+            rollup.clear()
+        _SEEN["rows"], _SEEN["last_ns"] = 0, None
+        _fold(df)
+        _STATE["rebuilds"] += 1
+
+
+def sync(df, version):
+    """
+    Bring the rollups up to the cached history df (sorted by timestamp) at
+    data version `version`: fold in only the rows after the ones already
+    seen when df still starts with them, rebuild otherwise.
+    """
+    with _LOCK:
+        current = _STATE["version"]
+        if current is not None and current >= version:
+            return   # already there (an append landed after df was read)
+
+        seen = _SEEN["rows"]
+        resumable = seen <= len(df) and (
+            seen == 0 or to_epoch_ns(df["timestamp"].iloc[seen - 1:seen])[0] == _SEEN["last_ns"]
+        )
+
+        if not resumable:
+            print("⚠ Rollups do not match the history — rebuilding from raw rows")
+            rebuild(df)
+        elif seen == 0:
+            rebuild(df)
+        else:
+            _fold(df.iloc[seen:])
+            _STATE["catchups"] += 1
+
+        _STATE["version"] = version
+        _save_if_due()
+
+
+def on_append(rows, version):
+    """Append listener: fold the committed rows into the touched buckets."""
+    with _LOCK:
+        current = _STATE["version"]
+        if version is not None and current is not None and current >= version:
+            return   # a read already caught up to this append
+        if version is None or current != version - 1:
+            # Out of step (history reloaded): the next read resyncs
+            _STATE["version"] = None
+            return
+        _fold(rows)
+        _STATE["version"] = version
+        _save_if_due()
+
+
+def query(resolution, since=None, until=None, limit=None, history=None):
+    """
+    Rollup frame of `resolution` for [since, until]. `history()` returns the
+    cached history and its data version; the rollups catch up first if
+    they are behind it.
+    """
+    if resolution not in ROLLUPS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {', '.join(ROLLUPS)}")
+
+    if history is not None:
+        # Read outside _LOCK: a cold history load can be slow, and the append
+        # listener (run after the history lock is released) folds under _LOCK
+        df, version = history()
+        sync(df, version)
+
+    with _LOCK:
+        return ROLLUPS[resolution].frame(since=since, until=until, limit=limit)
+
+
+# ============================================================
+# PERSISTENCE
+# ============================================================
+def _path(name, root):
+    return os.path.join(root, f"{name}.npz")
+
+
+def save(root=ROLLUP_DIR):
+    """Write every rollup (plus the rows they cover) to root/<resolution>.npz."""
+    with _LOCK:
+        os.makedirs(root, exist_ok=True)
+        last_ns = -1 if _SEEN["last_ns"] is None else _SEEN["last_ns"]
+        for name, rollup in ROLLUPS.items():
+            tmp = _path(name, root) + ".tmp"
+            with open(tmp, "wb") as f:
+                np.savez(f, rows=_SEEN["rows"], last_ns=last_ns, **rollup.arrays())
+            os.replace(tmp, _path(name, root))
+        _STATE["saved_at"] = time.time()
+        _STATE["dirty"] = False
+
+
+def _save_if_due():
+    if _STATE["dirty"] and time.time() - _STATE["saved_at"] >= SAVE_INTERVAL:
+        try:
+            save()
+        except OSError as e:
+            print(f"⚠ Could not save rollups: {e}")
+
+
+def load_saved(root=ROLLUP_DIR):
+    """Restore the rollups saved under root; False if they are missing or inconsistent."""
+    paths = {name: _path(name, root) for name in ROLLUPS}
+    if not all(os.path.exists(p) for p in paths.values()):
+        return False
+
+    try:
+        saved = {}
+        for name, path in paths.items():
+            with np.load(path) as f:
+                saved[name] = {key: f[key] for key in f.files}
+    except (OSError, ValueError) as e:
+        print(f"⚠ Could not read saved rollups: {e}")
+        return False
+
+    rows = {int(s["rows"]) for s in saved.values()}
+    if len(rows) != 1:
+        return False
+
+    with _LOCK:
+        for name, s in saved.items():
+            ROLLUPS[name].load(**{field: s[field] for field in Rollup._FIELDS})
+
+        last_ns = int(next(iter(saved.values()))["last_ns"])
+        _SEEN["rows"] = rows.pop()
+        _SEEN["last_ns"] = None if last_ns < 0 else last_ns
+        _STATE["version"] = None
+        _STATE["saved_at"] = time.time()
+    return True
+
+
+def _save_on_exit():
+    if _STATE["dirty"]:
+        try:
+            save()
+        except OSError:
+            pass
+
+
+atexit.register(_save_on_exit)
+
+
+def rollup_stats():
+    with _LOCK:
+        return {
+            **{name: len(rollup.buckets) for name, rollup in ROLLUPS.items()},
+            "rows": _SEEN["rows"],
+            "version": _STATE["version"],
+            "rebuilds": _STATE["rebuilds"],
+            "catchups": _STATE["catchups"],
+        }
@@ -0,0 +1,191 @@
+# backend/serialize.py
+#
+# JSON encoding for API responses. DataFrames are encoded column by column:
+# non-finite floats are masked to null on the NumPy arrays in one step and
+# the rows are zipped straight into the encoder, instead of walking every
+# value of to_dict(orient="records") in Python.
+#
+# Frame endpoints can also answer in two more compact formats, picked with
+# ?format= or the Accept header:
+#   records  [{"timestamp": "...", ...}, ...]           (default)
+#   split    {"columns": [...], "data": [[...], ...]}   timestamps in epoch ms
+#   arrow    Arrow IPC stream (needs pyarrow)
+
+import json
+import math
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback, slower but same output
+    orjson = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow responses are then refused with 406
+    pa = None
+
+SPLIT_JSON = "application/vnd.xenber.split+json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+FORMATS = ("records", "split", "arrow")
+
+
+# ============================================================
+# CLEAN JSON (remove NaN / inf)
+# ============================================================
+def clean_json(obj):
+    if isinstance(obj, dict):
+        return {k: clean_json(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [clean_json(v) for v in obj]
+    if isinstance(obj, float):
+        if math.isnan(obj) or math.isinf(obj):
+            return None
+        return obj
+    return obj
+
+
+# ============================================================
+# DATAFRAME → COLUMNS / RECORDS
+# ============================================================
+def column_values(series):
+    """One column as a Python list, ready for the encoder."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.astype(str).to_numpy(dtype=object)
+        values[series.isna().to_numpy()] = None
+        return values.tolist()
+
+    if pd.api.types.is_float_dtype(series):
+        arr = series.to_numpy(dtype=float)
+        bad = ~np.isfinite(arr)
+        if bad.any():
+            arr = arr.astype(object)
+            arr[bad] = None
+        return arr.tolist()
+
+    if pd.api.types.is_integer_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return series.to_numpy().tolist()
+
+    values = series.to_numpy(dtype=object)
+    values[pd.isna(values)] = None
+    return [_scalar(v) for v in values.tolist()]
+
+
+def frame_records(df):
+    """List of row dicts for df (the shape of to_dict(orient="records"))."""
+    names = [str(c) for c in df.columns]
+    columns = [column_values(df[c]) for c in df.columns]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def frame_split(df):
+    """Columnar "split" payload: column names once, rows as arrays, epoch-ms timestamps."""
+    columns = []
+    for c in df.columns:
+        series = df[c]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            ms = series.astype("datetime64[ms]").to_numpy().astype(np.int64).astype(object)
+            ms[series.isna().to_numpy()] = None
+            columns.append(ms.tolist())
+        else:
+            columns.append(column_values(series))
+
+    return {
+        "columns": [str(c) for c in df.columns],
+        "data": [list(row) for row in zip(*columns)],
+    }
+
+
+def frame_arrow(df):
+    """Arrow IPC stream bytes for df."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _scalar(value):
+    if isinstance(value, pd.Timestamp):
+        return str(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+# ============================================================
+# ENCODER
+# ============================================================
+def _default(obj):
+    if isinstance(obj, pd.DataFrame):
+        return frame_records(obj)
+    if isinstance(obj, pd.Series):
+        return column_values(obj)
+    if obj is pd.NaT:
+        return None
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content):
+    """Encode content (may contain DataFrames) to JSON bytes, NaN/inf → null."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+    if isinstance(content, pd.DataFrame):
+        content = frame_records(content)
+    return json.dumps(clean_json(content), default=_default, allow_nan=False).encode()
+
+
+class FastJSONResponse(Response):
+    """JSON response that encodes DataFrames directly (see dumps)."""
+
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content)
+
+
+# ============================================================
+# CONTENT NEGOTIATION
+# ============================================================
+def response_format(request, fmt=None):
+    """records / split / arrow, from ?format= first and the Accept header second."""
+    if fmt is None:
+        accept = request.headers.get("accept", "")
+        if ARROW_STREAM in accept:
+            fmt = "arrow"
+        elif SPLIT_JSON in accept:
+            fmt = "split"
+        else:
+            fmt = "records"
+
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+    if fmt == "arrow" and pa is None:
+        raise HTTPException(status_code=406, detail="Arrow responses need pyarrow on the server")
+    return fmt
+
+
+def frame_payload(df, fmt):
+    """What to put in a JSON body for df in the given format."""
+    return frame_split(df) if fmt == "split" else df
+
+
+def frame_response(df, fmt, headers=None):
+    """A whole-body frame response (records / split JSON or Arrow)."""
+    if fmt == "arrow":
+        return Response(frame_arrow(df), media_type=ARROW_STREAM, headers=headers)
+
+    media_type = SPLIT_JSON if fmt == "split" else None
+    return FastJSONResponse(frame_payload(df, fmt), headers=headers, media_type=media_type)
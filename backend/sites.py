@@ -0,0 +1,273 @@
+# backend/sites.py
+#
+# Multi-site history and analytics. Every sorting hub (site_id) has its own
+# store under backend/data/sites/<site_id>/ (CSV or columnar, like the main
+# history) and the same machinery as the main history, one instance per
+# site: a local_storage.HistoryStore (cached frame, data version, single
+# writer), a ForecasterRegistry updated online from its appends, an
+# AnomalyEventStore (sites/<site_id>/anomalies.db) caught up incrementally,
+# and a SnapshotPipeline built on demand per data version.
+#
+# The original single-facility history (no site_id) is local_storage.HISTORY
+# and is untouched by this module.
+#
+# Fleet-wide reads fan the per-site snapshot builds out over a thread pool
+# and answer within a latency budget: sites that are not done in time are
+# reported as pending and finish in the background for the next call.
+
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pandas as pd
+from fastapi import HTTPException
+
+from backend.anomaly_store import AnomalyEventStore
+from backend.data_generate import generate_initial_history, generate_next_row
+from backend.local_storage import FSYNC, STORAGE_BACKEND, HistoryStore, _normalise_rows
+from backend.model_registry import ForecasterRegistry
+from backend.pipeline import SnapshotPipeline, build_snapshot
+from backend.storage import COLUMNS, CsvBackend, ColumnarBackend
+
+SITES_ROOT = "backend/data/sites"
+SITE_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Threads for fleet-wide fan-out (per-site snapshot builds)
+FLEET_WORKERS = int(os.environ.get("XENBER_FLEET_WORKERS", "8"))
+
+# Detector setting of the snapshots (same defaults as /anomalies)
+DEFAULT_WINDOW = 10
+DEFAULT_THRESHOLD = 2.5
+
+_SITES = {}
+_SITES_LOCK = threading.Lock()
+_FLEET_POOL = None
+
+
+def check_site_id(site_id):
+    if not SITE_ID.match(site_id or ""):
+        raise HTTPException(status_code=400, detail="site_id must be 1-64 letters, digits, '-' or '_'")
+    return site_id
+
+
+def site_backend(site_id, root=SITES_ROOT):
+    """Storage backend for one site (same kind as the main history)."""
+    folder = os.path.join(root, site_id)
+    if STORAGE_BACKEND == "columnar":
+        return ColumnarBackend(os.path.join(folder, "history"), fsync=FSYNC)
+    return CsvBackend(os.path.join(folder, "history.csv"), fsync=FSYNC)
+
+
+# ============================================================
+# ONE SITE
+# ============================================================
+class SiteStore:
+    """
+    History, forecaster, anomaly events and snapshot of a single site, held
+    in the same classes as the main history (one instance of each per site).
+    """
+
+    def __init__(self, site_id, root=SITES_ROOT):
+        self.site_id = site_id
+        self.folder = os.path.join(root, site_id)
+        self.backend = site_backend(site_id, root)
+
+        self.history = HistoryStore(lambda: self.backend, self.init)
+        self.forecasters = ForecasterRegistry(history=self.history)
+        self.pipeline = SnapshotPipeline(
+            build=self._build_snapshot,
+            current_key=lambda: (self.history.data_version(), self.forecasters.version),
+        )
+        self.history.on_append(self._on_append)
+
+        self._lock = threading.Lock()
+        self._warm_lock = threading.Lock()
+        self._events = None     # AnomalyEventStore, opened on first use
+        self._warm = False      # model fitted and default anomalies recorded
+
+    # ---------- storage ----------
+    def exists(self):
+        return self.backend.exists()
+
+    def init(self):
+        """Create an empty store for this site."""
+        with self._lock:
+            if not self.backend.exists():
+                os.makedirs(self.folder, exist_ok=True)
+                self.backend.write_all(pd.DataFrame(columns=COLUMNS))
+
+    def append_random_row(self):
+        """One synthetic row; an empty site first gets realistic initial rows (like init_history)."""
+        self.init()
+        made = []
+
+        def make(last_ts):
+            if last_ts is None:
+                initial = generate_initial_history(n=20)
+                made.append(generate_next_row(initial["timestamp"].iloc[-1]))
+                return pd.concat([initial, _normalise_rows(made[-1:])], ignore_index=True)
+            made.append(generate_next_row(last_ts))
+            return made[-1:]
+
+        self.history.writer.write(make=make)
+        return made[-1]
+
+    # ---------- analytics ----------
+    @property
+    def anomaly_events(self):
+        with self._lock:
+            if self._events is None:
+                self._events = AnomalyEventStore(
+                    os.path.join(self.folder, "anomalies.db"),
+                    pinned=[(DEFAULT_WINDOW, DEFAULT_THRESHOLD)],
+                )
+            return self._events
+
+    def _ensure_warm(self):
+        """First read of the site: fit its model and record its default anomalies once."""
+        if self._warm:
+            return
+        with self._warm_lock:
+            if self._warm:
+                return
+            self.forecasters.warm()
+            self._warm = True
+        self.catch_up(DEFAULT_WINDOW, DEFAULT_THRESHOLD)
+
+    def _on_append(self, rows, version):
+        # Until the site is read nothing depends on its model or events
+        if not self._warm:
+            return
+        self.forecasters.on_append(rows, version)
+        self.catch_up(DEFAULT_WINDOW, DEFAULT_THRESHOLD)
+
+    def catch_up(self, window, threshold):
+        """Score the rows the event store has not seen yet for this setting."""
+        df = self.history.load_data()
+        # version=None: worker-pool exports are keyed by the main history's versions
+        self.anomaly_events.catch_up(df, window, threshold)
+
+    def anomalies(self, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD,
+                  since=None, until=None, after_cursor=None, limit=None):
+        """AnomalyEventStore.query() for this site (events tagged with its site_id)."""
+        self._ensure_warm()
+        self.catch_up(window, threshold)
+        out, cursor = self.anomaly_events.query(
+            window, threshold, since=since, until=until, after_cursor=after_cursor, limit=limit
+        )
+        return (out.assign(site_id=self.site_id) if not out.empty else out), cursor
+
+    def anomaly_vars(self, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD):
+        self._ensure_warm()
+        self.catch_up(window, threshold)
+        return self.anomaly_events.variables(window, threshold)
+
+    def _build_snapshot(self):
+        df, version = self.history.load_versioned()
+        model_version = self.forecasters.version
+        snap = build_snapshot(df, version, self.forecasters.get(),
+                              self.anomaly_events.variables(DEFAULT_WINDOW, DEFAULT_THRESHOLD), model_version)
+
+        tag = {"site_id": self.site_id}
+        return snap._replace(
+            latest=None if snap.latest is None else {**snap.latest, **tag},
+            forecast_next=None if snap.forecast_next is None else {**snap.forecast_next, **tag},
+            forecast_24h=None if snap.forecast_24h is None else snap.forecast_24h.assign(**tag),
+        )
+
+    def snapshot(self, fresh=False):
+        """
+        Snapshot (pipeline.Snapshot, default anomaly settings) of the current
+        version, rebuilt only when the data or the model moved (or
+        fresh=True). Latest row and forecasts carry a site_id.
+        """
+        self._ensure_warm()
+        return self.pipeline.run(force=fresh)
+
+    def stats(self):
+        cache = self.history.cache_stats()
+        return {
+            "version": cache["version"],
+            "rows": cache["rows"],
+            "snapshot_version": self.pipeline.version,
+            "model_version": self.forecasters.version,
+        }
+
+
+# ============================================================
+# SITE REGISTRY
+# ============================================================
+def get_site(site_id, create=False):
+    """SiteStore for site_id; 404 for an unknown site unless create=True."""
+    check_site_id(site_id)
+
+    with _SITES_LOCK:
+        site = _SITES.get(site_id)
+        if site is None:
+            # Only sites that exist (or are being created) are registered, so
+            # requests for unknown ids don't grow the registry
+            if not create and not site_backend(site_id).exists():
+                raise HTTPException(status_code=404, detail=f"unknown site {site_id}")
+            site = _SITES[site_id] = SiteStore(site_id)
+
+    if not site.exists():
+        if not create:
+            raise HTTPException(status_code=404, detail=f"unknown site {site_id}")
+        site.init()
+    return site
+
+
+def list_sites():
+    """Site ids with a store on disk, sorted."""
+    if not os.path.isdir(SITES_ROOT):
+        return []
+    return sorted(
+        name for name in os.listdir(SITES_ROOT)
+        if SITE_ID.match(name) and site_backend(name).exists()
+    )
+
+
+def sites_stats():
+    with _SITES_LOCK:
+        loaded = dict(_SITES)
+    return {site_id: site.stats() for site_id, site in sorted(loaded.items())}
+
+
+# ============================================================
+# FLEET FAN-OUT
+# ============================================================
+def _fleet_pool():
+    global _FLEET_POOL
+    with _SITES_LOCK:
+        if _FLEET_POOL is None:
+            _FLEET_POOL = ThreadPoolExecutor(FLEET_WORKERS, thread_name_prefix="fleet")
+        return _FLEET_POOL
+
+
+def fleet_snapshots(site_ids, budget_s):
+    """
+    {site_id: Snapshot} for the sites whose snapshot is ready within
+    budget_s seconds, plus the list of sites still being computed.
+    """
+    t0 = time.perf_counter()
+    pool = _fleet_pool()
+    futures = {pool.submit(get_site(s).snapshot): s for s in site_ids}
+
+    done, pending = wait(futures, timeout=budget_s)
+
+    ready, failed = {}, {}
+    for future in done:
+        site_id = futures[future]
+        try:
+            ready[site_id] = future.result()
+        except Exception as e:
+            failed[site_id] = str(e)
+
+    return {
+        "ready": ready,
+        "pending": sorted(futures[f] for f in pending),
+        "failed": failed,
+        "seconds": time.perf_counter() - t0,
+    }
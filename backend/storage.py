@@ -0,0 +1,329 @@
+# backend/storage.py
+#
+# Storage backends for the history. backend.local_storage owns caching and
+# versioning; a backend only knows how to put rows on disk and get them back.
+#
+#   CsvBackend       single append-only history.csv (the original format)
+#   ColumnarBackend  one directory per day, one raw binary file per column,
+#                    timestamps as int64 epoch nanoseconds, read via memmap
+#
+# With fsync=True appends are flushed to disk before they return. Full
+# rewrites (write_all) are built next to the store and renamed into place,
+# so a reader sees either the old or the new history, never a mix.
+
+import os
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = [
+    "timestamp",
+    "sorting_capacity",
+    "staff_available",
+    "vehicles_ready",
+    "congestion_level"
+]
+
+# On-disk dtype of every column in the columnar layout
+SCHEMA = {
+    "timestamp": "<i8",
+    "sorting_capacity": "<i8",
+    "staff_available": "<i8",
+    "vehicles_ready": "<i8",
+    "congestion_level": "<f8",
+}
+
+NS_PER_DAY = 86_400 * 10**9
+
+
+def to_epoch_ns(values):
+    """Convert timestamps (Series, array or scalar) to int64 epoch nanoseconds."""
+    if isinstance(values, (pd.Series, pd.Index, np.ndarray)):
+        if not pd.api.types.is_datetime64_dtype(values):
+            values = pd.to_datetime(values)
+        return np.asarray(values.astype("datetime64[ns]")).view("<i8")
+    return pd.Timestamp(values).as_unit("ns").value
+
+
+def _sync(f, fsync):
+    """Flush f and, if requested, force it to disk."""
+    f.flush()
+    if fsync:
+        os.fsync(f.fileno())
+
+
+# =============================================================
+# CSV BACKEND
+# =============================================================
+class CsvBackend:
+    """The original single-file history.csv layout."""
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+
+    def exists(self):
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def schema_ok(self):
+        return list(pd.read_csv(self.path, nrows=0).columns) == COLUMNS
+
+    def stat(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def write_all(self, df):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", newline="") as f:
+            df[COLUMNS].to_csv(f, index=False)
+            _sync(f, self.fsync)
+        os.replace(tmp, self.path)
+
+    def read(self, since=None, until=None):
+        df = pd.read_csv(self.path)
+
+        # Parse timestamps correctly. ISO8601 also accepts a bare date: pandas
+        # writes "2026-10-17" when every timestamp of a write is at midnight
+        df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce", format="ISO8601")
+        df = df.dropna(subset=["timestamp"])  # remove any corrupted rows
+
+        if since is not None:
+            df = df[df["timestamp"] >= pd.Timestamp(since)]
+        if until is not None:
+            df = df[df["timestamp"] <= pd.Timestamp(until)]
+
+        return df
+
+    def append(self, rows):
+        self._ensure_trailing_newline()
+        with open(self.path, "a", newline="") as f:
+            rows[COLUMNS].to_csv(f, header=False, index=False)
+            _sync(f, self.fsync)
+
+    def last_timestamp(self):
+        self._ensure_trailing_newline()
+        line = self._read_last_line()
+        ts = pd.to_datetime(line.split(",")[0], errors="coerce", format="ISO8601") if line else pd.NaT
+
+        # Header-only or corrupted tail → fall back to a full parse
+        if pd.isna(ts):
+            df = self.read()
+            ts = df["timestamp"].max() if not df.empty else pd.NaT
+
+        return None if pd.isna(ts) else ts
+
+    def _read_last_line(self):
+        """Return the last non-empty line of the CSV by seeking backwards from EOF."""
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            buf = b""
+
+            while pos > 0:
+                step = min(4096, pos)
+                pos -= step
+                f.seek(pos)
+                buf = f.read(step) + buf
+
+                lines = buf.rstrip(b"\r\n").split(b"\n")
+                if len(lines) > 1 or pos == 0:
+                    return lines[-1].decode("utf-8").strip()
+
+        return ""
+
+    def _ensure_trailing_newline(self):
+        """Make sure the next append starts on a fresh line."""
+        with open(self.path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+
+# =============================================================
+# COLUMNAR BACKEND (DAY PARTITIONS + MEMMAP READS)
+# =============================================================
+class ColumnarBackend:
+    """
+    History stored as day partitions under `root`:
+
+        root/_schema.json
+        root/2025-01-01/timestamp.bin
+        root/2025-01-01/sorting_capacity.bin
+        ...
+
+    Each .bin file is a raw little-endian array, so appends are plain byte
+    appends and reads are np.memmap views. A range read only opens the
+    partitions whose day overlaps the requested window.
+    """
+
+    def __init__(self, root, fsync=False):
+        self.root = root
+        self.fsync = fsync
+        self._listing = (None, [])  # (root mtime, sorted partition names)
+
+    # ---------- layout ----------
+    def _segments(self):
+        """Sorted partition names; the directory is only re-listed when it changes."""
+        try:
+            mtime = os.stat(self.root).st_mtime_ns
+        except FileNotFoundError:
+            return []
+
+        if self._listing[0] != mtime:
+            names = sorted(
+                name for name in os.listdir(self.root)
+                if os.path.isdir(os.path.join(self.root, name)) and not name.startswith("_")
+            )
+            self._listing = (mtime, names)
+
+        return self._listing[1]
+
+    def _col_path(self, segment, col):
+        return os.path.join(self.root, segment, f"{col}.bin")
+
+    @staticmethod
+    def _segment_name(day_index):
+        return str(np.datetime64(int(day_index), "D"))
+
+    def exists(self):
+        return bool(self._segments())
+
+    def schema_ok(self):
+        path = os.path.join(self.root, "_schema.json")
+        if not os.path.exists(path):
+            return False
+        with open(path) as f:
+            return json.load(f) == SCHEMA
+
+    def stat(self):
+        segments = self._segments()
+        if not segments:
+            return (0, None, None, 0)
+        st = os.stat(self._col_path(segments[-1], "timestamp"))
+        return (len(segments), segments[-1], st.st_mtime_ns, st.st_size)
+
+    # ---------- reads ----------
+    def _segment_arrays(self, segment):
+        """Memory-map every column of one partition (no copy)."""
+        sizes = [
+            os.path.getsize(self._col_path(segment, col)) // np.dtype(SCHEMA[col]).itemsize
+            for col in COLUMNS
+        ]
+        # A torn append can leave columns of unequal length; trust the shortest
+        n = min(sizes)
+        if n == 0:
+            return None
+
+        return {
+            col: np.memmap(self._col_path(segment, col), dtype=SCHEMA[col], mode="r", shape=(n,))
+            for col in COLUMNS
+        }
+
+    def read_arrays(self, since=None, until=None):
+        """Column arrays for [since, until]; memmap views when one partition suffices."""
+        lo = to_epoch_ns(since) if since is not None else None
+        hi = to_epoch_ns(until) if until is not None else None
+
+        parts = []
+        for segment in self._segments():
+            day = np.datetime64(segment, "D").astype("<i8") * NS_PER_DAY
+            if lo is not None and day + NS_PER_DAY <= lo:
+                continue
+            if hi is not None and day > hi:
+                continue
+
+            arrays = self._segment_arrays(segment)
+            if arrays is None:
+                continue
+
+            ts = arrays["timestamp"]
+            start = np.searchsorted(ts, lo, "left") if lo is not None else 0
+            stop = np.searchsorted(ts, hi, "right") if hi is not None else len(ts)
+            if start < stop:
+                part = {col: arr[start:stop] for col, arr in arrays.items()}
+                if parts:
+                    # Several partitions are concatenated anyway: copy them out
+                    # now so long histories don't hold one open map per file
+                    part = {col: np.array(arr) for col, arr in part.items()}
+                    if len(parts) == 1:
+                        parts[0] = {col: np.array(arr) for col, arr in parts[0].items()}
+                parts.append(part)
+
+        if not parts:
+            return {col: np.empty(0, dtype=SCHEMA[col]) for col in COLUMNS}
+        if len(parts) == 1:
+            return parts[0]
+        return {col: np.concatenate([p[col] for p in parts]) for col in COLUMNS}
+
+    def read(self, since=None, until=None):
+        arrays = self.read_arrays(since, until)
+        data = {col: arrays[col] for col in COLUMNS}
+        data["timestamp"] = arrays["timestamp"].view("datetime64[ns]")
+        return pd.DataFrame(data, columns=COLUMNS, copy=False)
+
+    def last_timestamp(self):
+        for segment in reversed(self._segments()):
+            arrays = self._segment_arrays(segment)
+            if arrays is not None:
+                return pd.Timestamp(int(arrays["timestamp"][-1]))
+        return None
+
+    # ---------- writes ----------
+    def _encode(self, rows):
+        out = {"timestamp": to_epoch_ns(rows["timestamp"])}
+        for col in COLUMNS[1:]:
+            values = pd.to_numeric(rows[col], errors="coerce").to_numpy()
+            if np.dtype(SCHEMA[col]).kind == "i":
+                if not np.isfinite(values.astype("f8")).all():
+                    raise ValueError(f"columnar storage needs complete values for {col}")
+                values = np.round(values)
+            out[col] = np.ascontiguousarray(values, dtype=SCHEMA[col])
+        return out
+
+    def append(self, rows):
+        encoded = self._encode(rows)
+        days = encoded["timestamp"] // NS_PER_DAY
+
+        # Rows arrive in time order, so each day is one contiguous run
+        bounds = np.flatnonzero(np.diff(days)) + 1
+        starts = np.concatenate([[0], bounds])
+        stops = np.concatenate([bounds, [len(days)]])
+
+        for start, stop in zip(starts, stops):
+            segment = self._segment_name(days[start])
+            os.makedirs(os.path.join(self.root, segment), exist_ok=True)
+
+            # Timestamp last: readers size partitions by the shortest column
+            for col in COLUMNS[1:] + ["timestamp"]:
+                with open(self._col_path(segment, col), "ab") as f:
+                    f.write(encoded[col][start:stop].tobytes())
+                    _sync(f, self.fsync)
+
+    def write_all(self, df):
+        # Build the new store beside the old one, then swap directories
+        tmp, old = self.root + ".tmp", self.root + ".old"
+        for path in (tmp, old):
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+
+        staging = ColumnarBackend(tmp, fsync=self.fsync)
+        os.makedirs(tmp)
+        with open(os.path.join(tmp, "_schema.json"), "w") as f:
+            json.dump(SCHEMA, f)
+
+        df = df.sort_values("timestamp", kind="stable")
+        if not df.empty:
+            staging.append(df)
+
+        if os.path.isdir(self.root):
+            os.rename(self.root, old)
+        os.rename(tmp, self.root)
+        if os.path.isdir(old):
+            shutil.rmtree(old)
+        self._listing = (None, [])
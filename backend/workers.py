@@ -0,0 +1,209 @@
+# backend/workers.py
+#
+# Process-pool offload for the CPU-heavy model work: full forecaster fits
+# and anomaly scans with non-default settings. The worker processes get the
+# history through one shared-memory block per data version (timestamps +
+# KPI columns as raw arrays), never as a pickled DataFrame; only the small
+# results travel back (fitted coefficients, flagged cell positions).
+#
+# Off by default. XENBER_POOL_WORKERS=N starts N worker processes; frames
+# shorter than XENBER_OFFLOAD_MIN_ROWS stay in-process because the hand-off
+# costs more than the work.
+
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from backend.anomaly import KPI_COLUMNS, RollingZScoreAnomaly
+
+POOL_WORKERS = int(os.environ.get("XENBER_POOL_WORKERS", "0"))
+OFFLOAD_MIN_ROWS = int(os.environ.get("XENBER_OFFLOAD_MIN_ROWS", "100000"))
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+_EXPORT = None          # SharedHistory of the newest exported version
+_EXPORT_LOCK = threading.Lock()
+
+_STATS = {"offloaded": 0, "inline": 0, "exports": 0}
+
+
+# ============================================================
+# SHARED HISTORY (ONE BLOCK PER DATA VERSION)
+# ============================================================
+class SharedHistory:
+    """
+    Timestamps (int64 ns) and the KPI matrix (rows x KPIs, float64) of one
+    history frame, copied once into a shared memory block. Workers attach
+    to it by name; the block is unlinked when it has been replaced and the
+    last task using it has finished.
+    """
+
+    def __init__(self, df, version):
+        n = len(df)
+        self.version = version
+        self.n = n
+        self.users = 0
+        self.retired = False
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(8, n * 8 * (1 + len(KPI_COLUMNS))))
+        ts, values = _views(self.shm.buf, n)
+        ts[:] = df["timestamp"].to_numpy(dtype="datetime64[ns]").view("i8")
+        for j, col in enumerate(KPI_COLUMNS):
+            values[:, j] = df[col].to_numpy(dtype=float)
+        del ts, values
+
+    @property
+    def handle(self):
+        return (self.shm.name, self.n)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _views(buf, n):
+    ts = np.ndarray((n,), dtype=np.int64, buffer=buf)
+    values = np.ndarray((n, len(KPI_COLUMNS)), dtype=np.float64, buffer=buf, offset=n * 8)
+    return ts, values
+
+
+def _acquire(df, version):
+    """The shared block for (version, len(df)), exporting it if needed."""
+    global _EXPORT
+
+    with _EXPORT_LOCK:
+        current = _EXPORT
+        if current is None or version is None or (current.version, current.n) != (version, len(df)):
+            fresh = SharedHistory(df, version)
+            _STATS["exports"] += 1
+            if current is not None:
+                current.retired = True
+                if current.users == 0:
+                    current.close()
+            _EXPORT = current = fresh
+
+        current.users += 1
+        return current
+
+
+def _release(block):
+    with _EXPORT_LOCK:
+        block.users -= 1
+        if block.retired and block.users == 0:
+            block.close()
+
+
+# ============================================================
+# WORKER SIDE (RUNS IN THE POOL PROCESSES)
+# ============================================================
+def _attach(handle):
+    # Pool processes share the parent's resource tracker, which unlinks
+    # nothing before the parent exits; the parent owns and unlinks the block
+    name, n = handle
+    return shared_memory.SharedMemory(name=name), n
+
+
+def _scan_task(handle, window, threshold):
+    shm, n = _attach(handle)
+    try:
+        _, values = _views(shm.buf, n)
+        hits = RollingZScoreAnomaly(window=window, threshold=threshold)._flag(values)
+        del values
+        return hits
+    finally:
+        shm.close()
+
+
+def _fit_task(handle, forecaster):
+    shm, n = _attach(handle)
+    try:
+        ts, values = _views(shm.buf, n)
+        df = pd.DataFrame({"timestamp": ts.view("datetime64[ns]")})
+        for j, col in enumerate(KPI_COLUMNS):
+            df[col] = values[:, j]   # copied into the worker's own frame
+        del ts, values
+
+        forecaster.fit(df)
+        return forecaster
+    finally:
+        shm.close()
+
+
+# ============================================================
+# PARENT SIDE
+# ============================================================
+def get_pool():
+    """The shared ProcessPoolExecutor (None when offloading is off)."""
+    global _POOL
+
+    if POOL_WORKERS <= 0:
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            # spawn: the API process has live threads, forking it is unsafe
+            _POOL = ProcessPoolExecutor(POOL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _POOL
+
+
+def shutdown_pool():
+    global _POOL, _EXPORT
+
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=True, cancel_futures=True)
+            _POOL = None
+    with _EXPORT_LOCK:
+        if _EXPORT is not None and _EXPORT.users == 0:
+            _EXPORT.close()
+        _EXPORT = None
+
+
+atexit.register(shutdown_pool)
+
+
+def _offload(df, version, task, *args):
+    """Run task(handle, *args) in the pool on df's shared block and wait for it."""
+    block = _acquire(df, version)
+    try:
+        _STATS["offloaded"] += 1
+        return get_pool().submit(task, block.handle, *args).result()
+    finally:
+        _release(block)
+
+
+def _should_offload(df):
+    return get_pool() is not None and len(df) >= OFFLOAD_MIN_ROWS
+
+
+def compute_anomalies(df, window, threshold, version=None):
+    """RollingZScoreAnomaly(window, threshold).compute(df), in a worker for big frames."""
+    detector = RollingZScoreAnomaly(window=window, threshold=threshold)
+    if not _should_offload(df):
+        _STATS["inline"] += 1
+        return detector.compute(df)
+
+    hits = _offload(df, version, _scan_task, window, threshold)
+    return detector.records(df, hits)
+
+
+def fit_forecaster(forecaster, df, version=None):
+    """forecaster.fit(df), in a worker for big frames; returns the fitted forecaster."""
+    if not _should_offload(df):
+        _STATS["inline"] += 1
+        forecaster.fit(df)
+        return forecaster
+
+    return _offload(df, version, _fit_task, forecaster)
+
+
+def pool_stats():
+    with _EXPORT_LOCK:
+        exported = None if _EXPORT is None else {"version": _EXPORT.version, "rows": _EXPORT.n}
+    return {"workers": POOL_WORKERS, "min_rows": OFFLOAD_MIN_ROWS, "shared": exported, **_STATS}
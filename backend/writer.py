@@ -0,0 +1,181 @@
+# backend/writer.py
+#
+# Single writer for the history store. Every append (scheduler job, /append)
+# is queued here and one thread owns the store: it drains
+# whatever queued up while the previous commit was running and writes it as
+# one group commit (one backend append + fsync, one cache update, one
+# version bump, one listener call).
+
+import queue
+import threading
+from concurrent.futures import Future
+
+import pandas as pd
+
+# Upper bound on rows folded into one commit
+MAX_BATCH_ROWS = 100_000
+
+
+class _Item:
+    def __init__(self, rows=None, make=None):
+        self.rows = rows      # DataFrame to append
+        self.make = make      # or fn(last_ts) -> rows, run in the writer thread
+        self.future = Future()
+
+
+class GroupCommitWriter:
+    """
+    Serialises appends through one daemon thread.
+
+    `commit(rows)` writes a DataFrame to the store and `tail()` returns the
+    newest stored timestamp; both are only ever called from the writer
+    thread, so they need no locking against other writers. After a failed
+    commit `tail()` must report what actually reached the store. `make`
+    generators may run again when a failed group is retried item by item.
+    """
+
+    def __init__(self, commit, tail, normalise):
+        self._commit = commit
+        self._tail = tail
+        self._normalise = normalise
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        self.commits = 0
+        self.rows = 0
+        self.max_group = 0
+
+    # ============================================================
+    # SUBMITTING (ANY THREAD)
+    # ============================================================
+    def submit(self, rows=None, make=None):
+        """Queue rows (or a make(last_ts) generator); returns a Future of the committed rows."""
+        item = _Item(rows=rows, make=make)
+
+        if self.in_writer_thread():
+            # Re-entrant append from a listener: commit in place
+            self._run([item])
+            return item.future
+
+        self._ensure_started()
+        self._queue.put(item)
+        return item.future
+
+    def write(self, rows=None, make=None, timeout=None):
+        """submit() and wait for the commit."""
+        return self.submit(rows=rows, make=make).result(timeout)
+
+    def in_writer_thread(self):
+        return threading.current_thread() is self._thread
+
+    def stats(self):
+        return {
+            "commits": self.commits,
+            "rows": self.rows,
+            "avg_group_rows": self.rows / self.commits if self.commits else None,
+            "max_group_rows": self.max_group,
+            "queued": self._queue.qsize(),
+        }
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="history-writer", daemon=True)
+                self._thread.start()
+
+    # ============================================================
+    # WRITER THREAD
+    # ============================================================
+    def _loop(self):
+        while True:
+            items = [self._queue.get()]
+            pending = 0 if items[0].rows is None else len(items[0].rows)
+
+            # Everything that queued up meanwhile joins this commit
+            while pending < MAX_BATCH_ROWS:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                items.append(item)
+                pending += 0 if item.rows is None else len(item.rows)
+
+            self._run(items)
+
+    def _prepare(self, item, last_ts):
+        """The item's rows (make() run against last_ts), or None after failing its future."""
+        try:
+            rows = item.make(last_ts) if item.make is not None else item.rows
+            return self._normalise(rows)
+        except Exception as e:
+            item.future.set_exception(e)
+            return None
+
+    def _run(self, items):
+        """Commit one group; whatever goes wrong fails its futures, never the thread."""
+        try:
+            self._run_group(items)
+        except BaseException as e:
+            # e.g. tail() raising: nobody waiting on this group may hang,
+            # and the writer thread must live on for the next one
+            for item in items:
+                if not item.future.done():
+                    item.future.set_exception(e)
+
+    def _run_group(self, items):
+        tail = self._tail()
+        last_ts = tail
+        ready = []
+
+        for item in items:
+            rows = self._prepare(item, last_ts)
+            if rows is None:
+                continue
+
+            if not rows.empty:
+                newest = rows["timestamp"].max()
+                last_ts = newest if last_ts is None else max(last_ts, newest)
+            ready.append((item, rows))
+
+        if not ready:
+            return
+
+        try:
+            self._commit_group([rows for _, rows in ready])
+        except Exception as e:
+            if len(ready) == 1 or self._tail() != tail:
+                # Part of the group may have reached the store: retrying
+                # could write those rows twice, so the whole group fails
+                for item, _ in ready:
+                    item.future.set_exception(e)
+                return
+
+            # Nothing was stored. One bad batch must not fail everyone
+            # else's rows: retry one by one, each item rebuilt against the
+            # stored tail (not the tail the failed group would have left)
+            for item, _ in ready:
+                rows = self._prepare(item, self._tail())
+                if rows is None:
+                    continue
+                try:
+                    self._commit_group([rows])
+                except Exception as item_error:
+                    item.future.set_exception(item_error)
+                else:
+                    item.future.set_result(rows)
+            return
+
+        for item, rows in ready:
+            item.future.set_result(rows)
+
+    def _commit_group(self, frames):
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            return
+        batch = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+        self._commit(batch)
+        self.commits += 1
+        self.rows += len(batch)
+        self.max_group = max(self.max_group, len(batch))
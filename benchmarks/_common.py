@@ -0,0 +1,80 @@
+# benchmarks/_common.py
+#
+# Shared helpers for the benchmark scripts. Benchmarks always work on a
+# scratch copy of the history, and isolate_app_data() sends the app's
+# anomaly events and rollups to a temp dir, so they never touch backend/data.
+
+import atexit
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from backend import local_storage
+from backend.data_generate import generate_history
+from backend.storage import CsvBackend, ColumnarBackend
+
+
+# =============================================================
+# SYNTHETIC HISTORY (FAST, VECTORISED)
+# =============================================================
+def make_history(n, start="2024-01-01", seed=0, freq="30min"):
+    """Build an n-row history frame with the storage schema and daily patterns."""
+    return generate_history(n, start=start, interval=freq, seed=seed)
+
+
+# =============================================================
+# SCRATCH STORAGE
+# =============================================================
+@contextmanager
+def scratch_history(df, kind="csv"):
+    """Point backend.local_storage at a temporary store ("csv"/"columnar") holding df."""
+    with tempfile.TemporaryDirectory() as tmp:
+        if kind == "columnar":
+            backend = ColumnarBackend(os.path.join(tmp, "history"))
+        else:
+            backend = CsvBackend(os.path.join(tmp, "history.csv"))
+        backend.write_all(df)
+
+        local_storage.set_backend(backend)
+        try:
+            yield backend
+        finally:
+            local_storage.set_backend(None)
+
+
+def isolate_app_data():
+    """
+    Point the anomaly event store and the rollups at a temp dir; call before
+    importing backend.api (both read their paths at import). The dir is
+    removed at exit, after the rollups' own exit hook has saved into it.
+    """
+    tmp = tempfile.mkdtemp(prefix="xenber-bench-")
+    atexit.register(shutil.rmtree, tmp, ignore_errors=True)
+    os.environ["XENBER_ANOMALY_DB"] = os.path.join(tmp, "anomalies.db")
+    os.environ["XENBER_ROLLUP_DIR"] = os.path.join(tmp, "rollups")
+    return tmp
+
+
+# =============================================================
+# TIMING
+# =============================================================
+def time_calls(fn, repeat):
+    """Call fn repeat times and return per-call latencies in seconds."""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return np.array(samples)
+
+
+def summarize(samples):
+    return {
+        "median_us": float(np.median(samples) * 1e6),
+        "p95_us": float(np.percentile(samples, 95) * 1e6),
+        "max_us": float(samples.max() * 1e6),
+    }
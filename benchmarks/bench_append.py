@@ -0,0 +1,95 @@
+# benchmarks/bench_append.py
+#
+# Append latency vs. history size.
+#
+#   python -m benchmarks.bench_append                  # 1k .. 1M rows
+#   python -m benchmarks.bench_append --max-rows 10000000
+#
+# The append path should stay flat as the history grows, both with a cold
+# cache ("append": nothing cached, only the store grows) and with the parsed
+# history cached ("warm": the cache is extended too, as in the running API).
+# "reader" is the data_version() latency seen by a concurrent reader during
+# the warm appends. --legacy also times the old load + concat + full
+# rewrite path for comparison.
+
+import argparse
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from backend import local_storage
+from backend.data_generate import generate_next_row
+from benchmarks._common import make_history, scratch_history, time_calls, summarize
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+
+def legacy_append():
+    """The original O(history) append: parse everything and rewrite the file."""
+    df = local_storage.load_data()
+    new_row = generate_next_row(df["timestamp"].iloc[-1])
+    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
+    local_storage.get_backend().write_all(df)
+
+
+def warm_appends(repeat):
+    """Append latencies with a warm cache, plus a concurrent reader's data_version() latencies."""
+    local_storage.load_data()
+    misses = local_storage.cache_stats()["misses"]
+    stop = threading.Event()
+    waits = []
+
+    def reader():
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            local_storage.data_version()
+            waits.append(time.perf_counter() - t0)
+            time.sleep(0.0005)
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    try:
+        samples = time_calls(local_storage.append_random_row, repeat)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert local_storage.cache_stats()["misses"] == misses, "warm appends reloaded the history"
+    return samples, np.array(waits)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--storage", choices=["csv", "columnar"], default="csv")
+    parser.add_argument("--legacy", action="store_true",
+                        help="also time the full-rewrite path (slow on big histories)")
+    args = parser.parse_args()
+
+    print(f"{'rows':>12} {'path':>8} {'median_us':>12} {'p95_us':>12} {'max_us':>12}")
+
+    for n in [s for s in SIZES if s <= args.max_rows]:
+        with scratch_history(make_history(n), kind=args.storage):
+            # First call pays the one-off tail read; keep it out of the numbers
+            local_storage.append_random_row()
+
+            stats = summarize(time_calls(local_storage.append_random_row, args.repeat))
+            print(f"{n:>12} {'append':>8} {stats['median_us']:>12.1f} "
+                  f"{stats['p95_us']:>12.1f} {stats['max_us']:>12.1f}")
+
+            for path, samples in zip(["warm", "reader"], warm_appends(args.repeat)):
+                stats = summarize(samples)
+                print(f"{n:>12} {path:>8} {stats['median_us']:>12.1f} "
+                      f"{stats['p95_us']:>12.1f} {stats['max_us']:>12.1f}")
+
+            if args.legacy:
+                stats = summarize(time_calls(legacy_append, min(args.repeat, 5)))
+                print(f"{n:>12} {'legacy':>8} {stats['median_us']:>12.1f} "
+                      f"{stats['p95_us']:>12.1f} {stats['max_us']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# benchmarks/bench_ingest.py
+#
+# Bulk ingest throughput (parse + validate + single append) per batch format.
+#
+#   python -m benchmarks.bench_ingest
+#   python -m benchmarks.bench_ingest --sizes 1000 100000 --storage columnar
+
+import argparse
+
+import pandas as pd
+
+from backend import local_storage
+from backend.ingest import ingest_batch, pa
+from benchmarks._common import make_history, scratch_history
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def encode(df, fmt):
+    if fmt == "csv":
+        return df.to_csv(index=False).encode()
+    if fmt == "jsonl":
+        return df.to_json(orient="records", lines=True, date_format="iso").encode()
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="*", default=SIZES)
+    parser.add_argument("--storage", choices=["csv", "columnar"], default="csv")
+    args = parser.parse_args()
+
+    formats = ["jsonl", "csv"] + (["arrow"] if pa is not None else [])
+    print(f"{'rows':>10} {'format':>7} {'MB':>8} {'seconds':>9} {'rows/s':>12}")
+
+    for n in args.sizes:
+        history = make_history(10_000)
+        # Sensor batches: one reading per second after the stored history
+        start = history["timestamp"].iloc[-1] + pd.Timedelta(minutes=30)
+        batch = make_history(n, start=start, seed=1, freq="1s")
+
+        for fmt in formats:
+            body = encode(batch, fmt)
+            with scratch_history(history, kind=args.storage):
+                local_storage.load_data()
+                report = ingest_batch(body, fmt)
+
+            assert report["accepted"] == n, report
+            print(f"{n:>10} {fmt:>7} {len(body) / 1e6:>8.1f} {report['seconds']:>9.3f} "
+                  f"{report['rows_per_sec']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
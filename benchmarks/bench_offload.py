@@ -0,0 +1,91 @@
+# benchmarks/bench_offload.py
+#
+# Heavy-work throughput and cheap-request latency with and without the
+# process pool (backend.workers).
+#
+#   python -m benchmarks.bench_offload
+#   python -m benchmarks.bench_offload --workers 0 1 4 16 --heavy 8 --rows 1000000
+#
+# --heavy threads keep running anomaly scans with distinct settings (so
+# nothing is coalesced) while one thread measures a cheap /data-style call
+# (newest 500 rows → split payload). Workers 0 runs the scans in-process,
+# like the threadpool did. Results depend on the cores this process may
+# use (os.sched_getaffinity); restrict them with taskset to compare
+# 1, 4 and 16 cores.
+
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+from backend import workers
+from backend.serialize import frame_split
+from benchmarks._common import make_history
+
+
+def run(df, pool_workers, heavy, tasks_per_thread):
+    workers.shutdown_pool()
+    workers.POOL_WORKERS = pool_workers
+    workers.OFFLOAD_MIN_ROWS = 0
+
+    # Start the worker processes (and export the block) outside the timing
+    for i in range(max(1, pool_workers)):
+        workers.compute_anomalies(df.iloc[:1000], 10, 2.5, version=("warm", i))
+
+    stop = threading.Event()
+    latencies = []
+    tail = df.tail(500)
+
+    def cheap():
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            frame_split(tail)
+            latencies.append(time.perf_counter() - t0)
+            time.sleep(0.005)
+
+    def scan(i):
+        for k in range(tasks_per_thread):
+            workers.compute_anomalies(df, 10 + i, 2.0 + k / 100, version=1)
+
+    probe = threading.Thread(target=cheap)
+    threads = [threading.Thread(target=scan, args=(i,)) for i in range(heavy)]
+    probe.start()
+
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    stop.set()
+    probe.join()
+    workers.shutdown_pool()
+
+    lat = np.array(latencies) * 1e3
+    return heavy * tasks_per_thread / elapsed, np.median(lat), np.percentile(lat, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="*", default=[0, 1, 4, 16])
+    parser.add_argument("--heavy", type=int, default=8, help="concurrent heavy request threads")
+    parser.add_argument("--tasks", type=int, default=2, help="scans per heavy thread")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = make_history(args.rows, freq="1min")
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+
+    print(f"rows: {args.rows}, heavy threads: {args.heavy}, usable cores: {cores}")
+    print(f"{'workers':>8} {'scans/s':>9} {'cheap_p50_ms':>13} {'cheap_p99_ms':>13}")
+
+    for n in args.workers:
+        rate, p50, p99 = run(df, n, args.heavy, args.tasks)
+        print(f"{n:>8} {rate:>9.2f} {p50:>13.2f} {p99:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
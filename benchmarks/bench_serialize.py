@@ -0,0 +1,58 @@
+# benchmarks/bench_serialize.py
+#
+# Payload build time for a /data-style response: the old
+# to_dict(orient="records") + clean_json + FastAPI encoding path against
+# backend.serialize.
+#
+#   python -m benchmarks.bench_serialize
+#   python -m benchmarks.bench_serialize --sizes 1000 100000
+
+import argparse
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from backend import serialize
+from backend.serialize import FastJSONResponse, clean_json
+from benchmarks._common import make_history, time_calls
+
+SIZES = [1_000, 100_000, 1_000_000]
+
+
+def legacy_payload(df):
+    df = df.copy()
+    df["timestamp"] = df["timestamp"].astype(str)
+    content = clean_json(df.to_dict(orient="records"))
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def fast_payload(df):
+    return FastJSONResponse(df).body
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="*", default=SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    encoder = "orjson" if serialize.orjson is not None else "json (stdlib)"
+    print(f"encoder: {encoder}")
+    print(f"{'rows':>10} {'legacy_ms':>12} {'fast_ms':>12} {'speedup':>9} {'bytes':>12}")
+
+    for n in args.sizes:
+        df = make_history(n)
+        df.loc[df.index[::97], "congestion_level"] = np.nan   # exercise the masking
+
+        assert legacy_payload(df.head(50)) == fast_payload(df.head(50))
+
+        legacy = np.median(time_calls(lambda: legacy_payload(df), args.repeat)) * 1e3
+        fast = np.median(time_calls(lambda: fast_payload(df), args.repeat)) * 1e3
+        size = len(fast_payload(df))
+
+        print(f"{n:>10} {legacy:>12.1f} {fast:>12.1f} {legacy / fast:>8.1f}x {size:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# benchmarks/bench_stream.py
+#
+# Load test for /stream: start the API in a subprocess on a scratch
+# history, connect N Server-Sent Events clients, drive appends through
+# /append and measure the server's CPU time per append (Linux, /proc).
+#
+#   python -m benchmarks.bench_stream
+#   python -m benchmarks.bench_stream --clients 1 50 500 --appends 40
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+CLIENTS = [1, 10, 100, 500]
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def cpu_seconds(pid):
+    """utime + stime of a process, from /proc/<pid>/stat."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def start_server(workdir, port):
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.api:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL,
+    )
+
+    for _ in range(300):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return proc
+        except httpx.TransportError:
+            time.sleep(0.1)
+
+    proc.kill()
+    raise RuntimeError("API did not start")
+
+
+async def sse_client(http, url, counts, ready):
+    """Read events until cancelled; counts[event] += 1 for every frame."""
+    async with http.stream("GET", url) as resp:
+        async for line in resp.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+                counts[event] = counts.get(event, 0) + 1
+                if event == "hello":
+                    ready.release()
+
+
+async def run_round(base, pid, n_clients, appends, interval):
+    """Connect n_clients, then time `appends` appends; returns (counts, cpu s, wall s, stats)."""
+    counts = {}
+    ready = asyncio.Semaphore(0)
+    limits = httpx.Limits(max_connections=n_clients + 10)
+
+    async with httpx.AsyncClient(timeout=None, limits=limits) as http:
+        tasks = [
+            asyncio.create_task(sse_client(http, f"{base}/stream", counts, ready))
+            for _ in range(n_clients)
+        ]
+        for _ in range(n_clients):
+            await ready.acquire()
+
+        async with httpx.AsyncClient(timeout=30) as driver:
+            cpu0, t0 = cpu_seconds(pid), time.perf_counter()
+            for _ in range(appends):
+                await driver.get(f"{base}/append")
+                await asyncio.sleep(interval)
+            await asyncio.sleep(0.5)   # let the last events drain
+            elapsed = time.perf_counter() - t0
+            cpu = cpu_seconds(pid) - cpu0
+            stats = (await driver.get(f"{base}/cache_stats")).json()["stream"]
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return counts, cpu, elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="*", default=CLIENTS)
+    parser.add_argument("--appends", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.1, help="seconds between appends")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    base = f"http://127.0.0.1:{args.port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        proc = start_server(tmp, args.port)
+        try:
+            print(f"{'clients':>8} {'cpu_ms/append':>14} {'cpu_%':>7} {'rows_events':>12} {'dropped':>8}")
+
+            for n in args.clients:
+                counts, cpu, elapsed, stats = asyncio.run(
+                    run_round(base, proc.pid, n, args.appends, args.interval)
+                )
+
+                print(
+                    f"{n:>8} {cpu / args.appends * 1e3:>14.2f} {cpu / elapsed * 100:>6.1f}% "
+                    f"{counts.get('rows', 0):>12} {stats['dropped_clients']:>8}"
+                )
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/bench_writer.py
+#
+# Append throughput with concurrent writers and readers.
+#
+#   python -m benchmarks.bench_writer
+#   python -m benchmarks.bench_writer --writers 1 4 16 --readers 4 --storage columnar
+#
+# Every writer thread appends single synthetic rows through the group-commit
+# writer while reader threads keep slicing the newest rows (one read per
+# --read-interval each, like a steady stream of /data requests). The
+# "serial" mode commits each row on its own (one backend append + fsync per
+# row, as before the writer thread) for comparison.
+
+import argparse
+import threading
+import time
+
+from backend import local_storage
+from benchmarks._common import make_history, scratch_history
+
+
+# Serialises the "serial" writers (the group-commit writer thread is bypassed)
+_SERIAL_LOCK = threading.Lock()
+
+
+def serial_append():
+    """One commit per row, bypassing the group-commit queue."""
+    with _SERIAL_LOCK:
+        made = local_storage.generate_next_row(local_storage.last_timestamp())
+        local_storage.HISTORY._commit_rows(local_storage._normalise_rows([made]))
+
+
+def run(mode, writers, readers, rows_per_writer, read_interval):
+    append = local_storage.append_random_row if mode == "group" else serial_append
+    stop = threading.Event()
+    reads = [0] * readers
+    before = local_storage.writer_stats()
+
+    def writer():
+        for _ in range(rows_per_writer):
+            append()
+
+    def reader(i):
+        while not stop.is_set():
+            df = local_storage.query_rows(limit=500)
+            assert df["timestamp"].is_monotonic_increasing
+            reads[i] += 1
+            time.sleep(read_interval)
+
+    reader_threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    writer_threads = [threading.Thread(target=writer) for _ in range(writers)]
+    for t in reader_threads:
+        t.start()
+
+    t0 = time.perf_counter()
+    for t in writer_threads:
+        t.start()
+    for t in writer_threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    stop.set()
+    for t in reader_threads:
+        t.join()
+
+    after = local_storage.writer_stats()
+    commits = after["commits"] - before["commits"] if mode == "group" else writers * rows_per_writer
+    return writers * rows_per_writer / elapsed, commits, sum(reads) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, nargs="*", default=[1, 4, 16])
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=200, help="rows per writer")
+    parser.add_argument("--read-interval", type=float, default=0.001,
+                        help="pause between reads per reader thread (seconds)")
+    parser.add_argument("--history", type=int, default=100_000)
+    parser.add_argument("--storage", choices=["csv", "columnar"], default="csv")
+    parser.add_argument("--no-fsync", action="store_true")
+    args = parser.parse_args()
+
+    print(f"storage: {args.storage}, fsync: {not args.no_fsync}, readers: {args.readers}")
+    print(f"{'writers':>8} {'mode':>7} {'rows/s':>10} {'commits':>8} {'rows/commit':>12} {'reads/s':>10}")
+
+    for writers in args.writers:
+        for mode in ["serial", "group"]:
+            with scratch_history(make_history(args.history), kind=args.storage) as backend:
+                backend.fsync = not args.no_fsync
+                local_storage.load_data()
+
+                rate, commits, read_rate = run(mode, writers, args.readers, args.rows, args.read_interval)
+                total = writers * args.rows
+                print(f"{writers:>8} {mode:>7} {rate:>10.0f} {commits:>8} "
+                      f"{total / commits:>12.1f} {read_rate:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
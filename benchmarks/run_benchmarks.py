@@ -0,0 +1,277 @@
+# benchmarks/run_benchmarks.py
+#
+# Benchmark suite for the hot paths: storage, anomaly detection,
+# forecasting, JSON cleaning and every API endpoint (through TestClient),
+# on synthetic histories of growing size. Each case records its median /
+# min wall time and tracemalloc peak; results are written as JSON so two
+# commits can be compared.
+#
+#   python -m benchmarks.run_benchmarks                      # 1k .. 10M rows
+#   python -m benchmarks.run_benchmarks --sizes 1000 100000 --cases api
+#   python -m benchmarks.run_benchmarks --compare benchmarks/results/<old>.json
+#
+# Histories use 1-minute spacing (10M rows at 30 minutes would run past the
+# pandas timestamp range). Sizes from 1M rows up run every case once.
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from backend import local_storage
+from backend.anomaly import RollingZScoreAnomaly
+from backend.forecast import Forecaster
+from backend.serialize import clean_json
+from benchmarks._common import isolate_app_data, make_history, scratch_history, time_calls
+
+SIZES = [1_000, 100_000, 1_000_000, 10_000_000]
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# clean_json needs every row as a Python dict: skipped above this size
+RECORDS_MAX_ROWS = 1_000_000
+
+ENDPOINTS = [
+    ("GET", "/"),
+    ("GET", "/data?limit=500"),
+    ("GET", "/data?limit=100000"),
+    ("GET", "/data?limit=100000&format=split"),
+    ("GET", "/data?max_points=1000"),
+    ("GET", "/data?resolution=hour"),
+    ("GET", "/anomalies"),
+    ("GET", "/anomalies?threshold=2.0&window=20"),
+    ("GET", "/forecast"),
+    ("GET", "/forecast?hours=168"),
+    ("GET", "/forecast_one_hour"),
+    ("GET", "/optimize"),
+    ("GET", "/cache_stats"),
+    ("GET", "/append"),
+]
+
+# Rows per POST /ingest call
+INGEST_ROWS = 100
+
+
+# =============================================================
+# CASES
+# =============================================================
+def load_cases(backend):
+    def load_cold():
+        local_storage.set_backend(backend)  # drops the cache → full read
+        return local_storage.load_data()
+
+    return [
+        ("storage.load_data.cold", load_cold, None),
+        ("storage.load_data.cached", local_storage.load_data, None),
+    ]
+
+
+def append_cases():
+    # Includes the app's append listeners (streaming anomalies, online forecaster)
+    return [("storage.append_random_row", local_storage.append_random_row, None)]
+
+
+def model_cases(df, n):
+    fitted = Forecaster()
+    fitted.fit(df)
+    records = df.to_dict(orient="records") if n <= RECORDS_MAX_ROWS else None
+
+    return [
+        ("anomaly.compute", lambda: RollingZScoreAnomaly().compute(df), None),
+        ("forecast.fit", lambda: Forecaster().fit(df), None),
+        ("forecast.forecast_period", lambda: fitted.forecast_period(df, hours=24), None),
+        ("serialize.clean_json", lambda: clean_json(records), RECORDS_MAX_ROWS),
+    ]
+
+
+def api_cases(client):
+    def call(method, path):
+        def fn():
+            response = client.request(method, path)
+            assert response.status_code == 200, (path, response.status_code)
+        return fn
+
+    cases = [(f"api.{method} {path}", call(method, path), None) for method, path in ENDPOINTS]
+
+    def ingest():
+        start = local_storage.last_timestamp() + pd.Timedelta(minutes=1)
+        body = make_history(INGEST_ROWS, start=start, freq="1min").to_csv(index=False)
+        response = client.post("/ingest", content=body, headers={"Content-Type": "text/csv"})
+        assert response.status_code == 200 and response.json()["accepted"] == INGEST_ROWS, response.text
+
+    cases.append((f"api.POST /ingest ({INGEST_ROWS} rows)", ingest, None))
+    return cases
+
+
+def reset_api(api):
+    """Point the app's derived state (anomalies, model, snapshot) at the current history."""
+    api.sync_rollups(*local_storage.load_versioned())
+    api.ANOMALY_EVENTS.catch_up(local_storage.load_data(), api.DEFAULT_WINDOW, api.DEFAULT_THRESHOLD)
+    api.FORECASTERS.warm()
+    api.run_pipeline(force=True)
+
+
+# =============================================================
+# MEASUREMENT
+# =============================================================
+def measure(fn, repeat):
+    """Wall times over `repeat` calls, then one extra call under tracemalloc for the peak."""
+    samples = time_calls(fn, repeat)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "repeat": repeat,
+        "median_ms": float(np.median(samples) * 1e3),
+        "min_ms": float(samples.min() * 1e3),
+        "peak_mb": peak / 1e6,
+    }
+
+
+def _wanted(prefixes, filters):
+    """True if any --cases filter can match a case name starting with one of prefixes."""
+    return not filters or any(p.startswith(f) or f.startswith(p) for p in prefixes for f in filters)
+
+
+def run_size(n, args, api, client):
+    df = make_history(n, freq="1min")
+    repeat = args.repeat if n < 1_000_000 else 1
+    results = []
+
+    with scratch_history(df, kind=args.storage) as backend:
+        local_storage.load_data()
+
+        groups = [
+            (("storage.load",), lambda: load_cases(backend)),
+            # Later groups start from an app state in sync with this history
+            (("storage.append",), lambda: reset_api(api) or append_cases()),
+            (("anomaly", "forecast", "serialize"), lambda: model_cases(local_storage.load_data(), n)),
+            (("api",), lambda: reset_api(api) or api_cases(client)),
+        ]
+        for prefixes, build in groups:
+            if not _wanted(prefixes, args.cases):
+                continue
+
+            for name, fn, max_rows in build():
+                if args.cases and not any(name.startswith(c) for c in args.cases):
+                    continue
+                if max_rows is not None and n > max_rows:
+                    results.append({"case": name, "rows": n, "skipped": f"over {max_rows} rows"})
+                    continue
+
+                result = {"case": name, "rows": n, **measure(fn, repeat)}
+                results.append(result)
+                print(f"{n:>10} {name:<32} {result['median_ms']:>12.2f} {result['min_ms']:>12.2f} "
+                      f"{result['peak_mb']:>10.1f}", flush=True)
+
+    return results
+
+
+# =============================================================
+# RESULTS
+# =============================================================
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(args):
+    return {
+        "commit": git_commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "storage": args.storage,
+        "repeat": args.repeat,
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """Print the ratio to a previous run per case; returns the number of regressions."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    before = {(r["case"], r["rows"]): r for r in baseline["results"] if "median_ms" in r}
+    print(f"\ncompared with {baseline_path} (commit {baseline['meta'].get('commit')})")
+    print(f"{'rows':>10} {'case':<32} {'before_ms':>12} {'after_ms':>12} {'ratio':>8}")
+
+    regressions = 0
+    for r in results:
+        old = before.get((r["case"], r["rows"]))
+        if old is None or "median_ms" not in r:
+            continue
+
+        ratio = r["median_ms"] / old["median_ms"] if old["median_ms"] else float("inf")
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  ⚠ slower"
+            regressions += 1
+        elif ratio < 1 - tolerance:
+            flag = "  ✅ faster"
+        print(f"{r['rows']:>10} {r['case']:<32} {old['median_ms']:>12.2f} {r['median_ms']:>12.2f} "
+              f"{ratio:>7.2f}x{flag}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="*", default=SIZES)
+    parser.add_argument("--repeat", type=int, default=5, help="calls per case below 1M rows")
+    parser.add_argument("--storage", choices=["csv", "columnar"], default="columnar")
+    parser.add_argument("--cases", nargs="*", default=None,
+                        help="only cases whose name starts with one of these (e.g. storage api.GET)")
+    parser.add_argument("--out", default=None, help="results file (default: benchmarks/results/)")
+    parser.add_argument("--compare", default=None, help="previous results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    # The app (scheduler, startup fit) is imported once against a scratch
+    # store and scratch anomaly/rollup paths, so backend/data is never touched
+    from fastapi.testclient import TestClient
+
+    isolate_app_data()
+    with scratch_history(make_history(1_000, freq="1min"), kind=args.storage):
+        from backend import api
+        api.scheduler.shutdown(wait=False)
+    client = TestClient(api.app)
+
+    print(f"{'rows':>10} {'case':<32} {'median_ms':>12} {'min_ms':>12} {'peak_mb':>10}")
+    results = []
+    for n in args.sizes:
+        results.extend(run_size(n, args, api, client))
+
+    meta = metadata(args)
+    out = args.out
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        out = os.path.join(RESULTS_DIR, f"{stamp}-{meta['commit'] or 'nogit'}.json")
+
+    with open(out, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    print(f"\n✅ Results written to {out}")
+
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
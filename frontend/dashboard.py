@@ -11,6 +11,78 @@ st.set_page_config(page_title="Operations Dashboard", layout="wide")
 
 BASE = "http://127.0.0.1:8000"
 
+# Points per KPI chart; the server downsamples longer windows
+MAX_CHART_POINTS = 1000
+
+# Chart windows start on this boundary so repeated polls send the same
+# `since` and hit the server's downsample cache
+WINDOW_STEP = "15min"
+
+# Newest anomaly events shown in the table (one page from the event store)
+ANOMALY_TABLE_ROWS = 200
+
+
+def split_frame(payload):
+    """DataFrame from a format=split payload (columns + row arrays, epoch-ms timestamps)."""
+    df = pd.DataFrame(payload.get("data", []), columns=payload.get("columns", []))
+    if "timestamp" in df.columns:
+        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
+    return df
+
+
+def list_sites():
+    try:
+        return requests.get(f"{BASE}/sites").json().get("sites", [])
+    except Exception:
+        return []
+
+
+# Site selector: every request below is scoped to the chosen site
+MAIN_SITE = "Main facility"
+site = st.sidebar.selectbox("Site", [MAIN_SITE] + list_sites())
+SITE_PARAMS = {} if site == MAIN_SITE else {"site_id": site}
+
+
+def get_json(path, params=None):
+    """GET a JSON body; a 304 (If-None-Match) reuses the copy kept in the session."""
+    params = {**(params or {}), **SITE_PARAMS}
+    cache = st.session_state.setdefault("http_cache", {})
+    key = (path, tuple(sorted((params or {}).items())))
+
+    headers = {"If-None-Match": cache[key][0]} if key in cache else {}
+    resp = requests.get(f"{BASE}{path}", params=params, headers=headers)
+    if resp.status_code == 304:
+        return cache[key][1]
+
+    body = resp.json()
+    if "ETag" in resp.headers:
+        cache[key] = (resp.headers["ETag"], body)
+    return body
+
+
+def sync_history(limit=500):
+    """Newest `limit` rows, kept current by merging /data?since_version= deltas."""
+    if SITE_PARAMS:
+        # Site histories have no version deltas; the ETag still saves the download
+        return split_frame(get_json("/data", {"limit": limit, "format": "split"}))
+
+    state = st.session_state
+    resp = requests.get(
+        f"{BASE}/data",
+        params={"since_version": state.get("data_version", ""), "limit": limit, "format": "split"},
+    )
+    rows = split_frame(resp.json())
+
+    if resp.headers.get("X-Delta") == "delta" and "history" in state:
+        if not rows.empty:
+            rows = pd.concat([state["history"], rows], ignore_index=True).tail(limit)
+        else:
+            rows = state["history"]
+
+    state["history"] = rows
+    state["data_version"] = resp.headers["X-Data-Version"]
+    return rows
+
 st.title("Operations Control Dashboard")
 
 tabs = st.tabs([" KPIs", "Anomalies", "Forecast", "Optimization"])
@@ -40,37 +112,30 @@ with tabs[0]:
 
     try:
         # -------------------------
-        # Load data
+        # Load data (only new rows are downloaded)
         # -------------------------
-        data = requests.get(f"{BASE}/data").json()
-        df = pd.DataFrame(data)
+        df = sync_history()
 
         if df.empty:
             st.warning("No data available.")
             st.stop()
 
-        df["timestamp"] = pd.to_datetime(df["timestamp"], format="mixed")
-
-        # Apply interval filter
+        # Downsampled per KPI on the server (anomalies kept exactly)
+        params = {"max_points": MAX_CHART_POINTS, "format": "split"}
         if interval_hours[interval] is not None:
-            cutoff = df["timestamp"].max() - pd.Timedelta(hours=interval_hours[interval])
-            df = df[df["timestamp"] >= cutoff]
-
-        # -------------------------
-        # Load anomaly rows properly
-        # -------------------------
-        anomalies = requests.get(f"{BASE}/anomalies").json()
+            # Newest row anchors the window, rounded down to a WINDOW_STEP boundary
+            cutoff = df["timestamp"].iloc[-1] - pd.Timedelta(hours=interval_hours[interval])
+            cutoff = cutoff.floor(WINDOW_STEP)
+            params["since"] = cutoff.isoformat()
 
-        df_anom = pd.DataFrame(anomalies.get("anomalies", []))  # ← FIXED
-
-        if not df_anom.empty and "timestamp" in df_anom.columns:
-            df_anom["timestamp"] = pd.to_datetime(df_anom["timestamp"], format="mixed")
+        series = split_frame(get_json("/data", params))
 
         # -------------------------
         # KPI Line Charts
         # -------------------------
         for col in ["sorting_capacity", "staff_available", "vehicles_ready", "congestion_level"]:
-            fig = px.line(df, x="timestamp", y=col, markers=True)
+            kpi = series[series["variable"] == col].rename(columns={"value": col})
+            fig = px.line(kpi, x="timestamp", y=col, markers=True)
             st.plotly_chart(fig, width='stretch')
 
     except Exception as e:
@@ -105,27 +170,25 @@ with tabs[1]:
     )
 
     try:
-        resp = requests.get(
-            f"{BASE}/anomalies?threshold={threshold}&window={window}"
-        ).json()
+        resp = get_json(
+            "/anomalies",
+            {"threshold": threshold, "window": window, "limit": ANOMALY_TABLE_ROWS, "format": "split"},
+        )
 
         if resp.get("status") == "no_anomalies":
             st.success("No anomalies detected.")
         else:
-            anomalies = resp.get("anomalies", [])
+            df_anom = split_frame(resp.get("anomalies", {}))
 
-            if len(anomalies) == 0:
+            if df_anom.empty:
                 st.success(" No anomalies detected.")
             else:
-                df_anom = pd.DataFrame(anomalies)
-
-                # Convert timestamp for sorting
+                # Sort newest first
                 if "timestamp" in df_anom.columns:
-                    df_anom["timestamp"] = pd.to_datetime(df_anom["timestamp"], format="mixed")
                     df_anom = df_anom.sort_values("timestamp", ascending=False)
 
                 st.error(" Anomalies Detected!")
-                st.markdown("### Latest Anomalies (Newest First)")
+                st.markdown(f"### Latest Anomalies (Newest {ANOMALY_TABLE_ROWS}, Newest First)")
                 st.dataframe(df_anom)
 
     except Exception as e:
@@ -137,20 +200,17 @@ with tabs[2]:
     st.subheader(" 24-Hour Forecast")
 
     try:
-        fc24 = requests.get(f"{BASE}/forecast").json()
+        fc24 = get_json("/forecast", {"format": "split"})
 
         # Handle backend errors
         if isinstance(fc24, dict) and "error" in fc24:
             st.warning(fc24["error"])
         else:
-            df_fc24 = pd.DataFrame(fc24)
+            df_fc24 = split_frame(fc24)
 
             if df_fc24.empty or "timestamp" not in df_fc24.columns:
                 st.warning("Not enough information for 24-hour forecast.")
             else:
-                # Convert timestamp
-                df_fc24["timestamp"] = pd.to_datetime(df_fc24["timestamp"], format="mixed")
-
                 # Convert congestion to percentage
                 df_fc24["congestion_level"] = (df_fc24["congestion_level"] * 100).round(1)
 
@@ -186,10 +246,7 @@ with tabs[3]:
     threshold = st.session_state.get("anomaly_threshold", 2.5)
     window = st.session_state.get("anomaly_window", 10)
 
-    out = requests.get(
-        f"{BASE}/optimize",
-        params={"threshold": threshold, "window": window},
-    ).json()
+    out = get_json("/optimize", {"threshold": threshold, "window": window})
 
     # -------------------------
     # LATEST METRICS
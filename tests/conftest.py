@@ -0,0 +1,40 @@
+# tests/conftest.py
+#
+# Everything the app writes goes to one scratch directory. The anomaly
+# event store and the rollups read their paths when first imported (test
+# modules may import them before any fixture runs), so the paths are set
+# here, at conftest import. The `api` fixture imports the app from inside
+# the scratch directory, so its relative backend/data paths (history,
+# sites) land there too.
+
+import atexit
+import os
+import shutil
+import tempfile
+
+import pytest
+
+SCRATCH = tempfile.mkdtemp(prefix="xenber-tests-")
+# Registered before the app's own exit hooks, so it runs after they saved
+atexit.register(shutil.rmtree, SCRATCH, ignore_errors=True)
+
+os.environ["XENBER_ANOMALY_DB"] = os.path.join(SCRATCH, "backend/data/anomalies.db")
+os.environ["XENBER_ROLLUP_DIR"] = os.path.join(SCRATCH, "backend/data/rollups")
+
+
+@pytest.fixture(scope="session")
+def api():
+    cwd = os.getcwd()
+    os.chdir(SCRATCH)
+    try:
+        from backend import api
+        api.scheduler.shutdown(wait=False)   # appends come from the tests only
+        yield api
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture(scope="session")
+def client(api):
+    from fastapi.testclient import TestClient
+    return TestClient(api.app)
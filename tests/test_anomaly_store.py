@@ -0,0 +1,33 @@
+# tests/test_anomaly_store.py
+#
+# Concurrent requests for a new anomaly setting share one scan: they queue
+# on the event store's per-setting lock instead of each scanning the history.
+#
+#   python -m pytest tests
+
+import threading
+
+from backend.anomaly_store import AnomalyEventStore
+from backend.data_generate import generate_history
+
+CALLERS = 8
+
+
+def test_concurrent_catch_up_scans_a_new_setting_once(tmp_path):
+    store = AnomalyEventStore(str(tmp_path / "anomalies.db"))
+    history = generate_history(5_000, start="2024-01-01", seed=3)
+
+    start = threading.Barrier(CALLERS)
+
+    def request():
+        start.wait()
+        store.catch_up(history, 5, 1.5)
+
+    threads = [threading.Thread(target=request) for _ in range(CALLERS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert store.scans == {"full": 1, "incremental": 0, "up_to_date": CALLERS - 1}
+    assert not store.query(5, 1.5, limit=None)[0].empty
@@ -0,0 +1,123 @@
+# tests/test_anomaly_stream.py
+#
+# Streaming anomaly detection (prime/update, AnomalyEventStore.catch_up) must
+# flag exactly the cells the batch pass (compute) flags, with the same
+# z-scores, whatever the append sizes.
+#
+#   python -m pytest tests
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.anomaly import KPI_COLUMNS, RollingZScoreAnomaly, _BULK_UPDATE_ROWS
+from backend.anomaly_store import AnomalyEventStore
+from backend.data_generate import generate_history
+
+SETTINGS = [(10, 2.5), (3, 1.0), (5, 1.5), (20, 2.0), (2, 0.5)]
+
+# Append sizes cycled through while replaying; includes the vectorised bulk path
+CHUNKS = [1, 1, 2, 7, 1, _BULK_UPDATE_ROWS, 3, 1, _BULK_UPDATE_ROWS + 41, 1, 16]
+
+PRIMED_ROWS = 40
+
+
+@pytest.fixture(scope="module")
+def history():
+    """Seeded history with spikes, constant runs and NaNs."""
+    df = generate_history(2_000, start="2024-01-01", seed=7)
+    df = df.astype({col: float for col in KPI_COLUMNS})
+    rng = np.random.default_rng(7)
+
+    # Spikes
+    for row in rng.choice(len(df), 40, replace=False):
+        df.loc[row, rng.choice(KPI_COLUMNS)] *= 3
+
+    # Constant runs: one KPI, then every KPI at once
+    df.loc[300:340, "staff_available"] = 42.0
+    df.loc[900:930, KPI_COLUMNS] = df.loc[900, KPI_COLUMNS].to_numpy()
+
+    # Isolated NaNs and a NaN run
+    for row in rng.choice(np.arange(PRIMED_ROWS, len(df)), 25, replace=False):
+        df.loc[row, rng.choice(KPI_COLUMNS)] = np.nan
+    df.loc[1500:1510, "congestion_level"] = np.nan
+
+    return df
+
+
+def chunks(df, start):
+    """Consecutive slices of df from row `start`, sized by CHUNKS (cycled)."""
+    i, k = start, 0
+    while i < len(df):
+        size = CHUNKS[k % len(CHUNKS)]
+        yield df.iloc[i:i + size]
+        i += size
+        k += 1
+
+
+def flagged(found):
+    """compute()-style frame → {(row, variable): zscore}."""
+    if found.empty:
+        return {}
+    return dict(zip(zip(found.index, found["variable"]), found["zscore"]))
+
+
+def assert_same(streamed, batch):
+    assert streamed.keys() == batch.keys()
+    keys = sorted(batch)
+    np.testing.assert_allclose(
+        [streamed[k] for k in keys], [batch[k] for k in keys], rtol=1e-9, atol=1e-12
+    )
+
+
+def batch_after(df, window, threshold, start):
+    found = flagged(RollingZScoreAnomaly(window=window, threshold=threshold).compute(df))
+    return {key: z for key, z in found.items() if key[0] >= start}
+
+
+@pytest.mark.parametrize("window,threshold", SETTINGS)
+def test_update_matches_compute(history, window, threshold):
+    detector = RollingZScoreAnomaly(window=window, threshold=threshold)
+    detector.prime(history.iloc[:PRIMED_ROWS])
+
+    streamed = {}
+    for rows in chunks(history, PRIMED_ROWS):
+        streamed.update(flagged(detector.update(rows)))
+
+    batch = batch_after(history, window, threshold, PRIMED_ROWS)
+    assert batch, "the history should contain anomalies"
+    assert_same(streamed, batch)
+
+
+@pytest.mark.parametrize("window,threshold", SETTINGS)
+def test_catch_up_returns_each_appends_events(history, window, threshold, tmp_path):
+    store = AnomalyEventStore(str(tmp_path / "anomalies.db"))
+    store.catch_up(history.iloc[:PRIMED_ROWS], window, threshold)
+
+    streamed, end = {}, PRIMED_ROWS
+    for rows in chunks(history, PRIMED_ROWS):
+        end += len(rows)
+        streamed.update(flagged(store.catch_up(history.iloc[:end], window, threshold)))
+
+    assert store.catch_up(history, window, threshold).empty
+    assert_same(streamed, batch_after(history, window, threshold, PRIMED_ROWS))
+
+
+def test_bulk_update_matches_row_by_row(history):
+    rows = history.iloc[PRIMED_ROWS:PRIMED_ROWS + 2 * _BULK_UPDATE_ROWS]
+
+    bulk = RollingZScoreAnomaly()
+    bulk.prime(history.iloc[:PRIMED_ROWS])
+    single = RollingZScoreAnomaly()
+    single.prime(history.iloc[:PRIMED_ROWS])
+
+    by_row = {}
+    for i in range(len(rows)):
+        by_row.update(flagged(single.update(rows.iloc[i:i + 1])))
+
+    assert_same(flagged(bulk.update(rows)), by_row)
+
+
+def test_update_before_prime_raises():
+    with pytest.raises(RuntimeError):
+        RollingZScoreAnomaly().update(pd.DataFrame(columns=["timestamp", *KPI_COLUMNS]))
@@ -0,0 +1,70 @@
+# tests/test_api.py
+#
+# Polling contract of the API (ETag / 304, /data?since_version= deltas) and
+# site lookups.
+#
+#   python -m pytest tests
+
+
+def test_etag_answers_304_until_the_data_changes(client):
+    first = client.get("/data?limit=3")
+    etag = first.headers["ETag"]
+
+    again = client.get("/data?limit=3", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+
+    client.get("/append")
+    changed = client.get("/data?limit=3", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_etag_from_another_boot_never_matches(api, client):
+    etag = client.get("/data?limit=3").headers["ETag"]
+    stale = etag.replace(api.BOOT_ID, "0" * len(api.BOOT_ID))
+    assert client.get("/data?limit=3", headers={"If-None-Match": stale}).status_code == 200
+
+
+def test_since_version_returns_only_new_rows(client):
+    start = client.get("/data?since_version=&limit=5&format=split")
+    assert start.headers["X-Delta"] == "full"
+    token = start.headers["X-Data-Version"]
+
+    appended = [client.get("/append").json()["timestamp"] for _ in range(2)]
+
+    delta = client.get(f"/data?since_version={token}&limit=5")
+    assert delta.headers["X-Delta"] == "delta"
+    assert [row["timestamp"] for row in delta.json()] == appended
+
+    empty = client.get(f"/data?since_version={delta.headers['X-Data-Version']}&limit=5")
+    assert empty.headers["X-Delta"] == "delta"
+    assert empty.json() == []
+
+
+def test_since_version_from_another_boot_gets_a_full_reload(api, client):
+    token = client.get("/data?since_version=&limit=5").headers["X-Data-Version"]
+    version = token.rsplit("-", 1)[1]
+
+    for stale in [f"{'0' * len(api.BOOT_ID)}-{version}", version]:
+        response = client.get(f"/data?since_version={stale}&limit=5")
+        assert response.headers["X-Delta"] == "full"
+        assert len(response.json()) == 5
+
+
+def test_since_version_overflow_falls_back_to_full(client):
+    token = client.get("/data?since_version=&limit=5").headers["X-Data-Version"]
+    for _ in range(3):
+        client.get("/append")
+
+    response = client.get(f"/data?since_version={token}&limit=2")
+    assert response.headers["X-Delta"] == "full"
+    assert len(response.json()) == 2
+
+
+def test_unknown_sites_answer_404_without_being_registered(client):
+    before = client.get("/cache_stats").json()["sites"]
+
+    for i in range(50):
+        assert client.get(f"/data?site_id=ghost-{i}").status_code == 404
+
+    assert client.get("/cache_stats").json()["sites"] == before
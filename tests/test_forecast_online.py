@@ -0,0 +1,105 @@
+# tests/test_forecast_online.py
+#
+# The online regression (sufficient statistics folded in batch by batch)
+# must give the same coefficients as a full batch LinearRegression refit.
+#
+#   python -m pytest tests
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from backend.anomaly import KPI_COLUMNS
+from backend.data_generate import generate_history
+from backend.forecast import Forecaster, OnlineLinearRegression
+
+CHUNKS = [1, 5, 1, 30, 2, 200, 1, 64]
+
+
+@pytest.fixture(scope="module")
+def history():
+    df = generate_history(1_500, start="2024-01-01", seed=3)
+    df = df.astype({col: float for col in KPI_COLUMNS})
+    df.loc[[100, 101, 700, 1200], "congestion_level"] = np.nan   # rows the forecaster skips
+    return df
+
+
+def chunks(df, start):
+    i, k = start, 0
+    while i < len(df):
+        size = CHUNKS[k % len(CHUNKS)]
+        yield df.iloc[i:i + size]
+        i += size
+        k += 1
+
+
+def assert_fit_equal(model, reference):
+    np.testing.assert_allclose(model.coef_, reference.coef_, rtol=1e-6, atol=1e-8)
+    np.testing.assert_allclose(model.intercept_, reference.intercept_, rtol=1e-6, atol=1e-8)
+
+
+def batch_pairs(df):
+    """(X, Y) the batch Forecaster trains on: each clean row predicts the next clean row."""
+    features, targets = Forecaster()._feature_arrays(df)
+    return features[:-1], targets[1:]
+
+
+def decay_weights(n, forgetting):
+    """Weight of each of n rows once all of them are folded in (newest = 1)."""
+    return forgetting ** np.arange(n - 1, -1, -1, dtype=float)
+
+
+@pytest.mark.parametrize("forgetting", [1.0, 0.999, 0.98])
+def test_partial_fit_matches_batch_regression(forgetting):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(600, 6)) * [100, 50, 10, 1, 1, 1]
+    Y = X[:, :4] @ rng.normal(size=(4, 4)) + rng.normal(size=(600, 4))
+
+    online = OnlineLinearRegression(6, 4, forgetting=forgetting)
+    start = 0
+    for size in [1, 17, 3, 250, 1, 128, 200]:
+        online.partial_fit(X[start:start + size], Y[start:start + size])
+        start += size
+    assert start == len(X)
+
+    reference = LinearRegression().fit(X, Y, sample_weight=decay_weights(len(X), forgetting))
+    assert_fit_equal(online, reference)
+    np.testing.assert_allclose(online.predict(X[:5]), reference.predict(X[:5]), rtol=1e-6, atol=1e-8)
+
+
+def test_online_forecaster_matches_full_refit(history):
+    online = Forecaster(online=True)
+    online.fit(history.iloc[:50])
+    for rows in chunks(history, 50):
+        online.update(rows)
+
+    batch = Forecaster()
+    batch.fit(history)
+
+    assert_fit_equal(online.model, batch.model)
+    np.testing.assert_allclose(
+        online.forecast_period(history)[KPI_COLUMNS].to_numpy(dtype=float),
+        batch.forecast_period(history)[KPI_COLUMNS].to_numpy(dtype=float),
+    )
+
+
+@pytest.mark.parametrize("forgetting", [0.999, 0.99])
+def test_online_forecaster_with_forgetting_matches_weighted_refit(history, forgetting):
+    online = Forecaster(online=True, forgetting=forgetting)
+    online.fit(history.iloc[:50])
+    for rows in chunks(history, 50):
+        online.update(rows)
+
+    X, Y = batch_pairs(history)
+    reference = LinearRegression().fit(X, Y, sample_weight=decay_weights(len(X), forgetting))
+    assert_fit_equal(online.model, reference)
+
+
+def test_update_before_fit_raises(history):
+    with pytest.raises(RuntimeError, match="fit"):
+        Forecaster(online=True).update(history.iloc[:10])
+
+
+def test_update_needs_online_mode(history):
+    with pytest.raises(RuntimeError, match="online"):
+        Forecaster().update(history.iloc[:10])
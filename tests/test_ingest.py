@@ -0,0 +1,53 @@
+# tests/test_ingest.py
+#
+# /ingest classification of rows that are not after the stored tail:
+# duplicates (already stored) are skipped, late rows (not stored) reject
+# the batch unless on_error=skip.
+#
+#   python -m pytest tests
+
+from backend.data_generate import generate_history
+from backend.storage import COLUMNS
+
+HISTORY = generate_history(10, start="2026-01-01", seed=5)[COLUMNS]
+
+
+def post(client, site_id, rows, on_error="reject"):
+    return client.post(
+        f"/ingest?site_id={site_id}&on_error={on_error}",
+        content=rows.to_csv(index=False),
+        headers={"Content-Type": "text/csv"},
+    )
+
+
+def test_stored_rows_are_skipped_as_duplicates(client):
+    assert post(client, "ingest-dup", HISTORY.iloc[:5]).json()["accepted"] == 5
+
+    report = post(client, "ingest-dup", HISTORY.iloc[3:7]).json()
+    assert (report["accepted"], report["duplicates"], report["late"]) == (2, 2, 0)
+
+
+def test_late_rows_reject_the_batch_unless_skipped(client):
+    assert post(client, "ingest-late", HISTORY.iloc[::2]).json()["accepted"] == 5
+
+    backfill = HISTORY.iloc[[1, 9]]
+    rejected = post(client, "ingest-late", backfill)
+    assert rejected.status_code == 409
+    assert rejected.json()["detail"]["late"] == 1
+
+    report = post(client, "ingest-late", backfill, on_error="skip").json()
+    assert (report["accepted"], report["duplicates"], report["late"]) == (1, 0, 1)
+
+
+def test_late_check_uses_the_tail_the_write_commits_on(api):
+    # A concurrent append moved the tail after the ingest pre-check: the
+    # writer still sees it and writes nothing
+    history = api.get_site("ingest-race", create=True).history
+    history.append_rows(HISTORY.iloc[[0, 2]])
+
+    written, duplicates, late = history.append_new_rows(HISTORY.iloc[[1, 2, 3]], reject_late=True)
+    assert (len(written), duplicates, late) == (0, 1, 1)
+    assert len(history.load_data()) == 2
+
+    written, duplicates, late = history.append_new_rows(HISTORY.iloc[[1, 2, 3]])
+    assert (len(written), duplicates, late) == (1, 1, 1)
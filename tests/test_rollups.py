@@ -0,0 +1,36 @@
+# tests/test_rollups.py
+#
+# Folding rows into a Rollup one append at a time (in order, or with late
+# buckets) must give the same buckets as aggregating all rows at once.
+#
+#   python -m pytest tests
+
+import numpy as np
+import pytest
+
+from backend.rollups import RESOLUTIONS, Rollup, aggregate
+
+HOUR = RESOLUTIONS["hour"]
+
+
+@pytest.mark.parametrize("shuffled", [False, True], ids=["in_order", "late_buckets"])
+def test_appends_match_one_aggregate(shuffled):
+    rng = np.random.default_rng(3)
+    ts = np.sort(rng.integers(0, 400 * HOUR, 5_000))
+    values = rng.normal(size=(len(ts), 4))
+    values[rng.random(values.shape) < 0.05] = np.nan
+
+    chunks = np.array_split(np.arange(len(ts)), 300)
+    if shuffled:
+        rng.shuffle(chunks)
+
+    rollup = Rollup("hour", HOUR)
+    for rows in chunks:
+        rollup.add(ts[rows], values[rows])
+
+    buckets, sums, mins, maxs, counts = aggregate(ts, values, HOUR)
+    np.testing.assert_array_equal(rollup.buckets, buckets)
+    np.testing.assert_allclose(rollup.sums, sums)
+    np.testing.assert_array_equal(rollup.mins, mins)
+    np.testing.assert_array_equal(rollup.maxs, maxs)
+    np.testing.assert_array_equal(rollup.counts, counts)
@@ -0,0 +1,57 @@
+# tests/test_storage.py
+#
+# Storage backends must give back exactly the rows written to them.
+#
+#   python -m pytest tests
+
+import pandas as pd
+import pytest
+
+from backend.data_generate import generate_history
+from backend.storage import COLUMNS, CsvBackend, ColumnarBackend
+
+
+def make_backend(kind, tmp_path):
+    if kind == "csv":
+        return CsvBackend(str(tmp_path / "history.csv"))
+    return ColumnarBackend(str(tmp_path / "history"))
+
+
+def midnight_rows(day):
+    return generate_history(1, start=day, seed=1)[COLUMNS]
+
+
+@pytest.mark.parametrize("kind", ["csv", "columnar"])
+def test_midnight_append_survives_reload(kind, tmp_path):
+    backend = make_backend(kind, tmp_path)
+    backend.write_all(generate_history(10, start="2026-10-16 18:00", seed=0))
+
+    # One row exactly at midnight: the CSV writer drops its time part
+    backend.append(midnight_rows("2026-10-17"))
+
+    df = backend.read()
+    assert len(df) == 11
+    assert df["timestamp"].iloc[-1] == pd.Timestamp("2026-10-17")
+    assert backend.last_timestamp() == pd.Timestamp("2026-10-17")
+
+
+@pytest.mark.parametrize("kind", ["csv", "columnar"])
+def test_midnight_only_history_round_trips(kind, tmp_path):
+    backend = make_backend(kind, tmp_path)
+    days = pd.concat([midnight_rows(day) for day in ["2026-10-15", "2026-10-16"]], ignore_index=True)
+    backend.write_all(days)
+    backend.append(midnight_rows("2026-10-17"))
+
+    df = backend.read()
+    assert list(df["timestamp"]) == list(pd.to_datetime(["2026-10-15", "2026-10-16", "2026-10-17"]))
+    assert df["sorting_capacity"].tolist()[:2] == days["sorting_capacity"].tolist()
+
+
+def test_columnar_stat_keeps_its_shape_when_empty(tmp_path):
+    backend = make_backend("columnar", tmp_path)
+    backend.write_all(pd.DataFrame(columns=COLUMNS))
+    empty = backend.stat()
+
+    backend.append(midnight_rows("2026-10-17"))
+    assert len(backend.stat()) == len(empty)
+    assert backend.stat() != empty
@@ -0,0 +1,73 @@
+# tests/test_writer.py
+#
+# Failure paths of the group-commit writer: a failing commit or tail() fails
+# the waiting futures, and the writer thread keeps serving later appends.
+#
+#   python -m pytest tests
+
+import pandas as pd
+import pytest
+
+from backend.writer import GroupCommitWriter
+
+
+class FakeStore:
+    def __init__(self):
+        self.rows = []
+        self.fail_commit = None   # exception raised by the next commit
+        self.fail_tail = None     # exception raised by the next tail()
+
+    def commit(self, batch):
+        if self.fail_commit is not None:
+            error, self.fail_commit = self.fail_commit, None
+            raise error
+        self.rows.extend(batch["timestamp"])
+
+    def tail(self):
+        if self.fail_tail is not None:
+            error, self.fail_tail = self.fail_tail, None
+            raise error
+        return self.rows[-1] if self.rows else None
+
+
+def frame(*stamps):
+    return pd.DataFrame({"timestamp": pd.to_datetime(list(stamps))})
+
+
+@pytest.fixture
+def store():
+    return FakeStore()
+
+
+@pytest.fixture
+def writer(store):
+    return GroupCommitWriter(store.commit, store.tail, normalise=lambda rows: rows)
+
+
+def test_failed_commit_fails_its_future_and_the_writer_lives_on(store, writer):
+    store.fail_commit = OSError("disk full")
+    with pytest.raises(OSError):
+        writer.write(frame("2025-01-01 00:00"), timeout=5)
+
+    writer.write(frame("2025-01-01 00:01"), timeout=5)
+    assert store.rows == [pd.Timestamp("2025-01-01 00:01")]
+
+
+def test_failing_tail_fails_the_group_instead_of_killing_the_thread(store, writer):
+    store.fail_tail = RuntimeError("store unreadable")
+    with pytest.raises(RuntimeError):
+        writer.write(frame("2025-01-01 00:00"), timeout=5)
+
+    writer.write(make=lambda last_ts: frame("2025-01-01 00:01"), timeout=5)
+    assert store.rows == [pd.Timestamp("2025-01-01 00:01")]
+
+
+def test_failing_make_only_fails_its_own_item(store, writer):
+    def broken(last_ts):
+        raise ValueError("bad rows")
+
+    with pytest.raises(ValueError):
+        writer.write(make=broken, timeout=5)
+
+    assert writer.write(make=lambda last_ts: frame("2025-01-01 00:00"), timeout=5).shape[0] == 1
+    assert writer.stats()["commits"] == 1